@@ -0,0 +1,98 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Estensione Cython opzionale per TerminalRenderer: genera i byte di un frame
+completo a partire dalle chiavi (fg << 8 | bg) calcolate da _frame_keys.
+
+Compilazione: python setup.py build_ext --inplace
+"""
+
+from libc.stdlib cimport malloc, free
+from libc.string cimport memcpy
+from cpython.bytearray cimport PyByteArray_FromStringAndSize
+
+cdef enum:
+    # Stesso valore di terminal_renderer._EMPTY_CELL
+    EMPTY_CELL = 65536
+    # Byte massimi per cella: due SGR da 11 byte, il carattere ▀ (3) e un reset (4)
+    CELL_BYTES = 29
+    # Byte massimi per il posizionamento del cursore a fine riga
+    ROW_BYTES = 16
+
+
+cdef inline Py_ssize_t put(char* buf, Py_ssize_t pos, const char* text, Py_ssize_t n) nogil:
+    memcpy(buf + pos, text, n)
+    return pos + n
+
+
+cdef inline Py_ssize_t put_uint(char* buf, Py_ssize_t pos, unsigned int value) nogil:
+    cdef char digits[10]
+    cdef int n = 0
+    if value == 0:
+        buf[pos] = 48
+        return pos + 1
+    while value:
+        digits[n] = 48 + value % 10
+        value //= 10
+        n += 1
+    while n:
+        n -= 1
+        buf[pos] = digits[n]
+        pos += 1
+    return pos
+
+
+def render_frame(const unsigned int[:, ::1] keys):
+    """
+    Equivalente compilato di TerminalRenderer._emit_rle per un array NumPy
+    di chiavi (righe, colonne) uint32.
+
+    Returns:
+        bytearray con il frame, identico all'output della versione Python
+    """
+    cdef Py_ssize_t rows = keys.shape[0]
+    cdef Py_ssize_t width = keys.shape[1]
+    cdef Py_ssize_t y, x
+    cdef Py_ssize_t pos = 0
+    cdef unsigned int key, prev
+    cdef bint colored
+    cdef char* buf = <char*>malloc(rows * (width * CELL_BYTES + ROW_BYTES) + 8)
+    if buf == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            pos = put(buf, pos, b"\x1b[H", 3)
+            for y in range(rows):
+                colored = False
+                prev = 0xFFFFFFFF
+                for x in range(width):
+                    key = keys[y, x]
+                    if key == EMPTY_CELL:
+                        if colored:
+                            pos = put(buf, pos, b"\x1b[0m", 4)
+                            colored = False
+                        buf[pos] = 32
+                        pos += 1
+                    else:
+                        # Nuovo tratto: una sola coppia di sequenze di colore
+                        if key != prev:
+                            pos = put(buf, pos, b"\x1b[38;5;", 7)
+                            pos = put_uint(buf, pos, key >> 8)
+                            pos = put(buf, pos, b"m\x1b[48;5;", 8)
+                            pos = put_uint(buf, pos, key & 255)
+                            buf[pos] = 109  # 'm'
+                            pos += 1
+                        pos = put(buf, pos, b"\xe2\x96\x80", 3)
+                        colored = True
+                    prev = key
+
+                if colored:
+                    pos = put(buf, pos, b"\x1b[0m", 4)
+                if y < rows - 1:
+                    pos = put(buf, pos, b"\x1b[", 2)
+                    pos = put_uint(buf, pos, <unsigned int>(y + 2))
+                    pos = put(buf, pos, b";1H", 3)
+
+        return PyByteArray_FromStringAndSize(buf, pos)
+    finally:
+        free(buf)
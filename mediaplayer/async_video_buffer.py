@@ -9,27 +9,201 @@ import sys
 import time
 import threading
 import queue
+import re
+import collections
+import gc
+import mmap
+import array
+import weakref
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 import subprocess
 import tempfile
 import shutil
-import glob  # Aggiunto import mancante per glob.glob
 from PIL import Image
+from frame_loader import load_frame
 
 # Importa la funzione per ottenere i percorsi di ffmpeg
 try:
-    from core import get_ffmpeg_paths
+    from core import get_ffmpeg_paths, has_ffmpeg, frame_file_path, count_frame_files
 except ImportError:
     # Fallback se l'importazione fallisce
     def get_ffmpeg_paths():
         return "ffmpeg", "ffprobe"
+    
+    def has_ffmpeg(ffmpeg_path=None):
+        try:
+            return subprocess.run([ffmpeg_path or "ffmpeg", "-version"],
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+        except OSError:
+            return False
+    
+    def frame_file_path(frames_dir, index):
+        return os.path.join(frames_dir, f"frame_{index + 1:04d}.jpg")
+    
+    def count_frame_files(frames_dir):
+        count = 0
+        while os.path.exists(frame_file_path(frames_dir, count)):
+            count += 1
+        return count
+
+# Riga di statistiche di ffmpeg: "frame=  123 fps= 45 ..."
+_FRAME_STATS_RE = re.compile(rb"frame=\s*(\d+)\s+fps=")
+
+class FrameQueue:
+    """
+    Coda FIFO limitata basata su deque + Condition.
+    
+    Mantiene l'interfaccia di queue.Queue usata dal buffer (put/get/qsize/empty,
+    con queue.Full e queue.Empty) ma offre anche try_get_nowait(), che
+    restituisce None invece di sollevare un'eccezione quando la coda è vuota.
+    """
+    
+    def __init__(self, maxsize=0):
+        self.maxsize = maxsize
+        self._dq = collections.deque()
+        self._cv = threading.Condition()
+    
+    def put(self, item, block=True, timeout=None):
+        """Inserisce un elemento, attendendo spazio se block è True."""
+        with self._cv:
+            if self.maxsize > 0 and len(self._dq) >= self.maxsize:
+                if not block or not self._cv.wait_for(
+                        lambda: len(self._dq) < self.maxsize, timeout):
+                    raise queue.Full
+            self._dq.append(item)
+            self._cv.notify_all()
+    
+    def put_nowait(self, item):
+        return self.put(item, block=False)
+    
+    def get(self, block=True, timeout=None):
+        """Estrae un elemento, attendendo se block è True."""
+        with self._cv:
+            if not self._dq:
+                if not block or not self._cv.wait_for(lambda: self._dq, timeout):
+                    raise queue.Empty
+            item = self._dq.popleft()
+            self._cv.notify_all()
+            return item
+    
+    def get_nowait(self):
+        return self.get(block=False)
+    
+    def try_get_nowait(self):
+        """Estrae un elemento senza attendere; None se la coda è vuota."""
+        dq = self._dq
+        if not dq:
+            return None
+        with self._cv:
+            item = dq.popleft() if dq else None
+            self._cv.notify_all()
+            return item
+    
+    def clear(self):
+        """Svuota la coda."""
+        with self._cv:
+            self._dq.clear()
+            self._cv.notify_all()
+    
+    def qsize(self):
+        return len(self._dq)
+    
+    def empty(self):
+        return not self._dq
+    
+    def full(self):
+        return 0 < self.maxsize <= len(self._dq)
+
+
+class FrameRing:
+    """
+    Ring buffer di frame RGBX in memoria anonima (mmap).
+    
+    ffmpeg scrive ogni frame direttamente in uno slot e l'immagine PIL viene
+    creata sopra lo slot senza copie (Image.frombuffer). Lo slot torna libero
+    quando l'ultima referenza all'immagine viene rilasciata.
+    """
+    
+    def __init__(self, depth, width, height):
+        self.depth = depth
+        self.size = (width, height)
+        self.frame_size = width * height * 4  # RGBX = 4 byte per pixel
+        self._mmap = mmap.mmap(-1, depth * self.frame_size)
+        self._views = [memoryview(self._mmap)[i * self.frame_size:(i + 1) * self.frame_size]
+                       for i in range(depth)]
+        self._busy = array.array('b', [0] * depth)
+        self._cv = threading.Condition()
+        self._next = 0
+    
+    def _find_free(self):
+        busy = self._busy
+        for i in range(self.depth):
+            slot = (self._next + i) % self.depth
+            if not busy[slot]:
+                return slot
+        return None
+    
+    def acquire(self, timeout=None):
+        """Riserva uno slot libero; None se nessuno si libera entro il timeout."""
+        with self._cv:
+            slot = self._find_free()
+            if slot is None:
+                self._cv.wait(timeout)
+                slot = self._find_free()
+                if slot is None:
+                    return None
+            self._busy[slot] = 1
+            self._next = (slot + 1) % self.depth
+            return slot
+    
+    def release(self, slot):
+        """Libera uno slot."""
+        with self._cv:
+            self._busy[slot] = 0
+            self._cv.notify()
+    
+    def view(self, slot):
+        """memoryview sui byte dello slot."""
+        return self._views[slot]
+    
+    def image(self, slot):
+        """Immagine PIL (sola lettura) che condivide la memoria dello slot."""
+        img = Image.frombuffer("RGBX", self.size, self._views[slot], "raw", "RGBX", 0, 1)
+        weakref.finalize(img, self.release, slot)
+        return img
+
+
+# Lettura vettoriale della pipe di ffmpeg (non disponibile su Windows).
+# Nota: non si usa io_uring perché lettura (thread di estrazione) e scrittura
+# (loop di riproduzione) avvengono in thread diversi e non possono condividere
+# una sola submit; readv a blocchi + writev per frame ottengono già una
+# chiamata di sistema per lato senza dipendenze esterne.
+_HAS_READV = hasattr(os, 'readv')
+_READ_BATCH_BYTES = 1 << 20  # Byte massimi richiesti per ogni readv
+
+
+def _read_exact(stream, view):
+    """Legge da stream fino a riempire view; restituisce i byte letti."""
+    total = 0
+    size = len(view)
+    while total < size:
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
 
 class AsyncVideoBuffer:
     """Gestisce il buffering video in modo asincrono senza multiprocessing."""
     
     def __init__(self, max_buffer_size=10, preload_frames=10):
         """Inizializza il buffer video."""
-        self.buffer = queue.Queue(maxsize=max_buffer_size)
-        self.rendered_buffer = queue.Queue(maxsize=max_buffer_size) # Buffer per frame già renderizzati
+        self.buffer = FrameQueue(maxsize=max_buffer_size)
+        self.rendered_buffer = FrameQueue(maxsize=max_buffer_size) # Buffer per frame già renderizzati
         self.is_extracting = False
         self.extraction_complete = False
         self.current_frame = 0
@@ -45,6 +219,9 @@ class AsyncVideoBuffer:
         self.skipped_frames = 0  # Contatore di frame saltati
         self.rendering_thread = None
         self.is_rendering = False
+        # Dimensione (colonne, righe) del terminale per il pre-rendering, aggiornata
+        # da set_render_size e letta dal thread a ogni frame
+        self.render_size = None
         self.render_complete = False
         self.smoothness_factor = 1.0  # Fattore di fluidità (1.0 = normale)
     
@@ -59,10 +236,8 @@ class AsyncVideoBuffer:
             print(f"Errore: file '{video_path}' non trovato.")
             return False
         
-        # Verifica che ffmpeg sia disponibile
-        try:
-            subprocess.run([self.ffmpeg_path, "-version"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except FileNotFoundError:
+        # Verifica che ffmpeg sia disponibile (controllo in cache, un solo avvio di ffmpeg)
+        if not has_ffmpeg(self.ffmpeg_path):
             print(f"Errore: ffmpeg non trovato. Assicurati che sia installato e nel PATH.")
             return False
         
@@ -76,11 +251,7 @@ class AsyncVideoBuffer:
         self.extraction_progress = 0
         
         # Svuota il buffer se non vuoto
-        while not self.buffer.empty():
-            try:
-                self.buffer.get_nowait()
-            except queue.Empty:
-                break
+        self.buffer.clear()
         
         # Ottieni informazioni sul video come durata e frame rate
         self.video_info = self._get_video_info(video_path)
@@ -165,12 +336,14 @@ class AsyncVideoBuffer:
             # Debug info
             print(f"Inizio estrazione con fps={fps}, start={start_time}, duration={duration}")
             
-            # Costruisci il comando ffmpeg
-            cmd = [self.ffmpeg_path, "-i", video_path]
-            
-            # Opzioni di inizio e durata
+            # Costruisci il comando ffmpeg: -ss prima di -i salta al keyframe
+            # precedente invece di decodificare e scartare tutto ciò che precede
+            cmd = [self.ffmpeg_path]
             if start_time > 0:
                 cmd.extend(["-ss", str(start_time)])
+            cmd.extend(["-i", video_path])
+            
+            # Durata
             if duration:
                 cmd.extend(["-t", str(duration)])
                 
@@ -189,9 +362,10 @@ class AsyncVideoBuffer:
             cmd.extend(["-vsync", "cfr"])
                 
             # Formato di output
+            # rgb0 (RGBX) permette di mappare i frame in PIL senza copie
             cmd.extend([
                 "-f", "image2pipe",
-                "-pix_fmt", "rgb24",
+                "-pix_fmt", "rgb0",
                 "-vcodec", "rawvideo",
                 "-"
             ])
@@ -204,8 +378,10 @@ class AsyncVideoBuffer:
             if not frame_width or not frame_height:
                 raise ValueError("Impossibile determinare le dimensioni del video")
                 
-            # Calcola la dimensione del frame in byte
-            frame_size = frame_width * frame_height * 3  # RGB = 3 byte per pixel
+            # Ring di slot preallocati: profondità del buffer più i frame ancora
+            # in uso da riproduzione e pre-rendering
+            ring = FrameRing(max(1, self.buffer.maxsize) + 4, frame_width, frame_height)
+            frame_size = ring.frame_size
             
             if video_info and "duration" in video_info:
                 total_duration = float(video_info["duration"])
@@ -218,40 +394,55 @@ class AsyncVideoBuffer:
             # Avvia il processo ffmpeg
             print(f"Esecuzione comando ffmpeg: {' '.join(cmd)}")
             self.stream_process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=10*frame_size
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                bufsize=0 if _HAS_READV else 10*frame_size
             )
             
             # Estrai frame finché ci sono dati
             frame_count = 0
             start_time = time.time()
             
-            while self.is_extracting:
-                # Leggi un frame completo
-                raw_frame = self.stream_process.stdout.read(frame_size)
-                if len(raw_frame) < frame_size:
-                    break  # Fine del video
-                
+            def publish(slot):
+                """Mette nel buffer il frame contenuto nello slot (scartato se il buffer è pieno)."""
+                nonlocal frame_count
                 try:
-                    # Converti i dati grezzi in un oggetto Image
-                    frame = Image.frombytes('RGB', (frame_width, frame_height), raw_frame)
-                    
-                    # Aggiungi al buffer con timeout minimo
-                    try:
-                        self.buffer.put(frame, timeout=0.1)
-                        frame_count += 1
-                        
-                        # Aggiorna il progresso
-                        if self.total_frames > 0:
-                            self.extraction_progress = min(100, int((frame_count / self.total_frames) * 100))
-                            if callback:
-                                callback(self.extraction_progress)
-                    except queue.Full:
-                        # Se il buffer è pieno, salta il frame
-                        continue
-                        
+                    # Immagine PIL sopra lo slot, senza copie
+                    frame = ring.image(slot)
                 except Exception as e:
+                    ring.release(slot)
                     print(f"Errore nel processare il frame: {e}")
-                    continue
+                    return
+                
+                # Aggiungi al buffer con timeout minimo
+                try:
+                    self.buffer.put(frame, timeout=0.1)
+                except queue.Full:
+                    # Se il buffer è pieno, salta il frame
+                    return
+                frame_count += 1
+                
+                # Aggiorna il progresso
+                if self.total_frames > 0:
+                    self.extraction_progress = min(100, int((frame_count / self.total_frames) * 100))
+                    if callback:
+                        callback(self.extraction_progress)
+            
+            stdout = self.stream_process.stdout
+            if _HAS_READV:
+                self._read_frames_vectored(stdout.fileno(), ring, publish)
+            else:
+                while self.is_extracting:
+                    slot = ring.acquire(timeout=0.5)
+                    if slot is None:
+                        # Tutti gli slot occupati: libera eventuali immagini rimaste in cicli
+                        gc.collect()
+                        continue
+                    
+                    # Leggi un frame completo direttamente nello slot
+                    if _read_exact(stdout, ring.view(slot)) < frame_size:
+                        ring.release(slot)
+                        break  # Fine del video
+                    publish(slot)
             
             # Segnala completamento
             self.extraction_complete = True
@@ -269,6 +460,58 @@ class AsyncVideoBuffer:
                 self.stream_process = None
         return True
     
+    def _read_frames_vectored(self, fd, ring, publish):
+        """
+        Legge i frame dalla pipe di ffmpeg con os.readv: ogni chiamata riempie
+        più slot del ring insieme. I byte di un frame incompleto restano nel
+        suo slot e la lettura successiva riprende da lì.
+        """
+        frame_size = ring.frame_size
+        
+        # Pipe più capiente (solo Linux): più dati per ogni chiamata di sistema
+        if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+            try:
+                fcntl.fcntl(fd, fcntl.F_SETPIPE_SZ, min(1 << 20, 2 * frame_size))
+            except OSError:
+                pass
+        
+        # Quanti slot riempire al massimo con una sola lettura
+        batch = max(1, min(ring.depth // 2, _READ_BATCH_BYTES // frame_size))
+        pending = []  # Slot riservati in attesa di dati (il primo può essere parziale)
+        filled = 0    # Byte già presenti nel primo slot in attesa
+        
+        try:
+            while self.is_extracting:
+                # Riserva gli slot: attende solo se non ne ha nessuno
+                if not pending:
+                    slot = ring.acquire(timeout=0.5)
+                    if slot is None:
+                        # Tutti gli slot occupati: libera eventuali immagini rimaste in cicli
+                        gc.collect()
+                        continue
+                    pending.append(slot)
+                while len(pending) < batch:
+                    slot = ring.acquire(timeout=0)
+                    if slot is None:
+                        break
+                    pending.append(slot)
+                
+                iov = [ring.view(pending[0])[filled:]]
+                iov.extend(ring.view(slot) for slot in pending[1:])
+                n = os.readv(fd, iov)
+                if n == 0:
+                    break  # Fine del video
+                
+                # Pubblica i frame completati
+                filled += n
+                while filled >= frame_size:
+                    filled -= frame_size
+                    publish(pending.pop(0))
+        finally:
+            # Rilascia gli slot non utilizzati (incluso un eventuale frame incompleto)
+            for slot in pending:
+                ring.release(slot)
+    
     def _extract_with_temp_files(self, video_path, fps, start_time, duration, callback):
         """Estrazione usando file temporanei."""
         try:
@@ -279,12 +522,13 @@ class AsyncVideoBuffer:
             
             print(f"Estrazione frame in: {temp_dir}")
             
-            # Definisci il comando ffmpeg
-            cmd = [self.ffmpeg_path, "-y", "-i", video_path]
-            
-            # Aggiungi opzioni di inizio e durata
+            # Definisci il comando ffmpeg, con il seek in ingresso (-ss prima di -i)
+            cmd = [self.ffmpeg_path, "-y"]
             if start_time > 0:
                 cmd.extend(["-ss", str(start_time)])
+            cmd.extend(["-i", video_path])
+            
+            # Aggiungi la durata
             if duration:
                 cmd.extend(["-t", str(duration)])
             
@@ -297,28 +541,25 @@ class AsyncVideoBuffer:
             # Esegui ffmpeg
             process = subprocess.Popen(
                 cmd, 
-                stdout=subprocess.PIPE,
+                stdout=subprocess.DEVNULL,
                 stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                bufsize=0
             )
             
             # Thread per leggere l'output di errore e monitorare il progresso
             def read_stderr():
-                for line in process.stderr:
-                    if "frame=" in line and "fps=" in line:
-                        try:
-                            # Parse del numero di frame estratti
-                            frame_str = line.split("frame=")[1].split()[0].strip()
-                            frame_num = int(frame_str)
-                            
-                            # Aggiorna il progresso
-                            self.extraction_progress = min(99, frame_num // 5)
-                            if callback:
-                                callback(self.extraction_progress)
-                        except:
-                            pass
+                # stderr letto come byte a blocchi: le statistiche di ffmpeg sono
+                # separate da \r, quindi non si divide in righe né si decodifica il testo
+                for chunk in iter(lambda: process.stderr.read(4096), b''):
+                    # Numero di frame estratti dall'ultima statistica del blocco
+                    frame_num = None
+                    for match in _FRAME_STATS_RE.finditer(chunk):
+                        frame_num = int(match.group(1))
+                    if frame_num is not None:
+                        # Aggiorna il progresso
+                        self.extraction_progress = min(99, frame_num // 5)
+                        if callback:
+                            callback(self.extraction_progress)
             
             stderr_thread = threading.Thread(target=read_stderr, daemon=True)
             stderr_thread.start()
@@ -331,8 +572,8 @@ class AsyncVideoBuffer:
                 print(f"Errore durante l'estrazione dei frame: {process.returncode}")
                 return False
             
-            # Elenca i frame estratti
-            frame_files = sorted(glob.glob(f"{temp_dir}/frame_*.jpg"))
+            # Percorsi dei frame estratti, ricavati dalla numerazione di ffmpeg
+            frame_files = [frame_file_path(temp_dir, i) for i in range(count_frame_files(temp_dir))]
             if not frame_files:
                 print("Nessun frame estratto!")
                 return False
@@ -344,9 +585,9 @@ class AsyncVideoBuffer:
             frame_count = 0
             for frame_path in frame_files:
                 try:
-                    # Carica l'immagine
-                    from PIL import Image
-                    img = Image.open(frame_path)
+                    # Decodifica completa qui, nel thread di estrazione: il frame nel
+                    # buffer non tiene aperto il file e non viene decodificato alla visualizzazione
+                    img = load_frame(frame_path)
                     
                     # Aggiungi al buffer
                     try:
@@ -391,16 +632,17 @@ class AsyncVideoBuffer:
         except queue.Empty:
             return None
     
+    def try_get_nowait(self):
+        """Ottiene il prossimo frame senza attendere; None se il buffer è vuoto."""
+        return self.buffer.try_get_nowait()
+    
     def skip_frames(self, count=1):
         """Salta un numero specifico di frame nel buffer."""
         skipped = 0
-        for _ in range(count):
-            try:
-                self.buffer.get(block=False)
-                self.skipped_frames += 1
-                skipped += 1
-            except queue.Empty:
-                break
+        try_get = self.buffer.try_get_nowait
+        while skipped < count and try_get() is not None:
+            skipped += 1
+        self.skipped_frames += skipped
         return skipped
     
     def get_skipped_frames_count(self):
@@ -473,11 +715,7 @@ class AsyncVideoBuffer:
                 pass
         
         # Svuota il buffer
-        while not self.buffer.empty():
-            try:
-                self.buffer.get_nowait()
-            except queue.Empty:
-                break
+        self.buffer.clear()
 
     def _detect_low_performance_system(self):
         """Rileva se il sistema è a basse prestazioni."""
@@ -528,16 +766,25 @@ class AsyncVideoBuffer:
         
         self.is_rendering = True
         self.render_complete = False
+        self.render_size = (term_width, term_height)
         
         self.rendering_thread = threading.Thread(
             target=self._pre_render_frames,
-            args=(processor, renderer, term_width, term_height),
+            args=(processor, renderer),
             daemon=True
         )
         self.rendering_thread.start()
         return True
+    
+    def set_render_size(self, term_width, term_height):
+        """
+        Nuova dimensione del terminale per il pre-rendering: i frame già renderizzati
+        con la dimensione precedente vengono scartati.
+        """
+        self.render_size = (term_width, term_height)
+        self.rendered_buffer.clear()
         
-    def _pre_render_frames(self, processor, renderer, term_width, term_height):
+    def _pre_render_frames(self, processor, renderer):
         """Thread worker per il pre-rendering dei frame."""
         rendered_count = 0
         try:
@@ -547,6 +794,9 @@ class AsyncVideoBuffer:
                     frame = self.buffer.get(block=True, timeout=0.5)
                     
                     if frame:
+                        # Dimensione letta a ogni frame: può cambiare durante la riproduzione
+                        term_width, term_height = self.render_size
+                        
                         # Processa il frame
                         processed_img = processor.process_image(frame, 1.0, 1.0)
                         
@@ -563,9 +813,9 @@ class AsyncVideoBuffer:
                             term_width, term_height
                         )
                         
-                        # Metti sia i dati renderizzati che il frame originale nel buffer
-                        # (il frame originale serve per eventuali processamenti ulteriori)
-                        self.rendered_buffer.put((pixel_data, frame), block=False)
+                        # Metti i dati renderizzati nel buffer; il frame originale non viene
+                        # conservato per non trattenere lo slot del ring
+                        self.rendered_buffer.put((pixel_data, None), block=False)
                         rendered_count += 1
                         
                         # Reinserisci il frame nel buffer principale per la riproduzione normale
@@ -600,12 +850,11 @@ class AsyncVideoBuffer:
             block: Se True, blocca finché un frame è disponibile
             
         Returns:
-            Tuple (pixel_data, raw_frame) o None se non disponibile
+            Tuple (pixel_data, None) o None se non disponibile
         """
-        try:
-            return self.rendered_buffer.get(block=block)
-        except queue.Empty:
-            return None
+        if not block:
+            return self.rendered_buffer.try_get_nowait()
+        return self.rendered_buffer.get(block=True)
             
     def skip_rendered_frames(self, count=1):
         """
@@ -618,12 +867,9 @@ class AsyncVideoBuffer:
             int: Numero effettivo di frame saltati
         """
         skipped = 0
-        for _ in range(count):
-            try:
-                self.rendered_buffer.get(block=False)
-                skipped += 1
-            except queue.Empty:
-                break
+        try_get = self.rendered_buffer.try_get_nowait
+        while skipped < count and try_get() is not None:
+            skipped += 1
         return skipped
         
     def analyze_playback_timing(self, target_fps, actual_fps):
@@ -7,12 +7,23 @@ Estrae tutti i frame, li pre-processa e li memorizza per una riproduzione fluida
 import os
 import sys
 import time
+import json
+import hashlib
 import threading
 import queue
 import subprocess
 from PIL import Image
 import tempfile
 import shutil
+from core import list_frame_files
+
+# NumPy è opzionale: con NumPy i frame pre-renderizzati sono salvati in un unico
+# file .npy mappato in memoria e riutilizzabile tra un'esecuzione e l'altra
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
 
 class CompleteVideoRenderer:
     """
@@ -48,6 +59,44 @@ class CompleteVideoRenderer:
         self.estimated_time = 0
         self.frame_times = []  # Per calcolare tempo medio per frame
         self.callback = None
+        # Frame pre-renderizzati in un np.memmap (N, H, W, 7): rgb superiore,
+        # rgb inferiore e maschera delle celle valide
+        self.frame_store = None
+        self.store_path = None
+    
+    def _store_paths(self, video_path, fps, term_width, term_height, start_time, duration,
+                     contrast, brightness):
+        """Percorsi (.npy, .json) della cache persistente per questi parametri di rendering."""
+        try:
+            mtime = os.path.getmtime(video_path)
+        except OSError:
+            mtime = 0
+        key = "|".join(str(v) for v in (os.path.abspath(video_path), mtime, fps, term_width,
+                                        term_height, start_time, duration, contrast, brightness))
+        # File nella cartella di cache principale: rimossi da cleanup_old_cache
+        base = os.path.join(self._cache_base_dir(),
+                            "prerender_" + hashlib.sha1(key.encode('utf-8')).hexdigest())
+        return base + ".npy", base + ".json"
+    
+    def _cache_base_dir(self):
+        """Cartella di cache di termimg."""
+        try:
+            from core import CACHE_DIR
+            return CACHE_DIR
+        except ImportError:
+            return os.path.join(tempfile.gettempdir(), "termimg")
+    
+    def _open_cached_store(self, npy_path, json_path):
+        """Apre in sola lettura una cache completa; restituisce il numero di frame o 0."""
+        try:
+            with open(json_path, 'r') as f:
+                meta = json.load(f)
+            if not meta.get('complete'):
+                return 0
+            self.frame_store = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return 0
+        return len(self.frame_store)
     
     def start_rendering(self, video_path, fps=24.0, term_width=80, term_height=24, 
                       start_time=0, duration=None, contrast=1.1, brightness=1.0,
@@ -75,14 +124,26 @@ class CompleteVideoRenderer:
         self.processed_frames = 0
         self.callback = callback
         self.render_start_time = time.time()
+        self.frame_store = None
         
-        # Crea directory temporanea per i frame renderizzati
-        try:
-            from core import CACHE_DIR
-            base_dir = os.path.join(CACHE_DIR, "complete_renders")
-        except ImportError:
-            base_dir = os.path.join(tempfile.gettempdir(), "termimg", "complete_renders")
+        if NUMPY_AVAILABLE:
+            # Stesso video con gli stessi parametri già pre-renderizzato: nessun rendering
+            npy_path, json_path = self._store_paths(video_path, fps, term_width, term_height,
+                                                    start_time, duration, contrast, brightness)
+            self.store_path = npy_path
+            cached_frames = self._open_cached_store(npy_path, json_path)
+            if cached_frames:
+                self.total_frames = self.processed_frames = cached_frames
+                self._update_progress(100, "Frame pre-renderizzati caricati dalla cache")
+                return True
+            # La cache verrà riscritta: fino al completamento non è valida
+            try:
+                os.remove(json_path)
+            except OSError:
+                pass
         
+        # Crea directory temporanea per i frame renderizzati
+        base_dir = os.path.join(self._cache_base_dir(), "complete_renders")
         os.makedirs(base_dir, exist_ok=True)
         self.rendered_frames_dir = os.path.join(base_dir, f"render_{int(time.time())}")
         os.makedirs(self.rendered_frames_dir, exist_ok=True)
@@ -103,23 +164,46 @@ class CompleteVideoRenderer:
         try:
             # Prima estrai tutti i frame del video
             self._update_progress(0, "Estrazione frame...")
-            frames_dir = self.video_manager.extract_frames(
-                video_path,
-                fps=fps,
-                start_time=start_time,
-                duration=duration,
-                callback=lambda p: self._update_progress(p*0.5, "Estrazione frame...")
-            )
+            extraction_callback = lambda p: self._update_progress(p*0.5, "Estrazione frame...")
+            
+            # Frame in memoria come pixel RGB grezzi, già adattati al terminale (nessun
+            # JPEG scritto e riletto); se non è possibile si estraggono i JPEG su disco
+            frames_dir = None
+            frame_files = None
+            video_info = self.video_manager.get_video_info(video_path)
+            if video_info and video_info.get('width') and video_info.get('height'):
+                fit_size = self.processor.fit_geometry(video_info['width'], video_info['height'],
+                                                       term_width, term_height)[:2]
+                self.total_frames = self.video_manager.extract_frames_piped(
+                    video_path, fps=fps, start_time=start_time, duration=duration,
+                    size=fit_size, callback=extraction_callback) or 0
             
-            if not frames_dir or self.is_cancelled:
+            if not self.total_frames and not self.is_cancelled:
+                frames_dir = self.video_manager.extract_frames(
+                    video_path,
+                    fps=fps,
+                    start_time=start_time,
+                    duration=duration,
+                    callback=extraction_callback,
+                    # I frame servono solo alla risoluzione del terminale (2 pixel per riga)
+                    target_width=term_width,
+                    target_height=term_height * 2
+                )
+                
+                if not frames_dir:
+                    self._update_progress(100, "Operazione annullata")
+                    self.is_rendering = False
+                    return
+                
+                # Percorsi dei frame in ordine numerico (anche oltre frame_9999)
+                frame_files = list_frame_files(frames_dir)
+                self.total_frames = len(frame_files)
+            
+            if self.is_cancelled:
                 self._update_progress(100, "Operazione annullata")
                 self.is_rendering = False
                 return
             
-            # Ottieni lista ordinata di frame
-            frame_files = sorted([f for f in os.listdir(frames_dir) if f.endswith(('.jpg', '.png'))])
-            self.total_frames = len(frame_files)
-            
             if self.total_frames == 0:
                 self._update_progress(100, "Nessun frame estratto")
                 self.is_rendering = False
@@ -127,6 +211,12 @@ class CompleteVideoRenderer:
             
             self._update_progress(50, f"Inizio rendering di {self.total_frames} frame...")
             
+            # Con NumPy i frame vengono scritti direttamente nel file mappato in memoria
+            if NUMPY_AVAILABLE:
+                self.frame_store = np.lib.format.open_memmap(
+                    self.store_path, mode='w+', dtype=np.uint8,
+                    shape=(self.total_frames, term_height, term_width, 7))
+            
             # Verifica se possiamo usare il rendering ad alta qualità
             use_high_quality = False
             try:
@@ -194,15 +284,14 @@ class CompleteVideoRenderer:
                 memory_monitor = None
                 
             # Pre-renderizza tutti i frame
-            for i, frame_file in enumerate(frame_files):
+            for i in range(self.total_frames):
                 if self.is_cancelled:
                     break
                     
-                frame_path = os.path.join(frames_dir, frame_file)
                 output_path = os.path.join(self.rendered_frames_dir, f"rendered_{i:06d}.dat")
                 
                 # Salta se il frame è già renderizzato
-                if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+                if self.frame_store is None and os.path.exists(output_path) and os.path.getsize(output_path) > 0:
                     self.processed_frames += 1
                     continue
                 
@@ -214,20 +303,22 @@ class CompleteVideoRenderer:
                 start_frame_time = time.time()
                 
                 # Carica e processa l'immagine
-                img = self.processor.load_image(frame_path)
+                if frame_files is None:
+                    img = self.video_manager.get_frame(i)
+                else:
+                    img = self.processor.load_image(frame_files[i])
                 
                 # Utilizzo elaborazione ad alta qualità se disponibile
                 if use_high_quality:
                     try:
                         # Pre-elabora con alta qualità
-                        img = video_hq_renderer.preprocess_video_frame(img, quality_level)
+                        img = video_hq_renderer.preprocess_video_frame(img, quality_level).convert('RGB')
                     except Exception as e:
+                        # Si prosegue con la sola elaborazione standard
                         print(f"Errore nell'elaborazione ad alta qualità: {e}")
-                        # Fallback all'elaborazione standard
-                        processed_img = self.processor.process_image(img, contrast, brightness)
-                else:
-                    # Elaborazione standard
-                    processed_img = self.processor.process_image(img, contrast, brightness)
+                
+                # Elaborazione standard (imposta anche il layer base usato dal ridimensionamento)
+                processed_img = self.processor.process_image(img, contrast, brightness)
                 
                 # Ridimensiona per adattarla al terminale
                 resized_img, target_width, target_height, padding_x, padding_y = self.processor.resize_for_terminal(
@@ -243,12 +334,19 @@ class CompleteVideoRenderer:
                 )
                 
                 # Salva i dati pre-renderizzati
-                try:
-                    import pickle
-                    with open(output_path, 'wb') as f:
-                        pickle.dump(pixel_data, f)
-                except (ImportError, IOError) as e:
-                    print(f"Errore nel salvare il frame renderizzato: {e}")
+                if self.frame_store is not None:
+                    top_rgb, bottom_rgb, valid = pixel_data
+                    frame = self.frame_store[i]
+                    frame[..., 0:3] = top_rgb
+                    frame[..., 3:6] = bottom_rgb
+                    frame[..., 6] = valid
+                else:
+                    try:
+                        import pickle
+                        with open(output_path, 'wb') as f:
+                            pickle.dump(pixel_data, f)
+                    except (ImportError, IOError) as e:
+                        print(f"Errore nel salvare il frame renderizzato: {e}")
                 
                 self.processed_frames += 1
                 
@@ -271,6 +369,10 @@ class CompleteVideoRenderer:
                     if use_high_quality and hasattr(video_hq_renderer, 'clear_cache'):
                         video_hq_renderer.clear_cache()
             
+            # I frame in memoria non servono più: restano solo quelli renderizzati
+            if frame_files is None:
+                self.video_manager.frame_buffers = None
+            
             # Pulisci la memoria
             if memory_monitor:
                 memory_monitor.stop_monitoring()
@@ -281,6 +383,13 @@ class CompleteVideoRenderer:
                     # Gestione sicura in caso di problemi
                     print("Impossibile ottenere statistiche memoria")
             
+            # Cache completa: le esecuzioni successive la riutilizzano senza rendering
+            if self.frame_store is not None and not self.is_cancelled:
+                self.frame_store.flush()
+                with open(os.path.splitext(self.store_path)[0] + ".json", 'w') as f:
+                    json.dump({'complete': True, 'frames': self.total_frames,
+                               'video_path': video_path}, f)
+            
             self._update_progress(100, "Rendering completato")
         
         except Exception as e:
@@ -306,6 +415,13 @@ class CompleteVideoRenderer:
         Returns:
             I dati del pixel renderizzato o None se non disponibile
         """
+        # Frame nel file mappato in memoria: viste senza copia
+        if self.frame_store is not None:
+            if frame_num >= self.processed_frames:
+                return None
+            frame = self.frame_store[frame_num]
+            return frame[..., 0:3], frame[..., 3:6], frame[..., 6].view(bool)
+        
         # Prima verifica nella cache in memoria
         if frame_num in self.frame_cache:
             return self.frame_cache[frame_num]
@@ -350,7 +466,8 @@ class CompleteVideoRenderer:
         return self.progress >= 100 and not self.is_rendering
     
     def cleanup(self):
-        """Pulisce le risorse allocate."""
+        """Pulisce le risorse allocate (la cache persistente dei frame resta su disco)."""
+        self.frame_store = None
         try:
             if self.rendered_frames_dir and os.path.exists(self.rendered_frames_dir):
                 shutil.rmtree(self.rendered_frames_dir, ignore_errors=True)
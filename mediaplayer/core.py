@@ -4,12 +4,16 @@ import shutil
 import tempfile
 import json
 import time
+import signal
+import contextlib
+import subprocess
 
 # Per gestione input cross-platform
 if os.name == 'nt':  # Windows
     import msvcrt
 else:  # Linux/Mac
     import select
+    import selectors
     import sys
     import tty
     import termios
@@ -168,10 +172,71 @@ def kbhit():
         dr, dw, de = select.select([sys.stdin], [], [], 0)
         return dr != []
 
+# Selettore con stdin già registrato, creato al primo uso (False se non disponibile)
+_INPUT_SELECTOR = None
+
+def _get_input_selector():
+    """Registra stdin una sola volta in un selettore (epoll/kqueue/poll)."""
+    global _INPUT_SELECTOR
+    if _INPUT_SELECTOR is None:
+        try:
+            selector = selectors.DefaultSelector()
+            selector.register(sys.stdin, selectors.EVENT_READ)
+            _INPUT_SELECTOR = selector
+        except (ValueError, OSError):
+            # stdin non selezionabile (es. file o pipe non supportata da epoll)
+            _INPUT_SELECTOR = False
+    return _INPUT_SELECTOR
+
+def input_ready(timeout=0):
+    """
+    Equivalente di kbhit() pensato per i loop di riproduzione: riusa lo stesso
+    selettore ad ogni chiamata invece di ricostruire le liste di select().
+    
+    Con timeout > 0 attende l'input fino a timeout secondi, sostituendo
+    la coppia kbhit() + time.sleep() con una sola chiamata.
+    """
+    if os.name == 'nt':  # Windows
+        if timeout > 0 and not msvcrt.kbhit():
+            time.sleep(timeout)
+        return msvcrt.kbhit()
+    selector = _INPUT_SELECTOR if _INPUT_SELECTOR is not None else _get_input_selector()
+    if selector is False:
+        if timeout > 0 and not kbhit():
+            time.sleep(timeout)
+        return kbhit()
+    return bool(selector.select(timeout))
+
+# Descrittore di stdin quando è già in modalità cbreak (vedi raw_input_mode)
+_RAW_FD = None
+
+@contextlib.contextmanager
+def raw_input_mode():
+    """
+    Mette stdin in modalità cbreak una sola volta per tutto il blocco, così
+    getch() legge direttamente il tasto senza cambiare i termios ad ogni chiamata.
+    Non fa nulla su Windows o se stdin non è un terminale.
+    """
+    global _RAW_FD
+    if os.name == 'nt' or _RAW_FD is not None or not sys.stdin.isatty():
+        yield
+        return
+    fd = sys.stdin.fileno()
+    old_settings = termios.tcgetattr(fd)
+    try:
+        tty.setcbreak(fd)
+        _RAW_FD = fd
+        yield
+    finally:
+        _RAW_FD = None
+        termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+
 def getch():
     """Legge un carattere senza visualizzarlo e senza attendere Enter."""
     if os.name == 'nt':  # Windows
         return msvcrt.getch().decode('utf-8', errors='ignore')
+    elif _RAW_FD is not None:  # Terminale già in modalità cbreak
+        return os.read(_RAW_FD, 1).decode('utf-8', errors='ignore')
     else:  # Linux/Mac
         fd = sys.stdin.fileno()
         old_settings = termios.tcgetattr(fd)
@@ -182,6 +247,114 @@ def getch():
             termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
         return ch
 
+def wait_input(timeout=None):
+    """
+    Attende un tasto per al massimo timeout secondi (None = senza limite).
+    Sostituisce i cicli kbhit() + time.sleep(0.1): il processo resta fermo
+    finché non arriva un tasto o scade il timeout.
+    
+    Returns:
+        Il tasto premuto, o None se il timeout è scaduto
+    """
+    if os.name != 'nt' and not sys.stdin.isatty():
+        # Nessun terminale (pipe, /dev/null): non ci sono tasti da attendere
+        if timeout is not None:
+            time.sleep(timeout)
+        return None
+    with raw_input_mode():
+        if os.name == 'nt':  # Windows: msvcrt non ha un'attesa bloccante
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not msvcrt.kbhit():
+                remaining = 0.01 if deadline is None else deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                time.sleep(min(remaining, 0.01))
+            return getch()
+        selector = _INPUT_SELECTOR if _INPUT_SELECTOR is not None else _get_input_selector()
+        if selector is False:
+            ready = select.select([sys.stdin], [], [], timeout)[0]
+        else:
+            ready = selector.select(timeout)
+        return getch() if ready else None
+
+class TerminalSizeMonitor:
+    """
+    Dimensioni del terminale in cache.
+    
+    Su POSIX vengono rilette solo quando arriva SIGWINCH; dove il segnale non
+    esiste (Windows) vengono ricontrollate ogni refresh_every frame.
+    """
+    
+    def __init__(self, refresh_every=30):
+        self.refresh_every = refresh_every
+        self.pending = False
+        self._old_handler = None
+        self._use_signal = False
+        self.columns, self.lines = shutil.get_terminal_size()
+    
+    def _on_resize(self, signum, frame):
+        self.pending = True
+    
+    def start(self):
+        """Installa il gestore di SIGWINCH (solo dal thread principale)."""
+        if hasattr(signal, 'SIGWINCH'):
+            try:
+                self._old_handler = signal.signal(signal.SIGWINCH, self._on_resize)
+                self._use_signal = True
+            except ValueError:
+                self._use_signal = False
+        return self
+    
+    def stop(self):
+        """Ripristina il gestore di SIGWINCH precedente."""
+        if self._use_signal:
+            signal.signal(signal.SIGWINCH, self._old_handler or signal.SIG_DFL)
+            self._use_signal = False
+    
+    def poll(self, frame_count=0):
+        """Restituisce True se le dimensioni del terminale sono cambiate."""
+        if not self.pending:
+            if self._use_signal or frame_count % self.refresh_every:
+                return False
+        self.pending = False
+        size = shutil.get_terminal_size()
+        if (size.columns, size.lines) == (self.columns, self.lines):
+            return False
+        self.columns, self.lines = size.columns, size.lines
+        return True
+
+class FrameWriter:
+    """
+    Buffer dell'output di un frame: posizionamenti del cursore e testo vengono
+    accumulati e scritti sul terminale con una sola write in flush().
+    """
+    
+    def __init__(self):
+        self.buf = bytearray()
+    
+    def move(self, row, col=1):
+        """Posiziona il cursore (riga e colonna da 1)."""
+        self.buf += b"\033[%d;%dH" % (row, col)
+        return self
+    
+    def text(self, s):
+        """Accoda testo (str o bytes)."""
+        self.buf += s if isinstance(s, (bytes, bytearray)) else s.encode('utf-8', 'replace')
+        return self
+    
+    def flush(self):
+        """Scrive il buffer con una sola chiamata e lo svuota."""
+        # Svuota prima il buffer di testo per non invertire l'ordine dell'output
+        sys.stdout.flush()
+        out = getattr(sys.stdout, 'buffer', None)
+        if out is None:
+            sys.stdout.write(self.buf.decode('utf-8', 'replace'))
+            sys.stdout.flush()
+        else:
+            out.write(self.buf)
+            out.flush()
+        self.buf.clear()
+
 def save_session(args):
     """Salva la sessione corrente per riavviare il programma con gli stessi parametri."""
     config = {
@@ -216,6 +389,47 @@ def cleanup_old_cache(max_age=86400):
     # Rimuovi il flag di refresh se esiste
     clear_refresh_flag()
 
+def list_frame_files(frames_dir, extensions=('.jpg', '.png')):
+    """
+    Percorsi dei frame estratti (frame_0001.jpg, ...) in ordine numerico:
+    con più di 9999 frame i nomi di ffmpeg non hanno più la stessa lunghezza
+    e l'ordine alfabetico non sarebbe corretto.
+    """
+    entries = []
+    with os.scandir(frames_dir) as it:
+        for entry in it:
+            name = entry.name
+            if name.endswith(extensions):
+                number = name.rsplit('.', 1)[0].rsplit('_', 1)[-1]
+                entries.append((int(number) if number.isdigit() else -1, name, entry.path))
+    entries.sort()
+    return [path for _, _, path in entries]
+
+def frame_file_path(frames_dir, index):
+    """Percorso del frame di indice index (da 0) scritto da ffmpeg con frame_%04d.jpg."""
+    return os.path.join(frames_dir, f"frame_{index + 1:04d}.jpg")
+
+def count_frame_files(frames_dir):
+    """
+    Numero di frame frame_0001.jpg, ... in frames_dir. ffmpeg li numera senza buchi,
+    quindi basta cercare l'ultimo esistente: raddoppi e ricerca binaria, O(log N)
+    controlli invece della lettura dell'intera directory.
+    """
+    if not os.path.exists(frame_file_path(frames_dir, 0)):
+        return 0
+    # Raddoppia finché il frame esiste: il conteggio è in [low, high)
+    low, high = 1, 2
+    while os.path.exists(frame_file_path(frames_dir, high - 1)):
+        low, high = high, high * 2
+    # Ricerca binaria dell'ultimo frame esistente
+    while high - low > 1:
+        mid = (low + high) // 2
+        if os.path.exists(frame_file_path(frames_dir, mid - 1)):
+            low = mid
+        else:
+            high = mid
+    return low
+
 def is_image_file(filepath):
     """Verifica se il file è un'immagine basandosi sull'estensione."""
     if not os.path.isfile(filepath):
@@ -268,3 +482,27 @@ def get_ffmpeg_paths():
     
     # In ogni altro caso, usa il comando diretto (ricerca nel PATH)
     return "ffmpeg", "ffprobe"
+
+# Esito di "ffmpeg -version" per percorso: il processo viene avviato una volta sola
+_FFMPEG_AVAILABLE = {}
+
+def has_ffmpeg(ffmpeg_path=None):
+    """
+    Verifica che ffmpeg sia installato e funzionante (risultato in cache).
+    
+    Args:
+        ffmpeg_path: Eseguibile da verificare (default: quello di get_ffmpeg_paths)
+    """
+    if ffmpeg_path is None:
+        ffmpeg_path = get_ffmpeg_paths()[0]
+    available = _FFMPEG_AVAILABLE.get(ffmpeg_path)
+    if available is None:
+        try:
+            available = subprocess.run([ffmpeg_path, "-version"],
+                                       stdout=subprocess.DEVNULL,
+                                       stderr=subprocess.DEVNULL,
+                                       timeout=3).returncode == 0
+        except (OSError, subprocess.SubprocessError):
+            available = False
+        _FFMPEG_AVAILABLE[ffmpeg_path] = available
+    return available
@@ -72,7 +72,8 @@ def main():
     # Inizializza renderer e processor per simulare la riproduzione reale
     processor = ImageProcessor()
     renderer = TerminalRenderer()
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
     # Avvio estrazione
     start_time = time.time()
@@ -111,12 +112,7 @@ def main():
         
         # Salta frame se necessario
         if frames_behind > 1:
-            for _ in range(min(frames_behind - 1, 3)):
-                try:
-                    buffer.get_frame(block=False, timeout=0.01)
-                    frame_skip_count += 1
-                except queue.Empty:
-                    break
+            frame_skip_count += buffer.skip_frames(min(frames_behind - 1, 3))
         
         # Prendi il frame corrente
         try:
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Dithering Floyd-Steinberg per il rendering nel terminale.
+Con Numba l'error diffusion avviene in luce lineare in un kernel compilato;
+senza Numba si usa il dithering (in sRGB) di Pillow.
+I livelli di ogni canale sono i valori del cubo 6x6x6 della palette di xterm,
+cioè i colori che il terminale mostra davvero.
+"""
+
+from PIL import Image
+
+# NumPy e Numba sono opzionali
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _srgb_to_linear(values):
+    """Converte valori sRGB 0..1 in luce lineare (array NumPy)."""
+    return np.where(values <= 0.04045, values / 12.92,
+                    ((values + 0.055) / 1.055) ** 2.4).astype(np.float32)
+
+
+if NUMPY_AVAILABLE:
+    # Tabella sRGB 0..255 → luce lineare, calcolata una volta: le conversioni
+    # per pixel e per livello diventano un semplice indicizzamento
+    SRGB_TO_LINEAR = _srgb_to_linear(np.arange(256, dtype=np.float32) / 255.0)
+
+
+def _fs_dither(img_lin, level_lin, level_values):
+    """
+    Floyd-Steinberg serpentino su un array (H, W, 3) float32 in luce lineare,
+    modificato sul posto.
+
+    Args:
+        img_lin: Immagine in luce lineare 0..1
+        level_lin: Livelli disponibili per canale, in luce lineare
+        level_values: Gli stessi livelli in sRGB (uint8), scritti nell'uscita
+
+    Returns:
+        Array (H, W, 3) uint8 con i livelli scelti, già riportati in sRGB
+    """
+    height, width = img_lin.shape[0], img_lin.shape[1]
+    levels = level_lin.shape[0]
+    out = np.empty((height, width, 3), dtype=np.uint8)
+
+    for y in range(height):
+        # Scansione serpentina: le righe dispari vanno da destra a sinistra
+        if y % 2 == 0:
+            x_start, x_stop, step = 0, width, 1
+        else:
+            x_start, x_stop, step = width - 1, -1, -1
+
+        for x in range(x_start, x_stop, step):
+            for c in range(3):
+                old = img_lin[y, x, c]
+
+                # Livello più vicino in luce lineare
+                best = 0
+                best_dist = abs(old - level_lin[0])
+                for k in range(1, levels):
+                    dist = abs(old - level_lin[k])
+                    if dist < best_dist:
+                        best = k
+                        best_dist = dist
+                out[y, x, c] = level_values[best]
+
+                # Distribuisce l'errore: 7/16 avanti, 3/16, 5/16, 1/16 sulla riga sotto
+                err = old - level_lin[best]
+                xn = x + step
+                xp = x - step
+                if 0 <= xn < width:
+                    img_lin[y, xn, c] += err * 0.4375
+                if y + 1 < height:
+                    if 0 <= xp < width:
+                        img_lin[y + 1, xp, c] += err * 0.1875
+                    img_lin[y + 1, x, c] += err * 0.3125
+                    if 0 <= xn < width:
+                        img_lin[y + 1, xn, c] += err * 0.0625
+
+    return out
+
+
+if NUMBA_AVAILABLE:
+    fs_dither = njit(cache=True, fastmath=True)(_fs_dither)
+else:
+    fs_dither = _fs_dither
+
+
+def _level_values(levels):
+    """
+    Valori sRGB 0..255 dei levels livelli di un canale: per ogni livello equispaziato
+    si prende il valore di xterm del passo del cubo in cui cade. I valori stanno così
+    al centro dei passi anche per la tabella a 6 bit di lookup_ansi, che i livelli
+    equispaziati 51 e 102 (bordi dei passi) farebbero scendere di un passo.
+    """
+    from terminal_renderer import _XTERM_LEVELS
+    
+    return [_XTERM_LEVELS[(k * 255 + (levels - 1) // 2) // (levels - 1) * 5 // 255]
+            for k in range(levels)]
+
+
+def _level_palette(levels):
+    """Immagine palette di Pillow con il cubo levels³ dei colori di _level_values."""
+    values = _level_values(levels)
+    colors = []
+    for r in values:
+        for g in values:
+            for b in values:
+                colors.extend((r, g, b))
+    palette = Image.new('P', (1, 1))
+    palette.putpalette(colors + [0] * (768 - len(colors)))
+    return palette
+
+
+def dither_image(img, levels):
+    """
+    Applica Floyd-Steinberg riducendo ogni canale a levels livelli.
+
+    Args:
+        img: Immagine PIL
+        levels: Livelli per canale (2-6)
+
+    Returns:
+        Nuova immagine PIL in modalità RGB
+    """
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if not NUMBA_AVAILABLE:
+        # Senza Numba il ciclo Python sarebbe troppo lento: dithering in C di Pillow
+        return img.quantize(palette=_level_palette(levels),
+                            dither=Image.FLOYDSTEINBERG).convert('RGB')
+
+    # I livelli sono gli stessi valori uint8 scritti dal kernel, letti dalla tabella
+    level_values = np.array(_level_values(levels), dtype=np.uint8)
+    img_lin = SRGB_TO_LINEAR[np.asarray(img)]
+    return Image.fromarray(fs_dither(img_lin, SRGB_TO_LINEAR[level_values], level_values), 'RGB')
+
+
+if NUMBA_AVAILABLE:
+    # Compila subito il kernel: il costo del JIT non ricade sulla prima immagine
+    fs_dither(np.zeros((2, 2, 3), dtype=np.float32), SRGB_TO_LINEAR[[0, 255]],
+              np.array([0, 255], dtype=np.uint8))
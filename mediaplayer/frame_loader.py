@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Caricamento veloce dei frame estratti durante la riproduzione.
+I JPEG vengono decodificati già ridotti (scalatura nella IDCT) alla dimensione
+utile per il terminale: con PyTurboJPEG se disponibile, altrimenti con draft() di Pillow.
+"""
+
+import math
+import mmap
+from PIL import Image
+
+# PyTurboJPEG è opzionale (richiede anche la libreria libturbojpeg)
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TURBOJPEG = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except (ImportError, OSError, RuntimeError):
+    TURBOJPEG_AVAILABLE = False
+
+# Fattori di riduzione supportati dalla IDCT di libjpeg, dal più piccolo
+_SCALING_FACTORS = ((1, 8), (1, 4), (3, 8), (1, 2), (5, 8), (3, 4), (7, 8), (1, 1))
+
+
+def _requested_size(width, height, fit_box):
+    """Dimensione minima che l'immagine deve avere per riempire fit_box mantenendo le proporzioni."""
+    box_width, box_height = fit_box
+    scale = min(box_width / max(1, width), box_height / max(1, height), 1.0)
+    return max(1, math.ceil(width * scale)), max(1, math.ceil(height * scale))
+
+
+def load_frame(path, fit_box=None):
+    """
+    Carica un frame come immagine PIL RGB, leggendo il file tramite mmap.
+
+    Args:
+        path: Percorso del frame
+        fit_box: (larghezza, altezza) in pixel dell'area in cui verrà adattato;
+                 se indicato, i JPEG vengono decodificati alla scala minima sufficiente
+
+    Returns:
+        Immagine PIL in modalità RGB
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if TURBOJPEG_AVAILABLE and path.lower().endswith(('.jpg', '.jpeg')):
+            scaling_factor = None
+            if fit_box is not None:
+                width, height = _TURBOJPEG.decode_header(buf)[:2]
+                req_width, req_height = _requested_size(width, height, fit_box)
+                scaling_factor = next(
+                    (num, den) for num, den in _SCALING_FACTORS
+                    if width * num // den >= req_width and height * num // den >= req_height)
+            return Image.fromarray(_TURBOJPEG.decode(buf, pixel_format=TJPF_RGB,
+                                                     scaling_factor=scaling_factor), 'RGB')
+
+        img = Image.open(buf)
+        if fit_box is not None and img.format == 'JPEG':
+            img.draft('RGB', _requested_size(img.width, img.height, fit_box))
+        # Decodifica completa prima di chiudere la mappatura
+        img.load()
+        return img if img.mode == 'RGB' else img.convert('RGB')
@@ -4,6 +4,16 @@ import sys
 import time
 from core import CACHE_DIR
 
+def tone_lut(mean, contrast, brightness):
+    """Tabella di 256 valori con contrasto (attorno a mean) e luminosità, come ImageEnhance."""
+    lut = []
+    for value in range(256):
+        v = int(mean + contrast * (value - mean))
+        v = 0 if v < 0 else 255 if v > 255 else v
+        v = int(v * brightness)
+        lut.append(0 if v < 0 else 255 if v > 255 else v)
+    return lut
+
 class ImageProcessor:
     def __init__(self):
         self.layers = {}
@@ -45,14 +55,40 @@ class ImageProcessor:
             sys.exit(1)
     
     def enhance_image(self, img, contrast=1.1, brightness=1.0):
-        """Applica miglioramenti minimali all'immagine."""
+        """
+        Applica miglioramenti minimali all'immagine.
+        
+        Contrasto e luminosità sono fusi in un'unica tabella applicata con
+        point(): un solo passaggio sui pixel e una sola immagine allocata,
+        invece delle immagini intermedie create da ImageEnhance.
+        """
+        if contrast == 1.0 and brightness == 1.0:
+            return img
+        if img.mode not in ('RGB', 'RGBA', 'RGBX'):
+            if contrast != 1.0:
+                img = ImageEnhance.Contrast(img).enhance(contrast)
+            if brightness != 1.0:
+                img = ImageEnhance.Brightness(img).enhance(brightness)
+            return img
+        
+        # Grigio medio come in ImageEnhance.Contrast, ricavato dagli istogrammi
+        # dei canali invece di convertire l'immagine in scala di grigi
+        mean = 0
         if contrast != 1.0:
-            enhancer = ImageEnhance.Contrast(img)
-            img = enhancer.enhance(contrast)
-        if brightness != 1.0:
-            enhancer = ImageEnhance.Brightness(img)
-            img = enhancer.enhance(brightness)
-        return img
+            hist = img.histogram()
+            pixels = img.width * img.height or 1
+            channel_means = [
+                sum(i * n for i, n in enumerate(hist[band * 256:(band + 1) * 256])) / pixels
+                for band in range(3)
+            ]
+            mean = int(0.299 * channel_means[0] + 0.587 * channel_means[1]
+                       + 0.114 * channel_means[2] + 0.5)
+        
+        lut = tone_lut(mean, contrast, brightness)
+        
+        # Il canale alfa/di riempimento resta invariato
+        bands = len(img.getbands())
+        return img.point(lut * 3 + list(range(256)) * (bands - 3))
 
     def process_image(self, img, contrast=1.1, brightness=1.0):
         """Processo semplificato dell'immagine."""
@@ -70,6 +106,39 @@ class ImageProcessor:
         self.layers['base'] = img
         return img
 
+    def fit_geometry(self, orig_width, orig_height, term_width, term_height):
+        """
+        Dimensioni e padding dell'immagine in modalità "fit" (proporzioni mantenute).
+        
+        Returns:
+            Tuple (target_width, target_height, padding_x, padding_y)
+        """
+        # Ogni carattere rappresenta 2 pixel verticali
+        max_term_width = max(1, term_width)
+        max_term_height = max(1, term_height * 2)
+        
+        # Mantiene l'aspect ratio
+        aspect_ratio = orig_width / max(1, orig_height)  # Evita divisione per zero
+        
+        # Calcola le dimensioni adattate alla finestra mantenendo le proporzioni
+        if max_term_width / max_term_height < aspect_ratio:
+            # Limitato dalla larghezza
+            target_width = max_term_width
+            target_height = int(target_width / aspect_ratio)
+        else:
+            # Limitato dall'altezza
+            target_height = max_term_height
+            target_width = int(target_height * aspect_ratio)
+        
+        # Assicura che le dimensioni minime siano rispettate
+        target_width = max(1, min(target_width, max_term_width))
+        target_height = max(1, min(target_height, max_term_height))
+        
+        # Calcola padding per centrare l'immagine
+        padding_x = max(0, (max_term_width - target_width) // 2)
+        padding_y = max(0, (term_height - (target_height // 2)) // 2)
+        return target_width, target_height, padding_x, padding_y
+
     def resize_for_terminal(self, img, term_width, term_height, mode="fit"):
         """Ridimensiona l'immagine per adattarla al terminale in modo ottimizzato."""
         orig_width, orig_height = img.size
@@ -90,26 +159,8 @@ class ImageProcessor:
         
         # Calcola dimensioni target e padding in base alla modalità
         if mode == "fit":
-            # Mantiene l'aspect ratio
-            aspect_ratio = orig_width / max(1, orig_height)  # Evita divisione per zero
-            
-            # Calcola le dimensioni adattate alla finestra mantenendo le proporzioni
-            if max_term_width / max_term_height < aspect_ratio:
-                # Limitato dalla larghezza
-                target_width = max_term_width
-                target_height = int(target_width / aspect_ratio)
-            else:
-                # Limitato dall'altezza
-                target_height = max_term_height
-                target_width = int(target_height * aspect_ratio)
-            
-            # Assicura che le dimensioni minime siano rispettate
-            target_width = max(1, min(target_width, max_term_width))
-            target_height = max(1, min(target_height, max_term_height))
-            
-            # Calcola padding per centrare l'immagine
-            padding_x = max(0, (max_term_width - target_width) // 2)
-            padding_y = max(0, (term_height - (target_height // 2)) // 2)
+            target_width, target_height, padding_x, padding_y = self.fit_geometry(
+                orig_width, orig_height, term_width, term_height)
             
         elif mode == "stretch":
             # Riempie tutto lo spazio
@@ -119,7 +170,6 @@ class ImageProcessor:
             
         else:  # "fill"
             # Riempie mantenendo aspect ratio, può tagliare parti
-            aspect_ratio = orig_width / max(1, orig_height)
             h_ratio = max_term_width / max(1, orig_width)
             v_ratio = max_term_height / max(1, orig_height)
             
@@ -161,12 +211,18 @@ class ImageProcessor:
             target_height = max(1, target_height)
             # Evita ridimensionamenti non necessari per migliori prestazioni
             if self.layers['base'].size != (target_width, target_height):
-                base_img = self.layers['base'].copy()
-                # Usa LANCZOS per immagini grandi, NEAREST per immagini piccole (più veloce)
-                resize_method = Image.LANCZOS if max(target_width, target_height) > 100 else Image.NEAREST
-                self.layers['base'] = base_img.resize((target_width, target_height), resize_method)
+                # resize() restituisce già una nuova immagine: nessuna copia preventiva.
+                # Usa LANCZOS per immagini grandi, NEAREST per immagini piccole (più veloce);
+                # reducing_gap riduce prima per fattori interi i frame molto più grandi
+                if max(target_width, target_height) > 100:
+                    self.layers['base'] = self.layers['base'].resize(
+                        (target_width, target_height), Image.LANCZOS, reducing_gap=3.0)
+                else:
+                    self.layers['base'] = self.layers['base'].resize(
+                        (target_width, target_height), Image.NEAREST)
         else:
             # In modalità fill, il layer base è già stato ridimensionato e ritagliato
-            self.layers['base'] = img.copy()
+            # (crop restituisce una nuova immagine, non serve copiarla)
+            self.layers['base'] = img
         
         return img, target_width, target_height, padding_x, padding_y
@@ -8,12 +8,22 @@ import os
 import sys
 import platform
 import subprocess
+from functools import lru_cache
 
 def detect_platform():
     """
     Rileva e restituisce informazioni dettagliate sulla piattaforma corrente.
     Utile per personalizzare il comportamento su diversi sistemi.
     """
+    # La piattaforma non cambia durante l'esecuzione: solo le dimensioni del
+    # terminale vengono rilette, il resto viene calcolato una volta sola
+    info = dict(_detect_static_platform())
+    info['terminal_size'] = os.get_terminal_size() if hasattr(os, 'get_terminal_size') else (80, 24)
+    return info
+
+@lru_cache(maxsize=1)
+def _detect_static_platform():
+    """Caratteristiche della piattaforma che non cambiano durante l'esecuzione."""
     info = {
         'system': platform.system().lower(),
         'release': platform.release(),
@@ -21,7 +31,6 @@ def detect_platform():
         'python_version': platform.python_version(),
         'implementation': platform.python_implementation(),
         'is_64bit': sys.maxsize > 2**32,
-        'terminal_size': os.get_terminal_size() if hasattr(os, 'get_terminal_size') else (80, 24),
     }
     
     # Potrebbe essere un ambiente mobile?
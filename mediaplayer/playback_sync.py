@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Calcoli di sincronizzazione della riproduzione video.
+Solo aritmetica intera (ns/µs): se Numba è disponibile la funzione viene compilata,
+altrimenti si usa la versione Python equivalente.
+"""
+
+# Numba è opzionale
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+def _sync_tick(frame_count, frame_ns, start_ns, now_ns, drift_correction_us,
+               smooth_q8, sync_enabled, smart_sync, sync_interval, adaptive,
+               actual_fps10, fps_threshold10):
+    """
+    Calcola il tempo di attesa prima del prossimo frame e aggiorna la correzione della deriva.
+
+    Args:
+        frame_count: Frame visualizzati finora
+        frame_ns: Durata teorica di un frame (ns)
+        start_ns: Istante di inizio riproduzione (ns)
+        now_ns: Istante corrente (ns)
+        drift_correction_us: Correzione della deriva accumulata (µs)
+        smooth_q8: Fattore di fluidità in virgola fissa Q8 (256 = 1.0)
+        sync_enabled: Sincronizzazione attiva
+        smart_sync: Sincronizzazione intelligente (hardware limitato)
+        sync_interval: Ogni quanti frame correggere la deriva
+        adaptive: Modalità adattiva attiva
+        actual_fps10: FPS misurati, in decimi
+        fps_threshold10: Soglia minima di FPS accettabili, in decimi
+
+    Returns:
+        Tuple (sleep_us, drift_correction_us, drift_us); drift_us è 0 se la
+        deriva non è stata misurata in questo frame
+    """
+    ideal_ns = frame_count * frame_ns
+    target_frame_ns = start_ns + ideal_ns + drift_correction_us * 1000
+    drift_us = 0
+
+    # Regola la sincronizzazione periodicamente
+    if sync_enabled and frame_count % sync_interval == 0:
+        # Deriva tra tempo reale e ideale trascorso
+        drift_us = (now_ns - start_ns - ideal_ns) // 1000
+
+        if abs(drift_us) > 50000:  # Solo se la deriva è significativa
+            if smart_sync and actual_fps10 < fps_threshold10 and drift_us > 500000:
+                # Sistema sovraccaricato: affidati al salto di frame, niente correzione
+                drift_correction_us = 0
+            else:
+                # Applica gradualmente (10% della deriva), al massimo ±0.5s
+                drift_correction_us += max(-500000, min(500000, -drift_us // 10))
+        else:
+            drift_us = 0
+
+    # Tempo di attesa fino al prossimo frame
+    sleep_us = (target_frame_ns - now_ns) // 1000
+    if sleep_us < 0:
+        sleep_us = 0
+
+    # Se il modo adattivo è attivo, regola il tempo di sleep
+    if adaptive and smooth_q8 != 256:
+        sleep_us = (sleep_us * smooth_q8) >> 8
+
+    return sleep_us, drift_correction_us, drift_us
+
+
+if NUMBA_AVAILABLE:
+    sync_tick = njit(cache=True, boundscheck=False)(_sync_tick)
+    # Compila subito (interi e bool come nel loop di riproduzione): il costo del JIT
+    # non ricade sul primo frame video
+    sync_tick(0, 1, 0, 0, 0, 256, True, True, 30, True, 0, 0)
+else:
+    sync_tick = _sync_tick
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Preparazione dei frame video in un solo passaggio sull'immagine sorgente.
+Sostituisce la catena process_image → resize_for_terminal → prepare_pixel_data:
+l'immagine viene ridotta subito alla risoluzione del terminale (media a blocchi)
+e contrasto/luminosità si applicano ai soli pixel ridotti, senza creare
+immagini intermedie a piena risoluzione.
+"""
+
+from PIL import Image
+from image_processor import tone_lut
+
+# NumPy e Numba sono opzionali
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _box_reduce(src, out):
+        """
+        Media a blocchi di src (H, W, C) uint8 in out (h, w, 3) uint8, righe in parallelo.
+        Ogni pixel sorgente viene letto una sola volta; in ingrandimento si prende
+        il pixel più vicino.
+        """
+        src_h, src_w = src.shape[0], src.shape[1]
+        out_h, out_w = out.shape[0], out.shape[1]
+        for oy in prange(out_h):
+            sy0 = oy * src_h // out_h
+            sy1 = max(sy0 + 1, (oy + 1) * src_h // out_h)
+            for ox in range(out_w):
+                sx0 = ox * src_w // out_w
+                sx1 = max(sx0 + 1, (ox + 1) * src_w // out_w)
+                r = np.int64(0)
+                g = np.int64(0)
+                b = np.int64(0)
+                for sy in range(sy0, sy1):
+                    for sx in range(sx0, sx1):
+                        r += src[sy, sx, 0]
+                        g += src[sy, sx, 1]
+                        b += src[sy, sx, 2]
+                count = (sy1 - sy0) * (sx1 - sx0)
+                half = count // 2
+                out[oy, ox, 0] = (r + half) // count
+                out[oy, ox, 1] = (g + half) // count
+                out[oy, ox, 2] = (b + half) // count
+
+
+def reduce_image(img, width, height):
+    """Riduce img a width x height con una media a blocchi (kernel Numba se disponibile)."""
+    if img.mode not in ('RGB', 'RGBA', 'RGBX'):
+        img = img.convert('RGB')
+    if not NUMBA_AVAILABLE:
+        # Filtro BOX di Pillow: stessa media a blocchi, in C
+        return img.resize((width, height), Image.BOX).convert('RGB')
+    out = np.empty((height, width, 3), dtype=np.uint8)
+    _box_reduce(np.asarray(img), out)
+    return Image.fromarray(out, 'RGB')
+
+
+def prepare_frame(processor, renderer, img, term_width, term_height,
+                  contrast=1.1, brightness=1.0, out=None):
+    """
+    Equivalente di process_image + resize_for_terminal("fit") + prepare_pixel_data.
+    Il grigio medio per il contrasto è calcolato sull'immagine ridotta;
+    out viene passato a prepare_pixel_data per riutilizzarne gli array.
+
+    Returns:
+        pixel_data come restituito da renderer.prepare_pixel_data
+    """
+    target_width, target_height, padding_x, padding_y = processor.fit_geometry(
+        max(1, img.width), max(1, img.height), term_width, term_height)
+    small = reduce_image(img, target_width, target_height)
+
+    if contrast != 1.0 or brightness != 1.0:
+        mean = 0
+        if contrast != 1.0:
+            hist = small.histogram()
+            pixels = target_width * target_height
+            channel_means = [
+                sum(i * n for i, n in enumerate(hist[band * 256:(band + 1) * 256])) / pixels
+                for band in range(3)
+            ]
+            mean = int(0.299 * channel_means[0] + 0.587 * channel_means[1]
+                       + 0.114 * channel_means[2] + 0.5)
+        small = small.point(tone_lut(mean, contrast, brightness) * 3)
+
+    return renderer.prepare_pixel_data(small, target_width, target_height,
+                                       padding_x, padding_y, term_width, term_height, out)
+
+
+if NUMBA_AVAILABLE:
+    # Compila subito il kernel: il costo del JIT non ricade sul primo frame
+    _box_reduce(np.zeros((2, 2, 3), dtype=np.uint8), np.empty((1, 1, 3), dtype=np.uint8))
@@ -0,0 +1,19 @@
+#!/usr/bin/env python3
+"""
+Compila l'estensione Cython opzionale del renderer:
+
+    python setup.py build_ext --inplace
+
+Senza l'estensione TermImg usa la versione Python equivalente.
+"""
+
+from setuptools import setup, Extension
+from Cython.Build import cythonize
+
+setup(
+    name="termimg-renderer-core",
+    ext_modules=cythonize(
+        [Extension("_renderer_core", ["_renderer_core.pyx"])],
+        language_level=3,
+    ),
+)
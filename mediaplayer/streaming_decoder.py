@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Decodifica diretta dei video con PyAV (binding di libav).
+I frame arrivano in memoria uno alla volta, senza l'estrazione su disco in JPEG
+fatta da VideoManager.extract_frames.
+"""
+
+# PyAV è opzionale: senza di esso si usa l'estrazione dei frame con ffmpeg
+try:
+    import av
+    AV_AVAILABLE = True
+except ImportError:
+    AV_AVAILABLE = False
+
+
+def probe_video(path):
+    """
+    Informazioni essenziali sul primo flusso video.
+
+    Returns:
+        Tuple (width, height, duration) con la durata in secondi (0 se sconosciuta),
+        oppure None se il file non è leggibile
+    """
+    try:
+        with av.open(path) as container:
+            stream = container.streams.video[0]
+            if container.duration:
+                duration = container.duration / av.time_base
+            elif stream.duration and stream.time_base:
+                duration = float(stream.duration * stream.time_base)
+            else:
+                duration = 0.0
+            return stream.width, stream.height, duration
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def stream_frames(path, duration=None):
+    """
+    Decodifica il video con i thread di libav e restituisce i frame uno alla volta.
+    La conversione in RGB è lasciata al chiamante (frame.to_image), così i frame
+    in ritardo possono essere scartati senza convertirli.
+
+    Args:
+        path: Percorso del video
+        duration: Secondi da decodificare (None = tutto il video)
+
+    Yields:
+        Tuple (pts_sec, frame) con frame di tipo av.VideoFrame
+    """
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        for frame in container.decode(stream):
+            if frame.pts is None:
+                continue
+            pts = float(frame.pts * stream.time_base)
+            if duration is not None and pts >= duration:
+                break
+            yield pts, frame
@@ -7,15 +7,19 @@ from PIL import Image
 import threading
 import subprocess
 import queue
+import collections
+import functools
+import gc
 
 # Importa i moduli personalizzati
 from core import (
-    ensure_dirs, clear_screen, clear_refresh_flag, kbhit, getch,
+    ensure_dirs, clear_screen, clear_refresh_flag, kbhit, getch, input_ready,
+    TerminalSizeMonitor,
     save_session, load_session, cleanup_old_cache, 
     get_file_type, is_image_file, is_video_file
 )
 from image_processor import ImageProcessor
-from terminal_renderer import TerminalRenderer
+from terminal_renderer import TerminalRenderer, TWO_DIGITS
 from video_manager import VideoManager
 
 # Variabili globali per la gestione dello stato
@@ -50,7 +54,8 @@ def process_svg(args):
         return
     
     # Ottieni dimensioni del terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
     # Inizializza processore e renderer
     processor = ImageProcessor()
@@ -256,7 +261,8 @@ def process_images(args):
     print(f"Caricamento immagine: {args.file_paths[0]}")
     
     # Ottieni dimensioni del terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
     # Inizializza processore e renderer
     processor = ImageProcessor()
@@ -396,6 +402,11 @@ def show_extraction_progress():
     else:
         print(f"\r\033[K✗ Estrazione interrotta dopo {elapsed:.1f}s                          ")
 
+def _clock_bytes(seconds):
+    """Formatta un tempo in secondi come MM:SS (bytes) usando la tabella delle cifre."""
+    minutes, seconds = divmod(int(seconds), 60)
+    return (TWO_DIGITS[minutes] if minutes < 100 else b"%d" % minutes) + b":" + TWO_DIGITS[seconds]
+
 def process_video(args):
     """Processa e visualizza video o sequenze di immagini."""
     global VIDEO_EXTRACTION_PROGRESS, VIDEO_EXTRACTION_COMPLETED, VIDEO_EXTRACTION_STARTED
@@ -484,8 +495,9 @@ def process_video(args):
         except ImportError:
             print("Modulo high_quality_renderer non disponibile, usando renderer standard")
     
-    # Ottieni dimensioni del terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    # Ottieni dimensioni del terminale (in cache, aggiornate su ridimensionamento)
+    term_size = TerminalSizeMonitor().start()
+    term_width, term_height = term_size.columns, term_size.lines - 1
     
     try:
         video_path = args.file_paths[0]
@@ -521,9 +533,8 @@ def process_video(args):
         frame_count = 0
         frame_skip_count = 0  # Conteggio frame saltati
         target_frame = 0      # Frame che dovremmo visualizzare in base al tempo
-        start_time = time.time()
-        last_frame_time = start_time  # Tempo dell'ultimo frame visualizzato
-        drift_correction = 0  # Correzione per la deriva temporale
+        start_ns = time.monotonic_ns()  # Inizio riproduzione (ns, intero)
+        drift_correction_us = 0  # Correzione per la deriva temporale (µs)
         sync_enabled = not args.no_sync  # Sincronizzazione abilitata di default, a meno che --no-sync sia specificato
         sync_interval = 30  # Intervallo di correzione della sincronizzazione (in frame)
         
@@ -545,11 +556,11 @@ def process_video(args):
                 sys.exit(0)
                 
             def pause_callback(key):
-                nonlocal paused, start_time, frame_count
+                nonlocal paused, start_ns, frame_count
                 paused = not paused
                 # Se riprendiamo, aggiorna il tempo di inizio
                 if not paused:
-                    start_time = time.time() - (frame_count / args.fps)
+                    start_ns = time.monotonic_ns() - int(frame_count * 1_000_000_000 / args.fps)
             
             callbacks['quit'] = quit_callback
             callbacks['pause'] = pause_callback
@@ -636,14 +647,45 @@ def process_video(args):
             print(f"Avvio riproduzione a {args.fps} FPS (p=pausa, q=esci, s=sync, a=adattivo)")
             time.sleep(0.5)  # Attendi un attimo per iniziare l'estrazione
             clear_screen()
-            frame_duration = 1.0 / args.fps  # Durata teorica di un frame in secondi
+            
+            # Copia locale dei parametri usati nel loop: evita la lookup degli
+            # attributi di args (e la divisione per gli FPS) ad ogni frame
+            fps = args.fps
+            inv_fps = 1.0 / fps
+            contrast = args.contrast
+            brightness = args.brightness
+            basename = os.path.basename(video_path)
+            basename_b = basename.encode('utf-8', 'replace')
+            render = renderer.render_video_frame_mobile
+            
+            # Temporizzazione in interi: durata di un frame in ns, deriva e
+            # correzione in µs, FPS misurati in decimi, fluidità in virgola fissa Q8
+            frame_ns = int(1_000_000_000 / fps)  # Durata teorica di un frame
             frame_buffer = None  # Buffer per il frame corrente
             rendered_frame_data = None  # Dati del frame renderizzato
             total_frames = video_info.get('total_frames', 1000)  # Valore predefinito se non disponibile
             video_duration = video_info.get('duration', 0)  # Durata del video in secondi
             
             # Aggiungi una soglia per rilevare quando siamo significativamente in ritardo
-            fps_threshold = args.fps * 0.7  # 70% dell'FPS target è la soglia minima accettabile
+            fps_threshold10 = int(fps * 7)  # 70% dell'FPS target (in decimi) è la soglia minima accettabile
+            
+            # La durata totale non cambia: formattala una volta sola
+            duration_b = b"/" + _clock_bytes(video_duration) if video_duration > 0 else b""
+            
+            # La barra di stato viene aggiornata ~8 volte al secondo
+            status_refresh_every = max(1, int(fps / 8))
+            last_status_text = ""
+            
+            # Percentuale di avanzamento e frame a cui passa al valore successivo
+            progress_total = max(1, total_frames)
+            progress = 0
+            next_progress_frame = -(-progress_total // 100)  # ceil(progress_total / 100)
+            
+            # Barra di stato della pausa, composta una volta per ogni pausa
+            pause_status = None
+            
+            # Controllo dell'input circa 3 volte al secondo
+            check_interval = max(1, min(int(fps / 3), 10))
             
             # Avvia il monitoraggio delle prestazioni
             if perf_enabled:
@@ -654,22 +696,56 @@ def process_video(args):
                 print("Avvio pre-rendering intelligente...")
                 async_buffer.start_pre_rendering(processor, renderer, term_width, term_height)
             
+            from playback_sync import sync_tick
+            
             # Variabili per regolazione adattiva FPS
-            performance_history = []
             adaptive_window = 10  # Finestra di campionamento
+            performance_history = collections.deque(maxlen=adaptive_window)
+            perf_sum = 0  # Somma corrente della finestra (media in O(1))
             max_auto_adjust = 0.2  # Massima regolazione automatica (20%)
-            smooth_factor = 1.0   # Fattore di fluidità della riproduzione
+            smooth_q8 = 256   # Fattore di fluidità della riproduzione (256 = 1.0)
+            
+            # Le risorse iniziali sono allocate: spostale fuori dal GC e disattiva
+            # le raccolte automatiche durante la riproduzione (si fanno a mano
+            # solo nei momenti di attesa). Riattivato nel blocco finally.
+            gc.collect()
+            gc.freeze()
+            gc.disable()
+            gc_waits = 0
+            
+            def idle_collect():
+                """
+                Raccolta manuale in un momento di attesa: la generazione giovane e, ogni
+                50 attese, anche la intermedia, dove finiscono i cicli sopravvissuti
+                a una raccolta (la completa si fa all'ingresso in pausa).
+                """
+                nonlocal gc_waits
+                gc_waits += 1
+                gc.collect(1 if gc_waits % 50 == 0 else 0)
+            
+            # I frame vengono scritti da un thread dedicato (fermato da renderer.cleanup)
+            renderer.start_async_output()
             
             while True:
                 if not paused:
                     # Gestisci i frame
                     try:
+                        # Terminale ridimensionato: i frame successivi usano le nuove dimensioni
+                        if term_size.poll(frame_count):
+                            term_width, term_height = term_size.columns, term_size.lines - 1
+                            renderer.invalidate_frame()
+                            clear_screen()
+                            # Anche il pre-rendering passa alla nuova dimensione; i frame
+                            # già renderizzati con la vecchia vengono scartati
+                            if use_async_buffer and smart_sync:
+                                async_buffer.set_render_size(term_width, term_height)
+                            rendered_frame_data = None
+                        
                         # Calcola il tempo corrente dal punto di vista della riproduzione
-                        current_time = time.time()
-                        elapsed_since_start = current_time - start_time
+                        elapsed_ns = time.monotonic_ns() - start_ns
                         
                         # Calcola quale frame dovremmo mostrare in base al tempo trascorso
-                        target_frame = int(elapsed_since_start * args.fps)
+                        target_frame = elapsed_ns // frame_ns
                         
                         # Se siamo in ritardo, salta i frame necessari
                         frames_to_skip = target_frame - frame_count
@@ -679,6 +755,12 @@ def process_video(args):
                             if rendered_frame_data is None:
                                 # Prova a ottenere un frame già renderizzato
                                 rendered = async_buffer.get_rendered_frame(block=False)
+                                # Un frame completato dal thread con la dimensione precedente
+                                # al ridimensionamento non è utilizzabile
+                                if rendered:
+                                    valid = rendered[0][2]
+                                    if (len(valid), len(valid[0])) != (term_height, term_width):
+                                        rendered = None
                                 if rendered:
                                     rendered_frame_data, raw_frame = rendered
                                     
@@ -694,12 +776,9 @@ def process_video(args):
                             if frames_to_skip > 1:
                                 # Limita il numero di frame da saltare in una volta
                                 max_skip = min(frames_to_skip - 1, 5)
-                                for _ in range(max_skip):
-                                    try:
-                                        _ = async_buffer.get_frame(block=False, timeout=0.01)
-                                        frame_skip_count += 1
-                                    except queue.Empty:
-                                        break
+                                while max_skip and async_buffer.try_get_nowait() is not None:
+                                    frame_skip_count += 1
+                                    max_skip -= 1
                                 
                             # Ottieni un nuovo frame normale
                             frame = async_buffer.get_frame(block=True, timeout=0.1)
@@ -709,7 +788,7 @@ def process_video(args):
                                 empty_buffer_count = 0
                                 
                                 # Processa il nuovo frame
-                                processed_img = processor.process_image(frame, args.contrast, args.brightness)
+                                processed_img = processor.process_image(frame, contrast, brightness)
                                 
                                 # Ridimensiona per adattarla al terminale (mantieni proporzioni)
                                 resized_img, target_width, target_height, padding_x, padding_y = processor.resize_for_terminal(
@@ -732,158 +811,146 @@ def process_video(args):
                             frame_count += 1
                             rendered_frame_data = None  # Reset per il prossimo ciclo
                         
-                        # Prepara un testo di stato conciso per la riproduzione
-                        progress = int((frame_count / max(1, total_frames)) * 100)
+                        # Avanza la percentuale di avanzamento solo quando cambia
+                        # (confronto tra interi invece di una divisione per frame)
+                        while frame_count >= next_progress_frame:
+                            progress += 1
+                            next_progress_frame = -(-(progress + 1) * progress_total // 100)
                         
-                        # Calcola il tempo di riproduzione corrente (in secondi)
-                        current_time = frame_count / args.fps
+                        # Aggiorna l'analizzatore di performance (ad ogni frame)
+                        if perf_enabled:
+                            performance_analyzer.register_frame()
+                            if frame_skip_count > 0:
+                                performance_analyzer.skipped_frames = frame_skip_count
                         
-                        # Formatta il tempo come MM:SS
-                        minutes = int(current_time // 60)
-                        seconds = int(current_time % 60)
-                        time_str = f"{minutes:02d}:{seconds:02d}"
+                        # Prepara un testo di stato conciso per la riproduzione: la barra
+                        # viene ricalcolata solo poche volte al secondo, negli altri frame
+                        # si riusa l'ultimo testo generato
+                        if frame_count % status_refresh_every == 0 or not last_status_text:
                         
-                        # Aggiungi la durata totale se disponibile
-                        if video_duration > 0:
-                            total_minutes = int(video_duration // 60)
-                            total_seconds = int(video_duration % 60)
-                            time_str += f"/{total_minutes:02d}:{total_seconds:02d}"
+                            # Calcola il tempo di riproduzione corrente (in secondi)
+                            current_time = frame_count * inv_fps
                         
-                        # Calcola gli FPS effettivi
-                        elapsed = time.time() - start_time
-                        if elapsed > 0:
-                            actual_fps = round(frame_count / elapsed, 1)
-                            
-                            # Aggiorna l'analizzatore di performance
-                            if perf_enabled:
-                                performance_analyzer.register_frame()
-                                if frame_skip_count > 0:
-                                    performance_analyzer.skipped_frames = frame_skip_count
+                            # Formatta il tempo come MM:SS (più la durata totale, se nota)
+                            time_str = _clock_bytes(current_time) + duration_b
+                        
+                            # Calcola gli FPS effettivi
+                            elapsed_ns = time.monotonic_ns() - start_ns
+                            if elapsed_ns > 0:
+                                actual_fps10 = frame_count * 10_000_000_000 // elapsed_ns
                             
-                            # Aggiorna la cronologia delle prestazioni
-                            if len(performance_history) >= adaptive_window:
-                                performance_history.pop(0)
-                            performance_history.append(actual_fps)
+                                # Aggiorna la cronologia delle prestazioni
+                                if len(performance_history) == adaptive_window:
+                                    perf_sum -= performance_history[0]
+                                performance_history.append(actual_fps10)
+                                perf_sum += actual_fps10
                             
-                            # Regola il fattore di fluidità in base alle prestazioni
-                            if adaptive_fps and len(performance_history) >= 3:
-                                avg_fps = sum(performance_history) / len(performance_history)
-                                smooth_factor = async_buffer.analyze_playback_timing(args.fps, avg_fps)
+                                # Regola il fattore di fluidità in base alle prestazioni
+                                if adaptive_fps and len(performance_history) >= 3:
+                                    avg_fps = perf_sum / (10 * len(performance_history))
+                                    smooth_q8 = int(async_buffer.analyze_playback_timing(fps, avg_fps) * 256)
                             
-                            # Aggiungi informazioni sui frame saltati nella barra di stato
-                            skipped_info = f" -SK:{frame_skip_count}" if frame_skip_count > 0 else ""
+                                # Aggiungi informazioni sui frame saltati nella barra di stato
+                                skipped_info = b" -SK:%d" % frame_skip_count if frame_skip_count > 0 else b""
                             
-                            # Aggiungi info sulla modalità di sincronizzazione
-                            sync_mode = "S+" if sync_enabled and smart_sync else \
-                                        "S" if sync_enabled else "NS"
+                                # Aggiungi info sulla modalità di sincronizzazione
+                                sync_mode = b"S+" if sync_enabled and smart_sync else \
+                                            b"S" if sync_enabled else b"NS"
                             
-                            # Aggiungi info sul fattore di fluidità se adattivo è attivo
-                            adapt_info = f" A:{smooth_factor:.1f}" if adaptive_fps else ""
+                                # Aggiungi info sul fattore di fluidità se adattivo è attivo
+                                adapt_info = b" A:%d.%d" % divmod((smooth_q8 * 10 + 128) >> 8, 10) if adaptive_fps else b""
                             
-                            # Ottieni parametri adattivi dalla libreria di analisi
-                            if perf_enabled and adaptive_fps:
-                                params = performance_analyzer.get_adaptive_parameters()
-                                smooth_factor = params['smoothness']
+                                # Ottieni parametri adattivi dalla libreria di analisi
+                                if perf_enabled and adaptive_fps:
+                                    params = performance_analyzer.get_adaptive_parameters()
+                                    smooth_q8 = int(params['smoothness'] * 256)
                                 
-                                if params['fps'] < args.fps * 0.9:
-                                    # Segnala che stiamo usando FPS ridotti
-                                    adapt_info = f" A:{smooth_factor:.1f}"
-                                else:
-                                    adapt_info = ""
-                        else:
-                            actual_fps = args.fps
-                            skipped_info = ""
-                            sync_mode = "S" if sync_enabled else "NS"
-                            adapt_info = ""
+                                    if params['fps'] < fps * 0.9:
+                                        # Segnala che stiamo usando FPS ridotti
+                                        adapt_info = b" A:%d.%d" % divmod((smooth_q8 * 10 + 128) >> 8, 10)
+                                    else:
+                                        adapt_info = b""
+                            else:
+                                actual_fps10 = int(fps * 10)
+                                skipped_info = b""
+                                sync_mode = b"S" if sync_enabled else b"NS"
+                                adapt_info = b""
                             
-                        # Stato completo con tempo e FPS
-                        status_text = f"[{progress}% | {time_str} | {actual_fps:.1f} FPS{skipped_info} | {sync_mode}{adapt_info}] {os.path.basename(video_path)}"
+                            # Stato completo con tempo e FPS (bytes, scritto direttamente dal renderer)
+                            status_text = b"[%d%% | %s | %d.%d FPS%s | %s%s] %s" % (
+                                progress, time_str, actual_fps10 // 10, actual_fps10 % 10,
+                                skipped_info, sync_mode, adapt_info, basename_b)
+                            last_status_text = status_text
+                        else:
+                            status_text = last_status_text
                         
                         # Verifica che frame_buffer non sia None prima del rendering
                         if frame_buffer:
                             # Rendering dell'immagine con metodo ottimizzato per dispositivi mobili
-                            renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
+                            render(frame_buffer, term_width, term_height, status_text)
 
-                            # Calcola il tempo target per il prossimo frame con correzione della deriva
-                            target_frame_time = start_time + ((frame_count) / args.fps) + drift_correction
-                            current_time = time.time()
-                            
-                            # Regola la sincronizzazione periodicamente
-                            if sync_enabled and frame_count % sync_interval == 0:
-                                # Calcola il tempo ideale e reale trascorso
-                                ideal_time_elapsed = frame_count / args.fps
-                                actual_time_elapsed = current_time - start_time
-                                drift = actual_time_elapsed - ideal_time_elapsed
-                                
-                                if abs(drift) > 0.05:  # Solo se la deriva è significativa
-                                    if smart_sync:
-                                        # Con smart_sync, adatta la strategia in base alle prestazioni
-                                        if actual_fps < fps_threshold and drift > 0.5:
-                                            # Sistema sovraccaricato, affidati più al salto di frame
-                                            drift_correction = 0  # Elimina correzione, sfavorisce timing
-                                        else:
-                                            # Sistema in grado di gestire la correzione
-                                            max_correction = 0.5  # Massima correzione ammissibile
-                                            correction = -drift * 0.1  # Applica gradualmente
-                                            drift_correction += max(min(correction, max_correction), -max_correction)
-                                    else:
-                                        # Approccio classico
-                                        max_correction = 0.5
-                                        correction = -drift * 0.1
-                                        drift_correction += max(min(correction, max_correction), -max_correction)
-                                    
-                                    # Debug sulla sincronizzazione quando c'è una deriva significativa
-                                    if abs(drift) > 0.5:
-                                        skip_info = f" (frames saltati: {frame_skip_count})" if frame_skip_count > 0 else ""
-                                        adaptive_info = f" (adattivo: {smooth_factor:.2f})" if adaptive_fps else ""
-                                        print(f"\r\033[KSincronizzazione: deriva={drift:.3f}s corr={drift_correction:.3f}s{skip_info}{adaptive_info}", end="")
-                            
-                            # Calcola il tempo di sleep necessario
-                            sleep_time = max(0, target_frame_time - current_time)
+                            # Tempo di attesa per il prossimo frame con correzione della deriva
+                            # (aritmetica intera, compilata con Numba se disponibile)
+                            sleep_us, drift_correction_us, drift_us = sync_tick(
+                                frame_count, frame_ns, start_ns, time.monotonic_ns(),
+                                drift_correction_us, smooth_q8, sync_enabled, smart_sync,
+                                sync_interval, adaptive_fps, actual_fps10, fps_threshold10
+                            )
                             
-                            # Se il modo adattivo è attivo, regola il tempo di sleep
-                            if adaptive_fps and smooth_factor != 1.0:
-                                sleep_time *= smooth_factor
+                            # Debug sulla sincronizzazione quando c'è una deriva significativa
+                            if abs(drift_us) > 500_000:
+                                skip_info = f" (frames saltati: {frame_skip_count})" if frame_skip_count > 0 else ""
+                                adaptive_info = f" (adattivo: {smooth_q8 / 256:.2f})" if adaptive_fps else ""
+                                renderer.queue_toast(f"Sincronizzazione: deriva={drift_us / 1e6:.3f}s corr={drift_correction_us / 1e6:.3f}s{skip_info}{adaptive_info}")
                             
                             # Controllo input migliorato
-                            check_interval = max(1, min(int(args.fps / 4), 10))
                             if frame_count % check_interval == 0:
-                                if kbhit():
+                                if input_ready():
                                     key = getch()
                                     if key == 'q':  # Uscita
+                                        renderer.invalidate_frame()
                                         clear_screen()
                                         return
                                     elif key == 'p' or key == ' ':  # Pausa
                                         paused = not paused
                                         if paused:
-                                            status_text = f"[PAUSA {progress}% | {time_str}] {os.path.basename(video_path)}"
-                                            renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
+                                            status_text = b"[PAUSA %d%% | %s] %s" % (progress, time_str, basename_b)
+                                            render(frame_buffer, term_width, term_height, status_text)
+                                            pause_status = status_text
+                                            # All'ingresso in pausa c'è tempo per una raccolta completa
+                                            gc.collect()
                                     elif key == 's':  # Attiva/disattiva sincronizzazione
                                         sync_enabled = not sync_enabled
                                         message = "attivata" if sync_enabled else "disattivata"
-                                        print(f"\r\033[KSincronizzazione {message}", end="")
-                                        time.sleep(0.5)
+                                        renderer.queue_toast(f"Sincronizzazione {message}")
                                     elif key == 'a':  # Attiva/disattiva modalità adattiva
                                         adaptive_fps = not adaptive_fps
                                         message = "attivata" if adaptive_fps else "disattivata"
-                                        print(f"\r\033[KModalità adattiva {message}", end="")
-                                        time.sleep(0.5)
+                                        renderer.queue_toast(f"Modalità adattiva {message}")
                                     elif key == '+':  # Aumenta FPS target
-                                        args.fps = min(args.fps + 2, 60)
-                                        frame_duration = 1.0 / args.fps
-                                        print(f"\r\033[KFPS target: {args.fps}", end="")
-                                        time.sleep(0.5)
+                                        fps = args.fps = min(fps + 2, 60)
+                                        inv_fps = 1.0 / fps
+                                        frame_ns = int(1_000_000_000 / fps)
+                                        status_refresh_every = max(1, int(fps / 8))
+                                        check_interval = max(1, min(int(fps / 3), 10))
+                                        renderer.queue_toast(f"FPS target: {fps}")
                                     elif key == '-':  # Diminuisci FPS target
-                                        args.fps = max(args.fps - 2, 5)
-                                        frame_duration = 1.0 / args.fps
-                                        print(f"\r\033[KFPS target: {args.fps}", end="")
-                                        time.sleep(0.5)
+                                        fps = args.fps = max(fps - 2, 5)
+                                        inv_fps = 1.0 / fps
+                                        frame_ns = int(1_000_000_000 / fps)
+                                        status_refresh_every = max(1, int(fps / 8))
+                                        check_interval = max(1, min(int(fps / 3), 10))
+                                        renderer.queue_toast(f"FPS target: {fps}")
                             
                             # Dormi senza polling intensivo
-                            if sleep_time > 0:
-                                time.sleep(sleep_time)
-                                
-                            last_frame_time = time.time()
+                            if sleep_us > 0:
+                                # Sfrutta l'attesa per una raccolta della generazione giovane
+                                if sleep_us > 5000:
+                                    gc_start = time.monotonic_ns()
+                                    idle_collect()
+                                    sleep_us -= (time.monotonic_ns() - gc_start) // 1000
+                                if sleep_us > 0:
+                                    time.sleep(sleep_us / 1_000_000)
                             
                     except queue.Empty:
                         # Nessun nuovo frame disponibile, ma l'estrazione potrebbe essere ancora in corso
@@ -894,65 +961,64 @@ def process_video(args):
                             break
                         
                         # Aggiungiamo un piccolo ritardo per non sovraccaricare la CPU
+                        idle_collect()
                         time.sleep(0.05)
                         continue
                 
                 else:  # Modalità pausa
-                    # In pausa, attendi solo l'input
-                    # Mostra indicatore di pausa
-                    progress = int((frame_count / max(1, total_frames)) * 100)
-                    
-                    # Calcola il tempo di riproduzione corrente
-                    current_time = frame_count / args.fps
-                    minutes = int(current_time // 60)
-                    seconds = int(current_time % 60)
-                    time_str = f"{minutes:02d}:{seconds:02d}"
-                    
-                    # Aggiungi la durata totale se disponibile
-                    if video_duration > 0:
-                        total_minutes = int(video_duration // 60)
-                        total_seconds = int(video_duration % 60)
-                        time_str += f"/{total_minutes:02d}:{total_seconds:02d}"
+                    # In pausa non cambia nulla: frame e barra di stato vengono composti
+                    # una volta sola all'ingresso in pausa (o dopo un ridimensionamento)
+                    if term_size.poll(frame_count):
+                        term_width, term_height = term_size.columns, term_size.lines - 1
+                        renderer.invalidate_frame()
+                        clear_screen()
+                        pause_status = None
                     
-                    # Stato in pausa con tempo
-                    status_text = f"[PAUSA {progress}% | {time_str}] {os.path.basename(video_path)}"
-                    
-                    # Usa il renderer completo se disponibile
-                    if complete_renderer and complete_renderer.is_complete():
-                        # Usa l'ultimo frame disponibile per mostrare stato di pausa
-                        frame_buffer = complete_renderer.get_frame(frame_count)
+                    if pause_status is None:
+                        # All'ingresso in pausa c'è tempo per una raccolta completa
+                        gc.collect()
+                        time_str = _clock_bytes(frame_count * inv_fps) + duration_b
+                        pause_status = b"[PAUSA %d%% | %s] %s" % (progress, time_str, basename_b)
+                        
+                        # Usa il renderer completo se disponibile
+                        if complete_renderer and complete_renderer.is_complete():
+                            # Usa l'ultimo frame disponibile per mostrare stato di pausa
+                            frame_buffer = complete_renderer.get_frame(frame_count)
+                        
+                        # Verifica che frame_buffer non sia None prima del rendering
                         if frame_buffer:
-                            minutes = int(frame_count / args.fps / 60)
-                            seconds = int(frame_count / args.fps) % 60
-                            time_str = f"{minutes:02d}:{seconds:02d}"
-                            status_text = f"[PAUSA {int((frame_count/total_frames)*100)}% | {time_str}] {os.path.basename(video_path)}"
-                            renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
-                    
-                    # Verifica che frame_buffer non sia None prima del rendering
-                    elif frame_buffer:
-                        renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
+                            render(frame_buffer, term_width, term_height, pause_status)
+                        else:
+                            renderer.render_status_line(pause_status, term_width, term_height)
                     else:
-                        # Fallback se frame_buffer è None
-                        sys.stdout.write(f"\r{status_text}")
-                        sys.stdout.flush()
+                        # Riemetti solo la barra di stato già composta
+                        renderer.render_status_line(pause_status, term_width, term_height)
+                    
+                    idle_collect()
                     
-                    # Gestione input durante la pausa
-                    if kbhit():
+                    # Gestione input durante la pausa: l'attesa dell'input fa anche da
+                    # breve pausa per non consumare CPU
+                    if input_ready(0.1):
                         key = getch()
                         if key == 'q':
+                            renderer.invalidate_frame()
                             clear_screen()
                             print("Riproduzione terminata.")
                             return
                         elif key == 'p' or key == ' ':
                             paused = False
+                            pause_status = None
                             # Aggiorna il tempo di partenza quando si riprende
-                            start_time = time.time() - (frame_count / args.fps)
-                    
-                    time.sleep(0.1)  # Breve pausa per evitare di consumare troppa CPU
+                            start_ns = time.monotonic_ns() - frame_count * frame_ns
     
     except KeyboardInterrupt:
         print("\nRiproduzione interrotta dall'utente.")
     finally:
+        # Ripristina il garbage collector disattivato durante la riproduzione
+        gc.unfreeze()
+        gc.enable()
+        term_size.stop()
+        
         # Cleanup delle risorse
         if perf_enabled:
             performance_analyzer.stop_monitoring()
@@ -1028,6 +1094,7 @@ def process_video(args):
             print(f"Avvio riproduzione ad alta qualità (p=pausa, q=esci)")
             time.sleep(1)
             clear_screen()
+            renderer.invalidate_frame()
             
             # Imposta variabili per la riproduzione
             paused = False
@@ -1051,7 +1118,7 @@ def process_video(args):
                         renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
                     
                     # Gestisci input utente durante la pausa
-                    if kbhit():
+                    if input_ready():
                         key = getch()
                         if key == 'q':
                             clear_screen()
@@ -1102,7 +1169,7 @@ def process_video(args):
                         sleep_time = max(0.0, next_frame_time - time.time())
                         
                         # Gestisci input
-                        if frame_count % 5 == 0 and kbhit():
+                        if frame_count % 5 == 0 and input_ready():
                             key = getch()
                             if key == 'q':
                                 clear_screen()
@@ -1251,6 +1318,7 @@ def verify_video_dependencies():
     
     return dependencies_ok
 
+@functools.lru_cache(maxsize=1)
 def get_hardware_capability():
     """Determina le capacità hardware del sistema per ottimizzare la riproduzione."""
     try:
@@ -1,10 +1,219 @@
 import os
 import sys
 import time
+import queue
 import shutil
 import tempfile
-from PIL import Image, ImageDraw
-from core import CHARS, clear_screen, kbhit, getch
+import threading
+from functools import lru_cache
+from PIL import Image
+from core import CHARS, clear_screen, input_ready, getch, raw_input_mode, FrameWriter
+
+# Sequenze ANSI precalcolate (bytes) per il percorso di rendering dei video
+FG_CODES = [b"\033[38;5;%dm" % i for i in range(256)]
+BG_CODES = [b"\033[48;5;%dm" % i for i in range(256)]
+TWO_DIGITS = [b"%02d" % i for i in range(100)]
+_HALF_BLOCK = CHARS['basic']['half_top'].encode('utf-8')
+_RESET = b"\033[0m"
+# Posizionamento del cursore a inizio riga, indicizzato per numero di riga (da 1)
+_CURSOR_ROW = [b"\033[%d;1H" % i for i in range(512)]
+_CLOSE_PROMPT = "Premere Invio per chiudere".encode('utf-8')
+_HAS_WRITEV = hasattr(os, 'writev')
+
+# NumPy è opzionale: senza di esso si usa il percorso pixel per pixel
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+# Numba è opzionale: se presente la conversione in codici ANSI è compilata e parallela
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+@lru_cache(maxsize=4096)
+def _rgb_to_ansi(r, g, b):
+    """Conversione scalare RGB→ANSI 256, in cache: i colori si ripetono molto tra le celle."""
+    # Colori standard 16-231: cubo 6x6x6
+    r_idx = int(r / 255 * 5)
+    g_idx = int(g / 255 * 5)
+    b_idx = int(b / 255 * 5)
+    
+    if r == g == b:  # Scala di grigi
+        if r == 0:
+            return 16  # nero
+        if r == 255:
+            return 231  # bianco
+            
+        # Scala di grigi 232-255
+        gray_idx = int(((r / 255.0) * 23) + 0.5)
+        return 232 + gray_idx
+            
+    return 16 + r_idx * 36 + g_idx * 6 + b_idx
+
+# Estensione Cython opzionale per i frame completi (python setup.py build_ext --inplace)
+try:
+    from _renderer_core import render_frame as _core_render_frame
+    CORE_AVAILABLE = NUMPY_AVAILABLE
+except ImportError:
+    CORE_AVAILABLE = False
+
+def rgb_array_to_ansi(arr):
+    """
+    Versione vettorizzata di TerminalRenderer.rgb_to_ansi.
+    
+    Args:
+        arr: Array (H, W, 3) uint8 di colori RGB
+        
+    Returns:
+        Array (H, W) uint8 di codici ANSI a 256 colori
+    """
+    r = arr[..., 0].astype(np.uint16)
+    g = arr[..., 1].astype(np.uint16)
+    b = arr[..., 2].astype(np.uint16)
+    
+    # Cubo 6x6x6 (16-231), stessa divisione intera di rgb_to_ansi
+    code = 16 + (r * 5 // 255) * 36 + (g * 5 // 255) * 6 + (b * 5 // 255)
+    
+    # Scala di grigi 232-255, con nero e bianco presi dal cubo
+    gray = (r == g) & (g == b)
+    code = np.where(gray, (r * 23 + 127) // 255 + 232, code)
+    code = np.where(gray & (r == 0), 16, code)
+    code = np.where(gray & (r == 255), 231, code)
+    return code.astype(np.uint8)
+
+def _lut_colors():
+    """
+    Colore RGB rappresentato da ogni voce delle tabelle ANSI, indicizzate dai 6 bit
+    alti di ogni canale: i 6 bit vengono riespansi a 8 replicando i bit alti,
+    così nero e bianco restano esatti.
+    """
+    idx = np.arange(1 << 18, dtype=np.uint32)
+    sextets = np.stack([(idx >> 12) & 63, (idx >> 6) & 63, idx & 63], axis=-1).astype(np.uint8)
+    return (sextets << 2) | (sextets >> 4)
+
+def _build_ansi_lut():
+    """Tabella RGB→ANSI (64³ = 256 KB) con la stessa conversione di rgb_to_ansi."""
+    return rgb_array_to_ansi(_lut_colors())
+
+# Valori dei canali del cubo 6x6x6 nella palette di xterm
+_XTERM_LEVELS = (0, 95, 135, 175, 215, 255)
+
+def _xterm_palette():
+    """Colori RGB dei codici ANSI 16-255 (cubo 6x6x6 e scala di grigi di xterm)."""
+    levels = np.array(_XTERM_LEVELS, dtype=np.uint8)
+    cube = np.stack(np.meshgrid(levels, levels, levels, indexing='ij'), axis=-1).reshape(-1, 3)
+    grays = np.repeat((8 + 10 * np.arange(24)).astype(np.uint8)[:, None], 3, axis=1)
+    return np.concatenate([cube, grays])
+
+def _rgb_to_lab(rgb):
+    """Converte colori sRGB uint8 (..., 3) in CIE Lab (D65), float32."""
+    from dither_numba import SRGB_TO_LINEAR
+    
+    xyz = SRGB_TO_LINEAR[rgb] @ np.array([[0.4124, 0.3576, 0.1805],
+                                         [0.2126, 0.7152, 0.0722],
+                                         [0.0193, 0.1192, 0.9505]], dtype=np.float32).T
+    xyz /= np.array([0.95047, 1.0, 1.08883], dtype=np.float32)
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16,
+                     500 * (f[..., 0] - f[..., 1]),
+                     200 * (f[..., 1] - f[..., 2])], axis=-1).astype(np.float32)
+
+@lru_cache(maxsize=1)
+def lab_ansi_lut():
+    """
+    Variante di _ANSI_LUT per la correzione colore: ogni voce è il colore della
+    palette di xterm più vicino in Lab (ΔE76). Calcolata al primo uso.
+    """
+    palette_lab = _rgb_to_lab(_xterm_palette())
+    palette_norm = (palette_lab ** 2).sum(axis=1)
+    colors = _lut_colors()
+    lut = np.empty(len(colors), dtype=np.uint8)
+    # A blocchi: distanze come |p|² - 2 c·p (il termine |c|² non cambia l'argmin)
+    for start in range(0, len(colors), 8192):
+        lab = _rgb_to_lab(colors[start:start + 8192])
+        dist = palette_norm - 2 * (lab @ palette_lab.T)
+        lut[start:start + 8192] = dist.argmin(axis=1) + 16
+    return lut
+
+def lookup_ansi(arr, lut=None):
+    """Codici ANSI (H, W) uint8 per un array (H, W, 3) uint8, tramite lut (_ANSI_LUT)."""
+    idx = (arr[..., 0] >> 2).astype(np.uint32) << 12
+    idx |= (arr[..., 1] >> 2).astype(np.uint32) << 6
+    idx |= arr[..., 2] >> 2
+    return (_ANSI_LUT if lut is None else lut).take(idx)
+
+if NUMPY_AVAILABLE:
+    _ANSI_LUT = _build_ansi_lut()
+
+def _frame_codes_numpy(top_rgb, bottom_rgb, lut):
+    """Codici ANSI (fg, bg) di un frame con due lookup vettorizzati."""
+    return lookup_ansi(top_rgb, lut), lookup_ansi(bottom_rgb, lut)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _pixels_to_ansi(top_rgb, bottom_rgb, out_fg, out_bg, lut):
+        """Kernel Numba di lookup_ansi per entrambe le metà delle celle, righe in parallelo."""
+        height, width = out_fg.shape
+        for y in prange(height):
+            for x in range(width):
+                r = np.int32(top_rgb[y, x, 0]) >> 2
+                g = np.int32(top_rgb[y, x, 1]) >> 2
+                b = np.int32(top_rgb[y, x, 2]) >> 2
+                out_fg[y, x] = lut[(r << 12) | (g << 6) | b]
+                r = np.int32(bottom_rgb[y, x, 0]) >> 2
+                g = np.int32(bottom_rgb[y, x, 1]) >> 2
+                b = np.int32(bottom_rgb[y, x, 2]) >> 2
+                out_bg[y, x] = lut[(r << 12) | (g << 6) | b]
+    
+    def _frame_codes_numba(top_rgb, bottom_rgb, lut):
+        """Codici ANSI (fg, bg) di un frame con il kernel Numba."""
+        out_fg = np.empty(top_rgb.shape[:2], dtype=np.uint8)
+        out_bg = np.empty(bottom_rgb.shape[:2], dtype=np.uint8)
+        _pixels_to_ansi(top_rgb, bottom_rgb, out_fg, out_bg, lut)
+        return out_fg, out_bg
+    
+    # Compila subito il kernel, sia per array contigui sia per le viste sulla cache
+    # .npy dei frame pre-renderizzati: il costo del JIT non ricade sul primo frame video
+    _frame_codes_numba(np.zeros((1, 1, 3), dtype=np.uint8), np.zeros((1, 1, 3), dtype=np.uint8),
+                       _ANSI_LUT)
+    _frame_codes_numba(np.zeros((1, 1, 7), dtype=np.uint8)[..., 0:3],
+                       np.zeros((1, 1, 7), dtype=np.uint8)[..., 3:6], _ANSI_LUT)
+
+# Chiave delle celle fuori dall'immagine nelle sequenze (fg << 8 | bg)
+_EMPTY_CELL = 1 << 16
+
+def _cursor_rows(rows):
+    """Restituisce _CURSOR_ROW, estesa se necessario fino alla riga rows."""
+    if rows >= len(_CURSOR_ROW):
+        _CURSOR_ROW.extend(b"\033[%d;1H" % i for i in range(len(_CURSOR_ROW), rows + 1))
+    return _CURSOR_ROW
+
+def _append_runs(output, row, starts):
+    """
+    Aggiunge a output i tratti di una riga di chiavi: starts contiene l'inizio
+    di ogni tratto e, come ultimo elemento, la fine della riga.
+    """
+    colored = False
+    for x0, x1 in zip(starts, starts[1:]):
+        key = row[x0]
+        if key == _EMPTY_CELL:
+            if colored:  # Se avevamo applicato colori in precedenza
+                output += _RESET
+                colored = False
+            output += b" " * (x1 - x0)
+        else:
+            output += FG_CODES[key >> 8]
+            output += BG_CODES[key & 255]
+            output += _HALF_BLOCK * (x1 - x0)
+            colored = True
+    
+    # Resetta colori alla fine del tratto se necessario
+    if colored:
+        output += _RESET
 
 class TerminalRenderer:
     def __init__(self):
@@ -15,9 +224,27 @@ class TerminalRenderer:
         self.padding_x = None
         self.padding_y = None
         # Inizializza gli attributi per il refresh
-        self._last_pixel_data = None
+        self._last_top = None
+        self._last_bottom = None
+        self._last_valid = None
         self._last_term_width = None
         self._last_term_height = None
+        # Messaggio temporaneo mostrato nella barra di stato dei video
+        self._toast_text = None
+        self._toast_frames = 0
+        self._status_key = None
+        self._status_line_cache = b""
+        # Chiavi dell'ultimo frame video, per riscrivere solo le celle cambiate
+        self._prev_keys = None
+        # Conversione dei frame in codici ANSI: kernel Numba se disponibile
+        self._frame_codes = _frame_codes_numba if NUMBA_AVAILABLE else _frame_codes_numpy
+        # Correzione colore: palette più vicina in Lab invece della conversione diretta
+        self.color_correction = False
+        # Array (top, bottom, valid) riutilizzabili tra un frame e l'altro, per slot
+        self._scratch = {}
+        # Scrittura dei frame video in background (vedi start_async_output)
+        self._writer_q = None
+        self._writer_thread = None
         
     def create_temp_folder(self):
         """Crea una cartella temporanea per i dati di rendering."""
@@ -26,52 +253,132 @@ class TerminalRenderer:
         return self.temp_dir
     
     def cleanup(self):
-        """Rimuove la cartella temporanea."""
+        """Rimuove la cartella temporanea e ferma l'eventuale thread di scrittura."""
+        self.stop_async_output()
         if self.temp_dir and os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir, ignore_errors=True)
             self.temp_dir = None
         self.display_active = False
 
-    def calculate_intensity(self, pixel):
-        """Calcola l'intensità luminosa di un pixel."""
-        if isinstance(pixel, tuple) and len(pixel) >= 3:
-            r, g, b = pixel[:3]
-            return (0.299 * r + 0.587 * g + 0.114 * b) / 255.0
-        return pixel / 255.0
+    def _image_cells(self, img, target_width, target_height, padding_x, padding_y,
+                     term_width, term_height):
+        """
+        Rettangolo di celle occupato dall'immagine e relativa regione dell'immagine.
+        
+        Returns:
+            Tuple ((x0, x1, y0, y1), region) con region già ritagliata a
+            (x1 - x0) x 2*(y1 - y0) pixel, oppure None se l'immagine non è visibile
+        """
+        x0 = max(0, padding_x)
+        x1 = min(term_width, padding_x + img.width)
+        if padding_x > 0:
+            x1 = min(x1, padding_x + target_width)
+        y0 = max(0, padding_y)
+        y1 = min(term_height, padding_y + img.height // 2)
+        if padding_y > 0:
+            y1 = min(y1, padding_y + target_height // 2)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        
+        region = img.crop((x0 - padding_x, (y0 - padding_y) * 2,
+                           x1 - padding_x, (y1 - padding_y) * 2))
+        return (x0, x1, y0, y1), region
     
     def prepare_pixel_data(self, img, target_width=None, target_height=None, 
-                          padding_x=0, padding_y=0, term_width=None, term_height=None):
-        """Prepara i dati dei pixel per la visualizzazione semplificata."""
-        pixel_data = {}
-        
-        for y in range(term_height):
-            for x in range(term_width):
-                img_x = x - padding_x
-                img_y = (y - padding_y) * 2
-                
-                # Controlla se siamo all'interno dell'immagine
-                if (padding_x > 0 and (x < padding_x or x >= padding_x + target_width)) or \
-                   (padding_y > 0 and (y < padding_y or y >= padding_y + target_height // 2)):
-                    continue
-                
-                if 0 <= img_x < img.width and 0 <= img_y + 1 < img.height:
-                    # Pixel di base
-                    top_pixel = img.getpixel((img_x, img_y))
-                    bottom_pixel = img.getpixel((img_x, img_y + 1))
-                    
-                    # Calcola l'intensità per la scelta dei caratteri
-                    top_intensity = self.calculate_intensity(top_pixel[:3] if len(top_pixel) > 3 else top_pixel)
-                    bottom_intensity = self.calculate_intensity(bottom_pixel[:3] if len(bottom_pixel) > 3 else bottom_pixel)
-                    
-                    # Memorizza i dati per questo pixel
-                    pixel_data[(x, y)] = {
-                        'top_pixel': top_pixel[:3] if len(top_pixel) > 3 else top_pixel,
-                        'bottom_pixel': bottom_pixel[:3] if len(bottom_pixel) > 3 else bottom_pixel,
-                        'top_intensity': top_intensity,
-                        'bottom_intensity': bottom_intensity
-                    }
-        
-        return pixel_data
+                          padding_x=0, padding_y=0, term_width=None, term_height=None, out=None):
+        """
+        Prepara i dati dei pixel per la visualizzazione semplificata.
+        out è passato a prepare_pixel_arrays (ignorato senza NumPy).
+        
+        Returns:
+            Tuple (top_rgb, bottom_rgb, valid) in forma SoA: array NumPy se
+            disponibile (vedi prepare_pixel_arrays), altrimenti liste di righe
+            indicizzabili allo stesso modo ([y][x])
+        """
+        if NUMPY_AVAILABLE:
+            return self.prepare_pixel_arrays(img, target_width, target_height,
+                                             padding_x, padding_y, term_width, term_height, out)
+        
+        black = (0, 0, 0)
+        top_rgb = [[black] * term_width for _ in range(term_height)]
+        bottom_rgb = [[black] * term_width for _ in range(term_height)]
+        valid = [[False] * term_width for _ in range(term_height)]
+        
+        cells = self._image_cells(img, target_width, target_height, padding_x, padding_y,
+                                  term_width, term_height)
+        if cells is None:
+            return top_rgb, bottom_rgb, valid
+        (x0, x1, y0, y1), region = cells
+        
+        # Nessun controllo per pixel: la regione ritagliata copre esattamente le celle
+        data = region.convert('RGB').tobytes()
+        stride = (x1 - x0) * 3
+        inside = [True] * (x1 - x0)
+        for y in range(y0, y1):
+            offset = (y - y0) * 2 * stride
+            top = data[offset:offset + stride]
+            bottom = data[offset + stride:offset + 2 * stride]
+            top_rgb[y][x0:x1] = zip(top[0::3], top[1::3], top[2::3])
+            bottom_rgb[y][x0:x1] = zip(bottom[0::3], bottom[1::3], bottom[2::3])
+            valid[y][x0:x1] = inside
+        
+        return top_rgb, bottom_rgb, valid
+    
+    def prepare_pixel_arrays(self, img, target_width=None, target_height=None,
+                             padding_x=0, padding_y=0, term_width=None, term_height=None,
+                             out=None):
+        """
+        Versione vettorizzata (NumPy) di prepare_pixel_data.
+        
+        Args:
+            out: Terna di array (vedi scratch_pixel_arrays) da riempire sul posto
+                 invece di allocarne di nuovi
+        
+        Returns:
+            Tuple (top_rgb, bottom_rgb, valid): colori delle metà superiore e
+            inferiore di ogni cella, shape (term_height, term_width, 3) uint8, e
+            maschera delle celle occupate dall'immagine, shape (term_height, term_width) bool
+        """
+        if out is None:
+            top_rgb = np.zeros((term_height, term_width, 3), dtype=np.uint8)
+            bottom_rgb = np.zeros((term_height, term_width, 3), dtype=np.uint8)
+            valid = np.zeros((term_height, term_width), dtype=bool)
+        else:
+            top_rgb, bottom_rgb, valid = out
+            top_rgb.fill(0)
+            bottom_rgb.fill(0)
+            valid.fill(False)
+        
+        cells = self._image_cells(img, target_width, target_height, padding_x, padding_y,
+                                  term_width, term_height)
+        if cells is None:
+            return top_rgb, bottom_rgb, valid
+        (x0, x1, y0, y1), region = cells
+        
+        if region.mode not in ('RGB', 'RGBA', 'RGBX'):
+            region = region.convert('RGB')
+        base = np.asarray(region, dtype=np.uint8)
+        
+        # Righe pari (metà superiore) e dispari (metà inferiore) di ogni cella
+        top_rgb[y0:y1, x0:x1] = base[0::2, :, :3]
+        bottom_rgb[y0:y1, x0:x1] = base[1::2, :, :3]
+        valid[y0:y1, x0:x1] = True
+        
+        return top_rgb, bottom_rgb, valid
+    
+    def scratch_pixel_arrays(self, term_width, term_height, slot=0):
+        """
+        Terna (top_rgb, bottom_rgb, valid) riutilizzabile come out= di prepare_pixel_arrays.
+        Ogni slot ha i propri array, riallocati solo se cambia la dimensione del
+        terminale: chi tiene in vita più frame insieme deve usare slot diversi.
+        """
+        arrays = self._scratch.get(slot)
+        if arrays is None or arrays[2].shape != (term_height, term_width):
+            arrays = (np.zeros((term_height, term_width, 3), dtype=np.uint8),
+                      np.zeros((term_height, term_width, 3), dtype=np.uint8),
+                      np.zeros((term_height, term_width), dtype=bool))
+            self._scratch[slot] = arrays
+        return arrays
     
     def render_image(self, pixel_data, term_width, term_height):
         """Visualizza l'immagine nel terminale con rendering semplice."""
@@ -79,220 +386,402 @@ class TerminalRenderer:
         clear_screen()  # Pulisce lo schermo prima di visualizzare
         
         # Salva i dati per eventuali refresh
-        self._last_pixel_data = pixel_data
+        self._last_top, self._last_bottom, self._last_valid = pixel_data
         self._last_term_width = term_width
         self._last_term_height = term_height
         
         # Rendering semplice - usa il metodo standardizzato
-        self._render_simple(pixel_data, term_width, term_height)
+        self._render_simple(pixel_data, term_width, term_height, with_prompt=True)
+
+    def _render_simple(self, pixel_data, term_width, term_height, with_prompt=False):
+        """Renderizza l'immagine in modalità semplice e veloce senza pulire lo schermo."""
+        output = self._emit_rle(pixel_data, term_height)
+        output += _RESET
         
         # Informazioni di controllo minime - solo comandi necessari
         # Usiamo una posizione fissa in fondo allo schermo per non alterare l'immagine
-        sys.stdout.write(f"\033[{term_height};1H\033[0mPremere Invio per chiudere")
-        sys.stdout.flush()
+        if with_prompt:
+            output += _cursor_rows(term_height)[term_height]
+            output += _RESET
+            output += _CLOSE_PROMPT
+        
+        # Scrive tutto il buffer in una volta sola (molto più veloce)
+        self._write_bytes(output)
 
-    def _render_simple(self, pixel_data, term_width, term_height):
-        """Renderizza l'immagine in modalità semplice e veloce senza pulire lo schermo."""
-        # Utilizziamo una stringa di output completa invece di stampare linea per linea
-        output = []
-        
-        # Posizionamento iniziale del cursore in alto a sinistra
-        output.append("\033[H")  # Equivalente di "\033[1;1H" - muove il cursore in posizione 1,1
-        
-        for y in range(term_height):
-            line = []
-            for x in range(term_width):
-                if (x, y) in pixel_data:
-                    data = pixel_data[(x, y)]
-                    top_code = self.rgb_to_ansi(data['top_pixel'])
-                    bottom_code = self.rgb_to_ansi(data['bottom_pixel'])
-                    line.append(f"\033[38;5;{top_code}m\033[48;5;{bottom_code}m▀")
-                else:
-                    line.append(" ")
-            output.append("".join(line))
+    def render_panel(self, pixel_data, term_width, rows, top_row, writer=None):
+        """
+        Visualizza le prime rows righe del frame a partire dalla riga top_row (da 1).
+        Con writer (core.FrameWriter) l'output viene solo accodato al suo buffer,
+        così più pannelli escono con una sola scrittura.
+        """
+        keys = self._frame_keys(pixel_data, rows)
+        if hasattr(keys, 'tolist'):
+            keys = keys.tolist()
+        
+        own_writer = writer is None
+        if own_writer:
+            writer = FrameWriter()
+        for y, row in enumerate(keys):
+            starts = [x for x in range(len(row)) if x == 0 or row[x] != row[x - 1]]
+            starts.append(len(row))
+            writer.move(top_row + y)
+            _append_runs(writer.buf, row, starts)
+        if own_writer:
+            writer.flush()
+
+    def _frame_keys(self, pixel_data, rows):
+        """
+        Chiavi (fg << 8 | bg) delle prime rows righe del frame, _EMPTY_CELL fuori
+        dall'immagine: array NumPy (rows, W) uint32, oppure liste di righe senza NumPy.
+        """
+        top_rgb, bottom_rgb, valid = pixel_data
+        
+        if hasattr(valid, 'tolist'):
+            lut = lab_ansi_lut() if self.color_correction else _ANSI_LUT
+            top_codes, bottom_codes = self._frame_codes(top_rgb[:rows], bottom_rgb[:rows], lut)
+            keys = (top_codes.astype(np.uint32) << 8) | bottom_codes
+            keys[~valid[:rows]] = _EMPTY_CELL
+            return keys
+        
+        rgb_to_ansi = self.rgb_to_ansi
+        return [[(rgb_to_ansi(top) << 8) | rgb_to_ansi(bottom) if inside else _EMPTY_CELL
+                 for top, bottom, inside in zip(top_row, bottom_row, valid_row)]
+                for top_row, bottom_row, valid_row in zip(top_rgb[:rows], bottom_rgb[:rows],
+                                                          valid[:rows])]
+    
+    def _emit_rle(self, pixel_data, rows, keys=None):
+        """
+        Genera le prime rows righe del frame come bytes, con una sola sequenza
+        di colore per ogni tratto di celle con gli stessi colori (fg, bg).
+        """
+        if keys is None:
+            keys = self._frame_keys(pixel_data, rows)
+        
+        if hasattr(keys, 'tolist'):
+            if CORE_AVAILABLE:
+                return _core_render_frame(keys)
+            # Inizi dei tratti calcolati sull'intero frame con NumPy
+            change = np.ones(keys.shape, dtype=bool)
+            change[:, 1:] = keys[:, 1:] != keys[:, :-1]
+            run_starts = [np.flatnonzero(row).tolist() for row in change]
+            keys = keys.tolist()
+        else:
+            run_starts = [[x for x in range(len(row)) if x == 0 or row[x] != row[x - 1]]
+                          for row in keys]
+        
+        cursor_row = _cursor_rows(rows + 1)
+        output = bytearray(b"\033[H")  # Posiziona il cursore nell'angolo in alto a sinistra
+        for y, (row, starts) in enumerate(zip(keys, run_starts)):
+            starts.append(len(row))
+            _append_runs(output, row, starts)
             
             # Non andiamo a capo dopo ogni riga ma posizioniamo il cursore
             # all'inizio della riga successiva per evitare di aggiungere righe
-            if y < term_height - 1:
-                output.append(f"\033[{y+2};1H")
+            if y < rows - 1:
+                output += cursor_row[y + 2]
         
-        # Stampa tutto il buffer in una volta sola (molto più veloce)
-        print("".join(output), end="\033[0m", flush=True)
+        return output
+    
+    def _emit_diff(self, pixel_data, rows):
+        """
+        Come _emit_rle, ma riscrive solo i tratti di celle cambiati rispetto
+        al frame precedente (frame completo al primo frame, dopo un
+        ridimensionamento o se cambia più di metà dello schermo).
+        """
+        keys = self._frame_keys(pixel_data, rows)
+        prev = self._prev_keys
+        if not hasattr(keys, 'tolist'):
+            return self._emit_rle(pixel_data, rows, keys)
+        self._prev_keys = keys
+        
+        if prev is None or prev.shape != keys.shape:
+            return self._emit_rle(pixel_data, rows, keys)
+        changed = keys != prev
+        if np.count_nonzero(changed) * 2 > changed.size:
+            return self._emit_rle(pixel_data, rows, keys)
+        
+        output = bytearray()
+        # Estremi dei tratti cambiati di ogni riga: fronti di salita/discesa della maschera
+        edges = np.zeros((changed.shape[0], changed.shape[1] + 1), dtype=np.int8)
+        edges[:, 1:] = changed
+        edges[:, :-1] -= changed
+        for y in np.flatnonzero(changed.any(axis=1)).tolist():
+            bounds = np.flatnonzero(edges[y]).tolist()
+            row_keys = keys[y]
+            for x0, x1 in zip(bounds[::2], bounds[1::2]):
+                span = row_keys[x0:x1]
+                starts = (np.flatnonzero(span[1:] != span[:-1]) + 1).tolist()
+                starts.insert(0, 0)
+                starts.append(x1 - x0)
+                output += b"\033[%d;%dH" % (y + 1, x0 + 1)
+                _append_runs(output, span.tolist(), starts)
+        return output
+    
+    def apply_preset(self, settings):
+        """
+        Assegna in blocco le impostazioni di qualità (nome attributo → valore).
+        Se qualcosa cambia l'ultimo frame video viene dimenticato: con le nuove
+        impostazioni gli stessi pixel possono produrre codici diversi.
+        """
+        changed = False
+        for name, value in settings.items():
+            if getattr(self, name, None) != value:
+                setattr(self, name, value)
+                changed = True
+        if changed:
+            self._prev_keys = None
+    
+    def invalidate_frame(self):
+        """
+        Dimentica l'ultimo frame, scartando l'eventuale frame non ancora scritto
+        e attendendo la scrittura in corso: va chiamato prima di pulire lo schermo.
+        """
+        self._prev_keys = None
+        writer_q = self._writer_q
+        if writer_q is not None:
+            try:
+                writer_q.get_nowait()
+                writer_q.task_done()
+            except queue.Empty:
+                pass
+            writer_q.join()
+    
+    def start_async_output(self):
+        """
+        Avvia il thread che scrive i frame video, così la generazione del frame
+        successivo si sovrappone alla scrittura sul terminale di quello corrente.
+        """
+        if self._writer_q is None:
+            self._writer_q = queue.Queue(maxsize=1)
+            self._writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._writer_thread.start()
+    
+    def stop_async_output(self):
+        """Scrive l'ultimo frame in attesa e ferma il thread di scrittura."""
+        if self._writer_q is not None:
+            self._writer_q.put(None)  # Sentinella di chiusura
+            self._writer_thread.join()
+            self._writer_q = None
+            self._writer_thread = None
+    
+    def _writer_loop(self):
+        """Corpo del thread di scrittura: un frame (tupla di buffer) alla volta."""
+        writer_q = self._writer_q
+        while True:
+            parts = writer_q.get()
+            try:
+                if parts is None:
+                    return
+                self._write_bytes(*parts)
+            finally:
+                writer_q.task_done()
+    
+    def _output(self, *parts, drop_pending=False):
+        """
+        Scrive i buffer direttamente o, se attivo, tramite il thread di scrittura.
+        Con drop_pending un frame ancora in attesa viene sostituito (salto del frame).
+        """
+        writer_q = self._writer_q
+        if writer_q is None:
+            self._write_bytes(*parts)
+            return
+        if drop_pending:
+            try:
+                writer_q.get_nowait()
+                writer_q.task_done()
+            except queue.Empty:
+                pass
+        writer_q.put(parts)
+    
+    def _emit_video(self, pixel_data, rows):
+        """Frame video per _output: completo se sostituirà un frame non ancora scritto."""
+        if self._writer_q is not None and self._writer_q.full():
+            # Il frame in attesa verrà scartato: il confronto va fatto con lo schermo reale
+            self._prev_keys = None
+        return self._emit_diff(pixel_data, rows)
 
     # Aggiungiamo un metodo ottimizzato per video che riduce ulteriormente le operazioni
     def render_video_frame(self, pixel_data, term_width, term_height):
         """Renderizza un frame video con ottimizzazioni per la velocità."""
         # Utilizziamo posizionamento diretto del cursore senza pulire lo schermo
-        output = ["\033[H"]  # Posiziona il cursore nell'angolo in alto a sinistra
-        
-        # Generiamo l'immagine completa in un'unica stringa
-        for y in range(term_height):
-            line = []
-            for x in range(term_width):
-                if (x, y) in pixel_data:
-                    data = pixel_data[(x, y)]
-                    top_code = self.rgb_to_ansi(data['top_pixel'])
-                    bottom_code = self.rgb_to_ansi(data['bottom_pixel'])
-                    line.append(f"\033[38;5;{top_code}m\033[48;5;{bottom_code}m▀")
-                else:
-                    line.append(" ")
-            output.append("".join(line))
-            if y < term_height - 1:
-                output.append(f"\033[{y+2};1H")
+        output = self._emit_video(pixel_data, term_height)
         
         # Output del buffer in una sola operazione
-        sys.stdout.write("".join(output) + "\033[0m")
-        sys.stdout.flush()
+        output += _RESET
+        self._output(output, drop_pending=True)
 
+    def queue_toast(self, text, ttl_frames=30):
+        """Mostra un messaggio nella barra di stato per i prossimi ttl_frames frame."""
+        self._toast_text = " " + text
+        self._toast_frames = ttl_frames
+    
+    def _status_line(self, status_text, term_width):
+        """Compone la barra di stato (bytes), con l'eventuale messaggio allineato a destra."""
+        toast = ""
+        if self._toast_frames > 0:
+            self._toast_frames -= 1
+            toast = self._toast_text[-term_width:] if term_width > 0 else ""
+        # Il testo di stato cambia poche volte al secondo: riusa la riga già composta
+        key = (status_text, term_width, toast)
+        if key != self._status_key:
+            if isinstance(status_text, bytes):
+                status_text = status_text.decode('utf-8', 'replace')
+            # Composizione sui caratteri e codifica solo alla fine (nomi file non ASCII)
+            status_text = status_text or ''
+            width = term_width - len(toast)
+            if toast:
+                status_text = status_text[:width]
+            line = f"{status_text:<{width}}{toast}"
+            self._status_line_cache = line.encode('utf-8', 'replace')
+            self._status_key = key
+        return self._status_line_cache
+    
+    def _write_bytes(self, *parts):
+        """
+        Scrive uno o più buffer binari sullo stdout con una sola chiamata di
+        sistema: os.writev dove disponibile (nessuna concatenazione), altrimenti
+        un'unica write del buffer concatenato.
+        """
+        out = getattr(sys.stdout, 'buffer', None)
+        if out is None:
+            sys.stdout.write(b"".join(parts).decode('utf-8', 'replace'))
+            sys.stdout.flush()
+            return
+        # Svuota prima i buffer di Python per non invertire l'ordine dell'output
+        sys.stdout.flush()
+        out.flush()
+        
+        if _HAS_WRITEV:
+            try:
+                fd = out.fileno()
+            except (AttributeError, OSError, ValueError):
+                fd = None
+            if fd is not None:
+                parts = [memoryview(part) for part in parts if part]
+                try:
+                    while parts:
+                        written = os.writev(fd, parts)
+                        # Scrittura parziale: scarta i buffer completati e
+                        # riprendi dal punto raggiunto
+                        while parts and written >= len(parts[0]):
+                            written -= len(parts[0])
+                            parts.pop(0)
+                        if parts and written:
+                            parts[0] = parts[0][written:]
+                    return
+                except BlockingIOError:
+                    # stdout non bloccante pieno: il resto passa dal buffer di Python
+                    pass
+        
+        out.write(b"".join(parts))
+        out.flush()
+    
+    def render_status_line(self, status_text, term_width, term_height):
+        """Ridisegna solo la barra di stato sull'ultima riga."""
+        self._output(_cursor_rows(term_height)[term_height], _RESET,
+                     self._status_line(status_text, term_width))
+    
     # Metodo migliorato per dispositivi mobile
     def render_video_frame_mobile(self, pixel_data, term_width, term_height, status_text=None):
-        """Renderizza un frame video ottimizzato per dispositivi mobili."""
+        """
+        Renderizza un frame video ottimizzato per dispositivi mobili.
+        
+        status_text può essere una stringa o già codificato in bytes.
+        """
         # Verifica che pixel_data non sia None
         if pixel_data is None:
             # Se non ci sono dati, stampa solo il messaggio di stato
             if status_text:
-                sys.stdout.write(f"\033[H\033[0m{status_text}")
-                sys.stdout.flush()
+                if isinstance(status_text, str):
+                    status_text = status_text.encode('utf-8', 'replace')
+                self._output(b"\033[H", _RESET, status_text)
             return
         
-        # Ottimizzazione: prepara l'output completo prima di stampare
-        output = ["\033[H"]  # Posiziona il cursore nell'angolo in alto a sinistra
-        
-        # Genera l'immagine in un'unica stringa - ottimizzazione per renderizzazione veloce
-        for y in range(term_height-1):  # Lasciamo l'ultima riga per lo stato
-            line_chars = []
-            last_fg = None
-            last_bg = None
-            
-            for x in range(term_width):
-                if (x, y) in pixel_data:
-                    data = pixel_data[(x, y)]
-                    fg_code = self.rgb_to_ansi(data['top_pixel'])
-                    bg_code = self.rgb_to_ansi(data['bottom_pixel'])
-                    
-                    # Ottimizzazione: applica codici ANSI solo quando cambiano i colori
-                    if fg_code != last_fg or bg_code != last_bg:
-                        line_chars.append(f"\033[38;5;{fg_code}m\033[48;5;{bg_code}m")
-                        last_fg, last_bg = fg_code, bg_code
-                    
-                    line_chars.append("▀")  # Carattere di rendering
-                else:
-                    if last_fg is not None:  # Se avevamo applicato colori in precedenza
-                        line_chars.append("\033[0m ")  # Reset e spazio
-                        last_fg = last_bg = None
-                    else:
-                        line_chars.append(" ")  # Semplice spazio
-            
-            # Resetta colori alla fine della riga se necessario
-            if last_fg is not None:
-                line_chars.append("\033[0m")
-                
-            output.append("".join(line_chars))
-            
-            # Posiziona il cursore all'inizio della riga successiva
-            if y < term_height - 2:  # Non l'ultima riga
-                output.append(f"\033[{y+2};1H")
+        # Ottimizzazione: prepara l'output completo in un unico buffer binario
+        # (lasciamo l'ultima riga per lo stato)
+        output = self._emit_video(pixel_data, term_height - 1)
         
         # Aggiungi la barra di stato in fondo in modo fisso
-        if status_text:
+        # (passata come buffer separato: nessuna copia nel buffer dei pixel)
+        if status_text or self._toast_frames > 0:
             # Posizionati sull'ultima riga con colore neutro
-            output.append(f"\033[{term_height};1H\033[0m{status_text:<{term_width}}")
-        
-        # Output del buffer in una sola operazione (meno I/O = più velocità)
-        sys.stdout.write("".join(output))
-        sys.stdout.flush()
+            output += _cursor_rows(term_height)[term_height]
+            output += _RESET
+            self._output(output, self._status_line(status_text, term_width), drop_pending=True)
+        else:
+            # Output del buffer in una sola operazione (meno I/O = più velocità)
+            self._output(output, drop_pending=True)
 
     def rgb_to_ansi(self, rgb):
         """Converte un colore RGB in codice ANSI a 256 colori."""
         r, g, b = rgb[:3]
-        
-        # Colori standard 16-231: cubo 6x6x6
-        r_idx = int(r / 255 * 5)
-        g_idx = int(g / 255 * 5)
-        b_idx = int(b / 255 * 5)
-        
-        if r == g == b:  # Scala di grigi
-            if r == 0:
-                return 16  # nero
-            if r == 255:
-                return 231  # bianco
-                
-            # Scala di grigi 232-255
-            gray_idx = int(((r / 255.0) * 23) + 0.5)
-            return 232 + gray_idx
-                
-        return 16 + r_idx * 36 + g_idx * 6 + b_idx
+        return _rgb_to_ansi(r, g, b)
 
     def wait_for_input(self, processor):
         """Attende l'input dell'utente per chiudere l'immagine."""
-        poll_interval = 0.1  # Poll più lento per ridurre uso CPU
-        
-        while self.display_active:
-            if kbhit():
-                key = getch()
-                # Accetta Invio, 'q' o 'Q' per uscire
-                if key in ['\r', '\n', 'q', 'Q']:
-                    clear_screen()
-                    self.display_active = False
-                    return 'close'
-                # Supporto per esportazione con 'e'
-                elif key in ['e', 'E']:
-                    timestamp = int(time.time())
-                    filename = f"termimg_export_{timestamp}.png"
-                    sys.stdout.write(f"\033[K\033[32mEsportazione: {filename}\033[0m")
-                    sys.stdout.flush()
-                    self.export_current_rendering(processor, filename)
-                # Refresh esplicito con 'r'
-                elif key in ['r', 'R']:
-                    # Verifica se abbiamo dati salvati prima di tentare un refresh
-                    if self._last_pixel_data is not None:
+        # Su POSIX si resta bloccati su stdin finché non arriva un tasto (nessun
+        # risveglio periodico); su Windows input_ready ripiega su kbhit + sleep
+        wait_timeout = 0.1 if os.name == 'nt' else 1.0
+        
+        # Modalità cbreak impostata una volta sola per tutta l'attesa
+        with raw_input_mode():
+            while self.display_active:
+                if input_ready(wait_timeout):
+                    key = getch()
+                    # Accetta Invio, 'q' o 'Q' per uscire
+                    if key in ['\r', '\n', 'q', 'Q']:
                         clear_screen()
-                        self._render_simple(self._last_pixel_data, self._last_term_width, self._last_term_height)
-                        sys.stdout.write(f"\033[{self._last_term_height};1H\033[0mPremere Invio per chiudere")
+                        self.display_active = False
+                        return 'close'
+                    # Supporto per esportazione con 'e'
+                    elif key in ['e', 'E']:
+                        timestamp = int(time.time())
+                        filename = f"termimg_export_{timestamp}.png"
+                        sys.stdout.write(f"\033[K\033[32mEsportazione: {filename}\033[0m")
                         sys.stdout.flush()
-            
-            # Dormiamo per un po' per ridurre l'uso della CPU
-            time.sleep(poll_interval)
+                        self.export_current_rendering(processor, filename)
+                    # Refresh esplicito con 'r'
+                    elif key in ['r', 'R']:
+                        # Verifica se abbiamo dati salvati prima di tentare un refresh
+                        if self._last_valid is not None:
+                            clear_screen()
+                            self._render_simple((self._last_top, self._last_bottom, self._last_valid),
+                                                self._last_term_width, self._last_term_height,
+                                                with_prompt=True)
         
         return 'close'
 
     def export_current_rendering(self, processor, filename):
         """Esporta il rendering corrente come immagine PNG."""
-        term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
-        
-        # Crea un'immagine dalle dimensioni appropriate
+        size = os.get_terminal_size()
+        term_width, term_height = size.columns, size.lines - 1
         scale = 2  # Fattore di scala per l'output
-        img_width = term_width * scale
-        img_height = term_height * scale * 2  # Carattere del terminale = 2 pixel verticali
-        image = Image.new('RGB', (img_width, img_height), color='black')
-        
-        # Crea un oggetto Draw per disegnare sull'immagine
-        draw = ImageDraw.Draw(image)
         
         # Prepara i dati dei pixel
-        pixel_data = self.prepare_pixel_data(
+        top_rgb, bottom_rgb, valid = self.prepare_pixel_data(
             processor.layers['base'], 
             self.target_width, self.target_height, 
             self.padding_x, self.padding_y,
             term_width, term_height
         )
         
-        # Disegna ogni carattere come un blocco di colore
-        for y in range(term_height):
-            for x in range(term_width):
-                if (x, y) in pixel_data:
-                    data = pixel_data[(x, y)]
-                    
-                    # Estrai colori
-                    top_color = data['top_pixel'][:3]
-                    bottom_color = data['bottom_pixel'][:3]
-                    
-                    # Disegna rettangoli per la parte superiore e inferiore del carattere
-                    top_rect = (x * scale, y * scale * 2, (x+1) * scale, (y * 2 + 1) * scale)
-                    bottom_rect = (x * scale, (y * 2 + 1) * scale, (x+1) * scale, (y+1) * 2 * scale)
-                    
-                    draw.rectangle(top_rect, fill=top_color)
-                    draw.rectangle(bottom_rect, fill=bottom_color)
+        # Un pixel per metà carattere (celle vuote nere), righe superiori e inferiori alternate
+        if NUMPY_AVAILABLE:
+            halves = np.zeros((term_height, 2, term_width, 3), dtype=np.uint8)
+            halves[:, 0][valid] = top_rgb[valid]
+            halves[:, 1][valid] = bottom_rgb[valid]
+            data = halves.tobytes()
+        else:
+            black = (0, 0, 0)
+            data = bytearray()
+            for top_row, bottom_row, valid_row in zip(top_rgb, bottom_rgb, valid):
+                for row in (top_row, bottom_row):
+                    for color, inside in zip(row, valid_row):
+                        data.extend(color if inside else black)
+        
+        # Ingrandisce ogni metà carattere a un blocco scale x scale
+        image = Image.frombytes('RGB', (term_width, term_height * 2), bytes(data))
+        image = image.resize((term_width * scale, term_height * 2 * scale), Image.NEAREST)
         
         # Salva l'immagine
         image.save(filename)
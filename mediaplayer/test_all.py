@@ -21,14 +21,10 @@ def test_dependencies():
         print("✗ PIL/Pillow non trovato")
     
     # Verifica ffmpeg
-    try:
-        import subprocess
-        result = subprocess.run(["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode == 0:
-            print("✓ ffmpeg installato")
-        else:
-            print("✗ ffmpeg non disponibile")
-    except:
+    from core import has_ffmpeg
+    if has_ffmpeg():
+        print("✓ ffmpeg installato")
+    else:
         print("✗ ffmpeg non disponibile")
     
     # Verifica moduli interni
@@ -181,13 +177,49 @@ def test_input_handler():
     
     print()
 
+def test_dithering():
+    """Verifica che i livelli del dithering restino distinti dopo la conversione in ANSI."""
+    print("=== Test Dithering ===")
+    
+    try:
+        import numpy as np
+        from dither_numba import _level_values
+        from terminal_renderer import lookup_ansi, lab_ansi_lut
+        
+        for levels in range(2, 7):
+            values = _level_values(levels)
+            # Ogni livello su un solo canale (gli altri a zero), per tutti e tre i canali
+            colors = np.zeros((3, levels, 3), dtype=np.uint8)
+            for channel in range(3):
+                colors[channel, :, channel] = values
+            for lut in (None, lab_ansi_lut()):
+                codes = lookup_ansi(colors, lut)
+                if any(len(set(row.tolist())) != levels for row in codes):
+                    print(f"✗ {levels} livelli {values}: codici ANSI non distinti {codes.tolist()}")
+                    break
+            else:
+                print(f"✓ {levels} livelli {values}: codici ANSI distinti")
+    except ImportError as e:
+        print(f"✗ Test dithering non eseguibile: {e}")
+    
+    print()
+
+def _scan_for_extensions(path, extensions):
+    """Primo file di path con una delle estensioni (tupla in minuscolo), in un solo passaggio."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.lower().endswith(extensions):
+                return entry.name
+    return None
+
 def find_test_file(extensions):
     """Cerca un file di test con le estensioni specificate."""
+    extensions = tuple(ext.lower() for ext in extensions)
+    
     # Cerca nella directory attuale
-    for ext in extensions:
-        for file in os.listdir("."):
-            if file.lower().endswith(ext):
-                return file
+    file = _scan_for_extensions(".", extensions)
+    if file:
+        return file
     
     # Cerca nella directory dell'utente
     home = os.path.expanduser("~")
@@ -196,9 +228,9 @@ def find_test_file(extensions):
     for directory in common_dirs:
         path = os.path.join(home, directory)
         if os.path.exists(path):
-            for file in os.listdir(path):
-                if any(file.lower().endswith(ext) for ext in extensions):
-                    return os.path.join(path, file)
+            file = _scan_for_extensions(path, extensions)
+            if file:
+                return os.path.join(path, file)
     
     return None
 
@@ -211,16 +243,18 @@ def main():
     parser.add_argument("--svg", action="store_true", help="Test SVG")
     parser.add_argument("--video", action="store_true", help="Test video")
     parser.add_argument("--input", action="store_true", help="Test input handler")
+    parser.add_argument("--dither", action="store_true", help="Test livelli del dithering")
     
     args = parser.parse_args()
     
     # Se non è specificato alcun test o è specificato --all, esegui tutti i test
-    if not any([args.deps, args.image, args.svg, args.video, args.input]) or args.all:
+    if not any([args.deps, args.image, args.svg, args.video, args.input, args.dither]) or args.all:
         test_dependencies()
         test_image()
         test_svg()
         test_video()
         test_input_handler()
+        test_dithering()
     else:
         if args.deps:
             test_dependencies()
@@ -232,6 +266,8 @@ def main():
             test_video()
         if args.input:
             test_input_handler()
+        if args.dither:
+            test_dithering()
     
     print("Test completati!")
 
@@ -6,15 +6,12 @@ Permette di confrontare diversi algoritmi di rendering e ottimizzazioni di quali
 
 import os
 import sys
-import time
 import argparse
 
 # Aggiungi la directory corrente al path per facilitare le importazioni
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core import clear_screen, kbhit, getch
-from image_processor import ImageProcessor
-from terminal_renderer import TerminalRenderer
+from core import clear_screen, wait_input, FrameWriter
 
 def main():
     """Funzione principale per testare la qualità dell'immagine."""
@@ -43,9 +40,12 @@ def main():
     print(f"Qualità: {args.quality}")
     
     # Ottieni dimensioni del terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
-    # Inizializza processore e renderer
+    # Inizializza processore e renderer (importati solo dopo la verifica degli argomenti)
+    from image_processor import ImageProcessor
+    from terminal_renderer import TerminalRenderer
     processor = ImageProcessor()
     renderer = TerminalRenderer()
     
@@ -73,16 +73,17 @@ def main():
         # Applica contrasto e luminosità
         processed_img = processor.process_image(img, args.contrast, args.brightness)
         
-        # Applica dithering se richiesto
-        if args.dithering:
-            print("Applicazione dithering...")
-            processed_img = apply_dithering(processed_img, args.quality)
-        
         # Ridimensiona per adattarla al terminale
         resized_img, target_width, target_height, padding_x, padding_y = processor.resize_for_terminal(
             processed_img, term_width, term_height, args.mode
         )
         
+        # Applica dithering se richiesto (dopo il ridimensionamento, che altrimenti
+        # mescolerebbe di nuovo i pixel)
+        if args.dithering:
+            print("Applicazione dithering...")
+            processor.layers['base'] = apply_dithering(processor.layers['base'], args.quality)
+        
         # Configura la qualità del rendering
         configure_quality(renderer, args.quality)
         
@@ -107,11 +108,7 @@ def main():
         
         # Attendi input utente
         print("Premi un tasto qualsiasi per uscire...")
-        while True:
-            if kbhit():
-                getch()
-                break
-            time.sleep(0.1)
+        wait_input()
         
         clear_screen()
         
@@ -123,32 +120,30 @@ def main():
         
     return 0
 
+# Impostazioni complete del renderer per ogni livello di qualità: ogni livello
+# assegna tutti gli attributi, così nulla resta dal livello precedente
+QUALITY_PRESETS = {
+    "low": {"use_dithering": False, "color_depth": 8, "use_half_blocks": False,
+            "subpixel_rendering": False, "color_correction": False},
+    "medium": {"use_dithering": False, "color_depth": 16, "use_half_blocks": True,
+               "subpixel_rendering": False, "color_correction": False},
+    "high": {"use_dithering": True, "color_depth": 256, "use_half_blocks": True,
+             "subpixel_rendering": False, "color_correction": False},
+    "ultra": {"use_dithering": True, "color_depth": 256, "use_half_blocks": True,
+              "subpixel_rendering": True, "color_correction": True},
+}
+
 def configure_quality(renderer, quality_level):
     """Configura il renderer per il livello di qualità specificato."""
-    if quality_level == "low":
-        renderer.use_dithering = False
-        renderer.color_depth = 8
-        renderer.use_half_blocks = False
-    elif quality_level == "medium":
-        renderer.use_dithering = False
-        renderer.color_depth = 16
-        renderer.use_half_blocks = True
-    elif quality_level == "high":
-        renderer.use_dithering = True
-        renderer.color_depth = 256
-        renderer.use_half_blocks = True
-    elif quality_level == "ultra":
-        renderer.use_dithering = True
-        renderer.color_depth = 256
-        renderer.use_half_blocks = True
-        renderer.subpixel_rendering = True
-        renderer.color_correction = True
+    renderer.apply_preset(QUALITY_PRESETS[quality_level])
 
 def apply_dithering(image, quality_level):
     """Applica il dithering all'immagine per migliorare la qualità percepita."""
-    # Nota: Questa è una funzione segnaposto. L'implementazione reale richiederebbe
-    # algoritmi di dithering come Floyd-Steinberg, ordinate dithering, ecc.
-    return image  # Per ora ritorna l'immagine inalterata
+    from dither_numba import dither_image
+    
+    # Livelli per canale: 6 corrisponde al cubo 6x6x6 della palette a 256 colori
+    levels = {"low": 2, "medium": 4}.get(quality_level, 6)
+    return dither_image(image, levels)
 
 def display_comparison(img, processor, renderer, term_width, term_height):
     """Mostra un confronto tra diverse qualità di rendering."""
@@ -156,54 +151,57 @@ def display_comparison(img, processor, renderer, term_width, term_height):
     
     # Determina la dimensione di ciascun pannello
     panel_height = term_height // len(qualities)
+    panel_rows = panel_height - 2
+    
+    # Elaborazione e ridimensionamento non dipendono dalla qualità: una sola volta
+    processed_img = processor.process_image(img, 1.1, 1.0)
+    resized_img, target_width, target_height, padding_x, padding_y = processor.resize_for_terminal(
+        processed_img, term_width, panel_rows, "fit"
+    )
+    base = processor.layers['base']
+    
+    # Salva dimensioni nel renderer
+    renderer.target_width = target_width
+    renderer.target_height = target_height
+    renderer.padding_x = padding_x
+    renderer.padding_y = padding_y
+    
+    titles = [f"Qualità: {quality.upper()} " + "-" * (term_width - len(quality) - 10)
+              for quality in qualities]
+    # Dati dei pixel per ogni variante (con o senza dithering), preparati una volta
+    variants = {}
     
     clear_screen()
     
+    # Titoli e pannelli vengono accumulati e scritti con una sola chiamata
+    writer = FrameWriter()
     for i, quality in enumerate(qualities):
         # Configura la qualità
         configure_quality(renderer, quality)
         
-        # Processa l'immagine
-        processed_img = processor.process_image(img, 1.1, 1.0)
-        
-        # Ridimensiona per adattarla al pannello
-        resized_img, target_width, target_height, padding_x, padding_y = processor.resize_for_terminal(
-            processed_img, term_width, panel_height - 2, "fit"
-        )
-        
-        # Salva dimensioni nel renderer
-        renderer.target_width = target_width
-        renderer.target_height = target_height
-        renderer.padding_x = padding_x
-        renderer.padding_y = padding_y
-        
         # Prepara i dati per il rendering
-        pixel_data = renderer.prepare_pixel_data(
-            processor.layers['base'],
-            target_width, target_height, 
-            padding_x, padding_y,
-            term_width, panel_height - 2
-        )
-        
-        # Posiziona il cursore alla riga corretta
-        print(f"\033[{i * panel_height + 1}H", end="")
-        
-        # Mostra il titolo del pannello
-        print(f"Qualità: {quality.upper()} " + "-" * (term_width - len(quality) - 10))
+        if renderer.use_dithering not in variants:
+            source = apply_dithering(base, quality) if renderer.use_dithering else base
+            variants[renderer.use_dithering] = renderer.prepare_pixel_data(
+                source,
+                target_width, target_height, 
+                padding_x, padding_y,
+                term_width, panel_rows
+            )
+        pixel_data = variants[renderer.use_dithering]
+        
+        # Titolo del pannello alla riga corretta
+        writer.move(i * panel_height + 1).text(titles[i])
         
         # Rendering dell'immagine nel pannello
-        renderer.render_panel(pixel_data, term_width, panel_height - 2, i * panel_height + 2)
+        renderer.render_panel(pixel_data, term_width, panel_rows, i * panel_height + 2, writer)
     
     # Posiziona il cursore alla fine
-    print(f"\033[{term_height}H", end="")
-    print("Premi un tasto qualsiasi per uscire...", end="", flush=True)
+    writer.move(term_height).text("Premi un tasto qualsiasi per uscire...")
+    writer.flush()
     
     # Attendi input utente
-    while True:
-        if kbhit():
-            getch()
-            break
-        time.sleep(0.1)
+    wait_input()
 
 if __name__ == "__main__":
     sys.exit(main())
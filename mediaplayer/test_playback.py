@@ -9,6 +9,7 @@ import os
 import sys
 import time
 import argparse
+import threading
 
 # Assicura che la directory corrente sia nel path
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,15 +17,19 @@ if script_dir not in sys.path:
     sys.path.insert(0, script_dir)
 
 # Importa i moduli necessari
-from core import clear_screen, kbhit, getch
+from core import clear_screen, wait_input, raw_input_mode, list_frame_files
 from video_manager import VideoManager
 from image_processor import ImageProcessor
-from terminal_renderer import TerminalRenderer
-from complete_video_renderer import CompleteVideoRenderer
+from terminal_renderer import TerminalRenderer, NUMPY_AVAILABLE
 import queue
 
 def test_basic_playback(video_path, fps=24.0, duration=None, loop=False):
     """Test di riproduzione base, senza ottimizzazioni avanzate."""
+    # Moduli usati solo in questa modalità: importati qui per non rallentare l'avvio
+    from renderer_fused import prepare_frame
+    from frame_loader import load_frame
+    from streaming_decoder import AV_AVAILABLE, probe_video, stream_frames
+    
     print(f"Test riproduzione base: {video_path}")
     print(f"FPS target: {fps}")
     
@@ -34,109 +39,240 @@ def test_basic_playback(video_path, fps=24.0, duration=None, loop=False):
     renderer = TerminalRenderer()
     
     # Ottieni dimensioni terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
-    
-    # Estrai i frame
-    print("Estrazione frame...")
-    frames_dir = video_manager.extract_frames(
-        video_path,
-        fps=fps,
-        start_time=0,
-        duration=duration
-    )
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
-    if not frames_dir:
-        print("Estrazione frame fallita.")
-        return
-        
-    # Carica i frame
-    frame_files = sorted([f for f in os.listdir(frames_dir) if f.endswith(('.jpg', '.png'))])
-    if not frame_files:
-        print("Nessun frame estratto.")
-        return
+    # Con PyAV i frame vengono decodificati direttamente in memoria
+    video_info = probe_video(video_path) if AV_AVAILABLE else None
+    stream = None
+    frame_files = None
+    if video_info and video_info[2] > 0:
+        src_width, src_height, video_duration = video_info
+        if duration is not None:
+            video_duration = min(video_duration, duration)
+        total_frames = int(video_duration * fps)
+        # Dimensione a cui libswscale riduce ogni frame, già adattata al terminale
+        fit_width, fit_height = processor.fit_geometry(src_width, src_height,
+                                                       term_width, term_height)[:2]
+        print(f"Decodifica diretta: {total_frames} frame.")
+    else:
+        # Senza PyAV i frame arrivano da ffmpeg su richiesta (VideoStream), già
+        # ridotti alla dimensione del terminale: niente JPEG su disco
+        video_info = video_manager.get_video_info(video_path)
+        if video_info and video_info.get('width') and video_info.get('height') \
+                and video_info.get('duration'):
+            video_duration = video_info['duration']
+            if duration is not None:
+                video_duration = min(video_duration, duration)
+            total_frames = int(video_duration * fps)
+            fit_width, fit_height = processor.fit_geometry(video_info['width'], video_info['height'],
+                                                           term_width, term_height)[:2]
+            stream = video_manager.open_video_stream(video_path, fps=fps,
+                                                     size=(fit_width, fit_height))
         
-    print(f"Estratti {len(frame_files)} frame.")
+        if stream is not None:
+            print(f"Decodifica con ffmpeg: {total_frames} frame.")
+        else:
+            # Estrai i frame
+            print("Estrazione frame...")
+            frames_dir = video_manager.extract_frames(
+                video_path,
+                fps=fps,
+                start_time=0,
+                duration=duration,
+                # Riduzione già in ffmpeg alla risoluzione del terminale (2 pixel per riga)
+                target_width=term_width,
+                target_height=term_height * 2
+            )
+            
+            if not frames_dir:
+                print("Estrazione frame fallita.")
+                return
+                
+            # Carica i frame
+            frame_files = list_frame_files(frames_dir)
+            if not frame_files:
+                print("Nessun frame estratto.")
+                return
+            total_frames = len(frame_files)
+            print(f"Estratti {total_frames} frame.")
+    
     print(f"Avvio riproduzione a {fps} FPS. Premi 'q' per uscire, 'p' per pausa.")
     time.sleep(1)
     clear_screen()
     
     # Variabili per la riproduzione
     frame_count = 0
-    start_time = time.time()
     frame_duration = 1.0 / fps
+    # Orologio monotono in ns: non risente delle correzioni dell'ora di sistema
+    frame_duration_ns = round(1e9 / fps)
     is_paused = False
+    pause_ns = 0
     
-    # Loop di riproduzione
-    while frame_count < len(frame_files):
-        # Controllo input utente
-        if kbhit():
-            key = getch()
-            if key == 'q':
-                break
-            elif key == 'p':
-                is_paused = not is_paused
-                if not is_paused:
-                    # Quando si riprende, regola il tempo di inizio
-                    start_time = time.time() - (frame_count * frame_duration)
-                
-        if is_paused:
-            time.sleep(0.1)
-            continue
-            
-        # Calcola il frame da mostrare
-        current_time = time.time()
-        elapsed = current_time - start_time
-        target_frame = int(elapsed * fps)
+    # Parti costanti della barra di stato, calcolate una volta
+    inv_fps = 1.0 / fps
+    # Il nome del file entra nel template: i suoi '%' vanno raddoppiati
+    video_name = os.path.basename(video_path).replace('%', '%%')
+    status_tmpl = "[%d%% | %02d:%02d | %.1f FPS] " + video_name
+    
+    # Stato condiviso con il thread di decodifica: 'gen' cambia a ogni riavvio del loop
+    state = {'start_ns': time.monotonic_ns(), 'gen': 0}
+    frame_queue = queue.Queue(maxsize=2)
+    playing = threading.Event()
+    stop_event = threading.Event()
+    playing.set()
+    
+    def clock_frame():
+        """Frame che dovrebbe essere visualizzato in questo istante."""
+        return (time.monotonic_ns() - state['start_ns']) // frame_duration_ns
+    
+    def decoded_frames():
+        """Frame (indice, immagine) dall'inizio del video, saltando quelli già in ritardo."""
+        if stream is None and frame_files is None:
+            for pts, frame in stream_frames(video_path, duration):
+                idx = int(pts * fps)
+                # I frame in ritardo vengono scartati prima della conversione in RGB
+                if idx >= clock_frame():
+                    yield idx, frame.to_image(width=fit_width, height=fit_height)
+            return
         
-        if target_frame >= len(frame_files):
-            if loop:
-                # Ricomincia da capo
-                frame_count = 0
-                start_time = time.time()
-                continue
+        idx = 0
+        while True:
+            # Se la decodifica è in ritardo, salta direttamente al frame atteso
+            idx = max(idx, clock_frame())
+            if idx >= total_frames:
+                return
+            # Frame già ridotto per il terminale: da ffmpeg (ripartito solo per
+            # salti lunghi) o dal JPEG estratto
+            if stream is not None:
+                img = stream.get_frame(idx)
+                if img is None:
+                    return
             else:
-                # Fine riproduzione
-                break
+                img = load_frame(frame_files[idx], (term_width, term_height * 2))
+            yield idx, img
+            idx += 1
+    
+    def producer():
+        """Decodifica il frame successivo mentre il thread principale visualizza il corrente."""
+        gen = -1
+        frames = None
+        # Frame vivi insieme: due in coda, uno in attesa nel thread principale e
+        # quello in preparazione; gli array di ognuno vengono riutilizzati a rotazione
+        slots = frame_queue.maxsize + 2
+        produced = 0
+        try:
+            while not stop_event.is_set():
+                if not playing.wait(0.1):
+                    continue
+                if gen != state['gen']:
+                    if frames is not None:
+                        frames.close()
+                    gen, frames = state['gen'], decoded_frames()
+                item = next(frames, None)
+                if item is None or item[0] >= total_frames:
+                    stop_event.wait(frame_duration)
+                    continue
                 
-        # Se il frame corrente è diverso dall'ultimo mostrato, aggiorna la visualizzazione
-        if target_frame != frame_count:
-            frame_count = target_frame
-            
-            # Carica e processa il frame
-            frame_path = os.path.join(frames_dir, frame_files[frame_count])
-            img = processor.load_image(frame_path)
-            processed_img = processor.process_image(img, 1.1, 1.0)
-            
-            # Ridimensiona per il terminale
-            resized_img, target_width, target_height, padding_x, padding_y = processor.resize_for_terminal(
-                processed_img, term_width, term_height, "fit"
-            )
-            
-            # Prepara i dati per il rendering
-            pixel_data = renderer.prepare_pixel_data(
-                processor.layers['base'],
-                target_width, target_height,
-                padding_x, padding_y,
-                term_width, term_height
-            )
-            
-            # Stato riproduzione
-            minutes = int(frame_count / fps / 60)
-            seconds = int(frame_count / fps) % 60
-            time_str = f"{minutes:02d}:{seconds:02d}"
-            progress = int((frame_count / len(frame_files)) * 100)
-            actual_fps = frame_count / max(0.001, elapsed)
-            status_text = f"[{progress}% | {time_str} | {actual_fps:.1f} FPS] {os.path.basename(video_path)}"
-            
-            # Rendering del frame
-            renderer.render_video_frame_mobile(pixel_data, term_width, term_height, status_text)
+                # Elaborazione, ridimensionamento e preparazione dei dati
+                # avvengono in un solo passaggio (vedi renderer_fused)
+                idx, img = item
+                out = None
+                if NUMPY_AVAILABLE:
+                    out = renderer.scratch_pixel_arrays(term_width, term_height, produced % slots)
+                    produced += 1
+                pixel_data = prepare_frame(processor, renderer, img, term_width, term_height,
+                                           1.1, 1.0, out)
+                
+                item = (gen, idx, pixel_data)
+                while not stop_event.is_set() and gen == state['gen']:
+                    try:
+                        frame_queue.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+        finally:
+            # Chiude il file video aperto dal generatore
+            if frames is not None:
+                frames.close()
+    
+    decoder = threading.Thread(target=producer, daemon=True)
+    decoder.start()
+    pending = None
+    sleep_time = 0.0
+    
+    try:
+        with raw_input_mode():
+            # Loop di riproduzione; l'attesa del frame successivo avviene in wait_input
+            while frame_count < total_frames:
+                # Attende l'input fino al prossimo frame (senza limite in pausa)
+                key = wait_input(None if is_paused else sleep_time)
+                if key == 'q':
+                    break
+                elif key == 'p':
+                    is_paused = not is_paused
+                    if is_paused:
+                        pause_ns = time.monotonic_ns()
+                        playing.clear()
+                    else:
+                        # Quando si riprende, sposta l'inizio della durata della pausa
+                        state['start_ns'] += time.monotonic_ns() - pause_ns
+                        playing.set()
+                    
+                if is_paused:
+                    continue
+                
+                # Calcola il frame da mostrare
+                elapsed_ns = time.monotonic_ns() - state['start_ns']
+                target_frame = elapsed_ns // frame_duration_ns
             
-        # Calcola quanto attendere per il prossimo frame
-        next_frame_time = start_time + ((frame_count + 1) * frame_duration)
-        sleep_time = max(0.0, next_frame_time - time.time())
-        
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+                if target_frame >= total_frames:
+                    if loop:
+                        # Ricomincia da capo
+                        frame_count = 0
+                        state['start_ns'] = time.monotonic_ns()
+                        state['gen'] += 1
+                        continue
+                    else:
+                        # Fine riproduzione
+                        break
+                    
+                # Se il frame corrente è diverso dall'ultimo mostrato, aggiorna la visualizzazione
+                if target_frame != frame_count:
+                    # Scarta i frame rimasti indietro; uno in anticipo resta in attesa del suo turno
+                    while pending is None or pending[0] != state['gen'] or pending[1] < target_frame:
+                        try:
+                            pending = frame_queue.get(timeout=frame_duration)
+                        except queue.Empty:
+                            pending = None
+                            break
+                
+                    if pending is not None and pending[1] == target_frame:
+                        frame_count = target_frame
+                        pixel_data = pending[2]
+                        pending = None
+                    
+                        # Stato riproduzione
+                        minutes, seconds = divmod(int(frame_count * inv_fps), 60)
+                        actual_fps = frame_count * 1e9 / max(1000000, elapsed_ns)
+                        status_text = status_tmpl % (frame_count * 100 // total_frames, minutes, seconds,
+                                                     actual_fps)
+                    
+                        # Rendering del frame
+                        renderer.render_video_frame_mobile(pixel_data, term_width, term_height, status_text)
+                
+                # Calcola quanto attendere per il prossimo frame
+                # Scadenza assoluta: l'attesa non accumula errori da un frame all'altro
+                next_frame_ns = state['start_ns'] + (target_frame + 1) * frame_duration_ns
+                sleep_time = max(0, next_frame_ns - time.monotonic_ns()) / 1e9
+    finally:
+        # Ferma il thread di decodifica
+        stop_event.set()
+        playing.set()
+        decoder.join()
+        # Termina il processo ffmpeg della decodifica su richiesta
+        if stream is not None:
+            stream.close()
             
     # Pulizia
     clear_screen()
@@ -144,6 +280,8 @@ def test_basic_playback(video_path, fps=24.0, duration=None, loop=False):
 
 def test_prerendered_playback(video_path, fps=24.0, duration=None, loop=False):
     """Test di riproduzione con pre-rendering completo."""
+    from complete_video_renderer import CompleteVideoRenderer
+    
     print(f"Test riproduzione con pre-rendering completo: {video_path}")
     print(f"FPS target: {fps}")
     
@@ -153,7 +291,8 @@ def test_prerendered_playback(video_path, fps=24.0, duration=None, loop=False):
     renderer = TerminalRenderer()
     
     # Ottieni dimensioni terminale
-    term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+    size = os.get_terminal_size()
+    term_width, term_height = size.columns, size.lines - 1
     
     # Crea renderer completo
     complete_renderer = CompleteVideoRenderer(video_manager, processor, renderer)
@@ -184,13 +323,10 @@ def test_prerendered_playback(video_path, fps=24.0, duration=None, loop=False):
     
     # Attendi il completamento del pre-rendering
     while not complete_renderer.is_complete() and complete_renderer.is_rendering:
-        if kbhit():
-            key = getch()
-            if key == 'q':
-                complete_renderer.cancel_rendering()
-                print("\nPre-rendering annullato.")
-                return
-        time.sleep(0.1)
+        if wait_input(0.1) == 'q':
+            complete_renderer.cancel_rendering()
+            print("\nPre-rendering annullato.")
+            return
         
     print("\nPre-rendering completato. Avvio riproduzione...")
     time.sleep(1)
@@ -201,74 +337,78 @@ def test_prerendered_playback(video_path, fps=24.0, duration=None, loop=False):
     
     # Variabili per la riproduzione
     frame_count = 0
-    start_time = time.time()
-    frame_duration = 1.0 / fps
+    # Orologio monotono in ns: non risente delle correzioni dell'ora di sistema
+    start_ns = time.monotonic_ns()
+    frame_duration_ns = round(1e9 / fps)
     is_paused = False
+    pause_ns = 0
+    
+    # Parti costanti della barra di stato, calcolate una volta
+    inv_fps = 1.0 / fps
+    # Il nome del file entra nel template: i suoi '%' vanno raddoppiati
+    video_name = os.path.basename(video_path).replace('%', '%%')
+    status_tmpl = "[%d%% | %02d:%02d | %.1f FPS] " + video_name
+    pause_tmpl = "[PAUSA %d%% | %02d:%02d] " + video_name
+    sleep_time = 0.0
     
-    # Loop di riproduzione
-    while frame_count < total_frames:
-        # Controllo input utente
-        if kbhit():
-            key = getch()
+    with raw_input_mode():
+        # Loop di riproduzione; l'attesa del frame successivo avviene in wait_input
+        while frame_count < total_frames:
+            # Attende l'input fino al prossimo frame (senza limite in pausa)
+            key = wait_input(None if is_paused else sleep_time)
             if key == 'q':
                 break
             elif key == 'p':
                 is_paused = not is_paused
-                if not is_paused:
-                    # Quando si riprende, regola il tempo di inizio
-                    start_time = time.time() - (frame_count * frame_duration)
-                    
-        if is_paused:
-            # In pausa, mostra l'ultimo frame con stato di pausa
-            frame_buffer = complete_renderer.get_frame(frame_count)
-            if frame_buffer:
-                minutes = int(frame_count / fps / 60)
-                seconds = int(frame_count / fps) % 60
-                time_str = f"{minutes:02d}:{seconds:02d}"
-                progress = int((frame_count / total_frames) * 100)
-                status_text = f"[PAUSA {progress}% | {time_str}] {os.path.basename(video_path)}"
-                renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
-            time.sleep(0.1)
-            continue
+                if is_paused:
+                    pause_ns = time.monotonic_ns()
+                    # Mostra una sola volta l'ultimo frame con lo stato di pausa:
+                    # poi wait_input resta bloccata fino al tasto successivo
+                    frame_buffer = complete_renderer.get_frame(frame_count)
+                    if frame_buffer:
+                        minutes, seconds = divmod(int(frame_count * inv_fps), 60)
+                        status_text = pause_tmpl % (frame_count * 100 // total_frames, minutes, seconds)
+                        renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
+                else:
+                    # Quando si riprende, sposta l'inizio della durata della pausa
+                    start_ns += time.monotonic_ns() - pause_ns
+                
+            if is_paused:
+                continue
             
-        # Calcola il frame da mostrare
-        current_time = time.time()
-        elapsed = current_time - start_time
-        target_frame = int(elapsed * fps)
+            # Calcola il frame da mostrare
+            elapsed_ns = time.monotonic_ns() - start_ns
+            target_frame = elapsed_ns // frame_duration_ns
         
-        if target_frame >= total_frames:
-            if loop:
-                # Ricomincia da capo
-                frame_count = 0
-                start_time = time.time()
-                continue
-            else:
-                # Fine riproduzione
-                break
+            if target_frame >= total_frames:
+                if loop:
+                    # Ricomincia da capo
+                    frame_count = 0
+                    start_ns = time.monotonic_ns()
+                    continue
+                else:
+                    # Fine riproduzione
+                    break
                 
-        # Recupera il frame pre-renderizzato
-        frame_buffer = complete_renderer.get_frame(target_frame)
-        if frame_buffer:
-            # Aggiorna contatore
-            frame_count = target_frame
+            # Recupera il frame pre-renderizzato
+            frame_buffer = complete_renderer.get_frame(target_frame)
+            if frame_buffer:
+                # Aggiorna contatore
+                frame_count = target_frame
             
-            # Stato riproduzione
-            minutes = int(frame_count / fps / 60)
-            seconds = int(frame_count / fps) % 60
-            time_str = f"{minutes:02d}:{seconds:02d}"
-            progress = int((frame_count / total_frames) * 100)
-            actual_fps = frame_count / max(0.001, elapsed)
-            status_text = f"[{progress}% | {time_str} | {actual_fps:.1f} FPS] {os.path.basename(video_path)}"
+                # Stato riproduzione
+                minutes, seconds = divmod(int(frame_count * inv_fps), 60)
+                actual_fps = frame_count * 1e9 / max(1000000, elapsed_ns)
+                status_text = status_tmpl % (frame_count * 100 // total_frames, minutes, seconds,
+                                             actual_fps)
             
-            # Rendering del frame
-            renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
+                # Rendering del frame
+                renderer.render_video_frame_mobile(frame_buffer, term_width, term_height, status_text)
             
-        # Calcola quanto attendere per il prossimo frame
-        next_frame_time = start_time + ((frame_count + 1) * frame_duration)
-        sleep_time = max(0.0, next_frame_time - time.time())
-        
-        if sleep_time > 0:
-            time.sleep(sleep_time)
+            # Calcola quanto attendere per il prossimo frame
+            # Scadenza assoluta: l'attesa non accumula errori da un frame all'altro
+            next_frame_ns = start_ns + (frame_count + 1) * frame_duration_ns
+            sleep_time = max(0, next_frame_ns - time.monotonic_ns()) / 1e9
     
     # Pulizia
     complete_renderer.cleanup()
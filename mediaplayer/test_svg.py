@@ -6,14 +6,11 @@ Questo script carica e visualizza un SVG utilizzando solo le componenti essenzia
 
 import os
 import sys
-import time
 
 # Aggiungi la directory corrente al path per facilitare le importazioni
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from core import clear_screen, kbhit, getch
-from image_processor import ImageProcessor
-from terminal_renderer import TerminalRenderer
+from core import clear_screen, wait_input
 
 def main():
     # Controlla i parametri
@@ -38,9 +35,12 @@ def main():
             return
         
         # Ottieni le dimensioni del terminale
-        term_width, term_height = os.get_terminal_size().columns, os.get_terminal_size().lines - 1
+        size = os.get_terminal_size()
+        term_width, term_height = size.columns, size.lines - 1
         
-        # Inizializza processore e renderer
+        # Inizializza processore e renderer (importati solo dopo la verifica degli argomenti)
+        from image_processor import ImageProcessor
+        from terminal_renderer import TerminalRenderer
         processor = ImageProcessor()
         renderer = TerminalRenderer()
         
@@ -48,12 +48,7 @@ def main():
         if svg_renderer.render_svg(svg_path, term_width, term_height, processor, renderer):
             # Attendi input
             print("SVG visualizzato correttamente. Premi un tasto per uscire.")
-            while True:
-                if kbhit():
-                    key = getch()
-                    if key:
-                        break
-                time.sleep(0.1)
+            wait_input()
                 
             clear_screen()
         else:
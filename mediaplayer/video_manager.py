@@ -1,11 +1,34 @@
+import json
+import logging
 import os
+import re
+import stat
 import subprocess
+import threading
 import time
 import tempfile
+import uuid
 import shutil
-import glob
 import mimetypes
-from core import CACHE_DIR, ensure_dirs, get_ffmpeg_paths
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from collections import OrderedDict, deque
+from core import (CACHE_DIR, ensure_dirs, get_ffmpeg_paths, has_ffmpeg, list_frame_files,
+                  frame_file_path, count_frame_files)
+from frame_loader import load_frame
+
+# Messaggi diagnostici (comandi, info ffprobe): visibili solo attivando il livello
+# DEBUG, ad es. logging.basicConfig(level=logging.DEBUG); gli errori restano su stdout
+log = logging.getLogger(__name__)
+
+# orjson è opzionale: analizza il JSON di ffprobe più velocemente del modulo json
+try:
+    import orjson
+    _json_loads = orjson.loads
+    ORJSON_AVAILABLE = True
+except ImportError:
+    _json_loads = json.loads
+    ORJSON_AVAILABLE = False
 
 # Formati video supportati
 SUPPORTED_VIDEO_FORMATS = [
@@ -15,24 +38,306 @@ SUPPORTED_VIDEO_FORMATS = [
     '.ts', '.m4v', '.3gp', '.vob', '.ogv', '.asf', '.m2ts', '.mts'
 ]
 
+# Avanzamento di ffmpeg in formato chiave=valore su stdout, senza le statistiche su stderr
+_PROGRESS_ARGS = ["-nostats", "-loglevel", "error", "-progress", "pipe:1"]
+
+# Tempo elaborato in una riga di -progress: entrambe le chiavi sono in microsecondi
+# (il valore è "N/A" all'inizio della codifica e allora non corrisponde)
+# Le righe sono lette come byte, senza decodifica del testo
+_OUT_TIME_RE = re.compile(rb"out_time_(?:us|ms)=(\d+)")
+
+def _progress_us(line):
+    """Microsecondi elaborati da una riga di -progress (None per le altre righe)."""
+    match = _OUT_TIME_RE.match(line)
+    return int(match.group(1)) if match else None
+
+def _input_args(ffmpeg_path, video_path, start_time):
+    """
+    Inizio di un comando ffmpeg che legge video_path da start_time secondi.
+    Il seek va prima di -i: ffmpeg salta al keyframe precedente invece di decodificare
+    e scartare tutto ciò che precede, e poiché i frame vengono ricodificati la
+    posizione resta comunque esatta al frame.
+    """
+    cmd = [ffmpeg_path]
+    if start_time > 0:
+        cmd.extend(["-ss", str(start_time)])
+    cmd.extend(["-i", video_path])
+    return cmd
+
+def _filter_args(fps, target_width, target_height):
+    """
+    Opzione -vf per i frame estratti su disco: prima il campionamento a fps, poi la
+    riduzione con lo scaler di ffmpeg, così si scalano solo i frame che verranno scritti.
+    La riduzione mantiene le proporzioni entro target_width x target_height e non
+    ingrandisce mai; se manca una delle due dimensioni l'altra segue le proporzioni.
+    """
+    filters = []
+    if fps:
+        filters.append(f"fps={fps}")
+    if target_width or target_height:
+        box_width = f"min(iw,{target_width})" if target_width else "-2"
+        box_height = f"min(ih,{target_height})" if target_height else "-2"
+        fit = ":force_original_aspect_ratio=decrease" if target_width and target_height else ""
+        filters.append(f"scale='{box_width}':'{box_height}'{fit}:flags=fast_bilinear")
+    return ["-vf", ",".join(filters)] if filters else []
+
+def _read_exact(stream, view):
+    """
+    Legge da stream fino a riempire view (le pipe possono restituire letture parziali).
+    
+    Returns:
+        Numero di byte letti: minore di len(view) solo alla fine del flusso
+    """
+    total = 0
+    while total < len(view):
+        n = stream.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+# Cache delle informazioni di ffprobe, condivisa dalle istanze e salvata su disco
+_VIDEO_INFO_FILE = os.path.join(CACHE_DIR, "videoinfo.json")
+_VIDEO_INFO_MAX = 256
+_VIDEO_INFO_LOCK = threading.Lock()
+_video_info = None
+
+def _video_info_cache():
+    """Cache (OrderedDict chiave → info) caricata da disco al primo uso."""
+    global _video_info
+    if _video_info is None:
+        _video_info = OrderedDict()
+        try:
+            with open(_VIDEO_INFO_FILE, 'rb') as f:
+                _video_info.update(_json_loads(f.read()))
+        except (OSError, ValueError):
+            pass
+    return _video_info
+
+def _save_video_info_cache(cache):
+    """Scrive la cache su disco (file temporaneo e rename: mai un file a metà)."""
+    tmp_path = f"{_VIDEO_INFO_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, _VIDEO_INFO_FILE)
+    except OSError:
+        pass
+
+def _remove_dir(path):
+    """
+    Elimina una directory di frame: unlink diretto dei file trovati con scandir,
+    senza i controlli per voce di shutil.rmtree (usato solo per le sottodirectory).
+    """
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path, ignore_errors=True)
+                    else:
+                        os.unlink(entry.path)
+                except OSError:
+                    pass
+        os.rmdir(path)
+    except OSError:
+        pass
+
+def _available_memory():
+    """Memoria fisica disponibile in byte (None se non determinabile)."""
+    try:
+        import psutil
+        return psutil.virtual_memory().available
+    except ImportError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+def _cache_limit(frame_bytes):
+    """Frame da tenere in cache: un quarto della memoria disponibile, fra 60 e 2000."""
+    available = _available_memory()
+    if not available:
+        return 60
+    return max(60, min(2000, available // 4 // max(1, frame_bytes)))
+
+# Estensioni video in un frozenset: verifica con una sola ricerca hash
+_VIDEO_EXT_SET = frozenset(SUPPORTED_VIDEO_FORMATS)
+
+_mimetypes_ready = False
+
+def _init_mimetypes():
+    """Inizializza mimetypes aggiungendo i tipi video che potrebbero mancare (una volta sola)."""
+    global _mimetypes_ready
+    if _mimetypes_ready:
+        return
+    mimetypes.init()
+    for ext in SUPPORTED_VIDEO_FORMATS:
+        if ext not in mimetypes.types_map:
+            mimetypes.add_type(f'video/x-{ext[1:]}', ext)
+    _mimetypes_ready = True
+
+@lru_cache(maxsize=256)
+def _probe_has_video(ffprobe_path, filepath, mtime_ns, size):
+    """
+    Verifica con ffprobe se il file contiene un flusso video. mtime_ns e size fanno
+    parte della chiave della cache: se il file cambia, viene analizzato di nuovo.
+    """
+    try:
+        result = subprocess.run(
+            [ffprobe_path, "-v", "quiet", "-show_streams", "-select_streams", "v", filepath],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=2
+        )
+        return result.returncode == 0 and b"codec_type=video" in result.stdout
+    except:
+        return False
+
+class VideoStream:
+    """
+    Frame di un video decodificati su richiesta da un processo ffmpeg sempre attivo.
+    Un thread legge i frame rawvideo dalla pipe in una coda limitata: quando la
+    coda è piena smette di leggere e ffmpeg si blocca sulla pipe piena, così
+    la decodifica procede al ritmo di chi consuma i frame.
+    
+    I frame sono letti a rotazione in queue_size + 2 buffer preallocati: l'immagine
+    restituita da read() condivide il buffer e resta valida fino a due letture
+    successive (usare copy() per conservarla più a lungo).
+    """
+    
+    def __init__(self, ffmpeg_path, video_path, size, fps, queue_size=8):
+        self.ffmpeg_path = ffmpeg_path
+        self.video_path = video_path
+        self.size = size
+        self.fps = fps
+        self.queue_size = queue_size
+        self.next_frame = 0
+        self._frames = deque()
+        self._ring = [bytearray(size[0] * size[1] * 3) for _ in range(queue_size + 2)]
+        self._ring_pos = 0
+        self._cond = threading.Condition()
+        self._process = None
+        self._thread = None
+        self._eof = False
+        self._start(0)
+    
+    def _start(self, frame_number):
+        """Avvia ffmpeg dal frame indicato (seek in ingresso, veloce sui keyframe)."""
+        width, height = self.size
+        cmd = _input_args(self.ffmpeg_path, self.video_path, frame_number / self.fps)
+        cmd.extend(["-vf", f"fps={self.fps},scale={width}:{height}",
+                    "-f", "rawvideo", "-pix_fmt", "rgb24", "-"])
+        self._process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                         stderr=subprocess.DEVNULL, bufsize=0)
+        self._frames.clear()
+        self._eof = False
+        self.next_frame = frame_number
+        self._thread = threading.Thread(target=self._reader, args=(self._process,), daemon=True)
+        self._thread.start()
+    
+    def _stop(self):
+        """Termina ffmpeg e il thread di lettura."""
+        process = self._process
+        if process is None:
+            return
+        self._process = None
+        with self._cond:
+            self._cond.notify_all()
+        process.kill()
+        self._thread.join()
+        process.stdout.close()
+        process.wait()
+    
+    def _reader(self, process):
+        """Thread: legge i frame dalla pipe finché la coda ha posto."""
+        frame_bytes = len(self._ring[0])
+        while True:
+            with self._cond:
+                while len(self._frames) >= self.queue_size and self._process is process:
+                    self._cond.wait()
+                if self._process is not process:
+                    return
+            # Il buffer successivo dell'anello: chi lo aveva ricevuto è già due frame avanti
+            buf = self._ring[self._ring_pos]
+            self._ring_pos = (self._ring_pos + 1) % len(self._ring)
+            complete = _read_exact(process.stdout, memoryview(buf)) == frame_bytes
+            with self._cond:
+                if self._process is not process:
+                    return
+                if complete:
+                    self._frames.append(buf)
+                else:
+                    self._eof = True
+                self._cond.notify_all()
+            if not complete:
+                return
+    
+    def read(self):
+        """
+        Restituisce il frame successivo come immagine PIL RGB, attendendo la decodifica.
+        
+        Returns:
+            Immagine PIL, oppure None alla fine del video
+        """
+        from PIL import Image
+        with self._cond:
+            while not self._frames and not self._eof and self._process is not None:
+                self._cond.wait()
+            if not self._frames:
+                return None
+            buf = self._frames.popleft()
+            self._cond.notify_all()
+        self.next_frame += 1
+        return Image.frombuffer('RGB', self.size, buf, 'raw', 'RGB', 0, 1)
+    
+    def get_frame(self, frame_number):
+        """
+        Restituisce il frame indicato. Le letture in sequenza usano la coda; per
+        tornare indietro o saltare più di un secondo avanti ffmpeg viene riavviato.
+        """
+        if frame_number < self.next_frame or frame_number - self.next_frame > self.fps:
+            self._stop()
+            self._start(frame_number)
+        while self.next_frame < frame_number:
+            if self.read() is None:
+                return None
+        return self.read()
+    
+    def close(self):
+        """Chiude il processo ffmpeg."""
+        self._stop()
+        self._frames.clear()
+
 class VideoManager:
     def __init__(self):
         ensure_dirs()
-        self.frame_cache = {}
+        # Cache LRU dei frame caricati, per indice: il più recente in fondo
+        self.frame_cache = OrderedDict()
+        # Dimensione massima della cache, calcolata al primo frame (vedi _cache_limit)
+        self.max_cache_size = None
+        # Decodifica in anticipo dei frame successivi (vedi _prefetch_loop)
+        self._cache_lock = threading.Lock()
+        self._prefetch_wake = threading.Event()
+        self._prefetch_stop = threading.Event()
+        self._prefetch_thread = None
+        self._last_requested = 0
         self.current_video = None
+        # Directory dei frame estratti su disco (frame_0001.jpg, ...)
+        self.frame_dir = None
         self.total_frames = 0
         self.current_frame = 0
         self.fps = 24.0
         self.extraction_complete = False
         self.extraction_progress = 0
+        # Frame estratti in memoria da extract_frames_piped (viste RGB grezze, una per frame)
+        self.frame_buffers = None
+        self.frame_size = None
         self.ffmpeg_path, self.ffprobe_path = get_ffmpeg_paths()
         
-        # Inizializzazione dei tipi MIME
-        mimetypes.init()
-        # Aggiungi tipi MIME che potrebbero mancare
-        for ext in SUPPORTED_VIDEO_FORMATS:
-            if ext not in mimetypes.types_map:
-                mimetypes.add_type(f'video/x-{ext[1:]}', ext)
+        # Tipi MIME dei video, registrati una volta per processo
+        _init_mimetypes()
         
     def is_video_file(self, filepath):
         """
@@ -44,12 +349,16 @@ class VideoManager:
         Returns:
             True se il file è un video, False altrimenti
         """
-        if not os.path.isfile(filepath):
+        try:
+            st = os.stat(filepath)
+        except OSError:
+            return False
+        if not stat.S_ISREG(st.st_mode):
             return False
             
         # Verifica prima per estensione (più veloce)
         extension = os.path.splitext(filepath)[1].lower()
-        if extension in SUPPORTED_VIDEO_FORMATS:
+        if extension in _VIDEO_EXT_SET:
             return True
             
         # Poi verifica il tipo MIME (più preciso ma più lento)
@@ -57,32 +366,15 @@ class VideoManager:
         if mime_type and mime_type.startswith('video/'):
             return True
             
-        # Come ultima risorsa, prova a usare ffprobe per verificare
-        try:
-            result = subprocess.run(
-                [self.ffprobe_path, "-v", "quiet", "-show_streams", "-select_streams", "v", filepath],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=2
-            )
-            return result.returncode == 0 and b"codec_type=video" in result.stdout
-        except:
-            pass
-            
-        return False
+        # Come ultima risorsa, prova a usare ffprobe (esito in cache finché il file non cambia)
+        return _probe_has_video(self.ffprobe_path, filepath, st.st_mtime_ns, st.st_size)
     
     def check_ffmpeg(self):
         """Verifica che ffmpeg sia installato."""
-        try:
-            result = subprocess.run([self.ffmpeg_path, "-version"], 
-                                   stdout=subprocess.PIPE, 
-                                   stderr=subprocess.PIPE,
-                                   timeout=3)
-            return result.returncode == 0
-        except:
-            return False
+        return has_ffmpeg(self.ffmpeg_path)
             
-    def extract_frames(self, video_path, output_dir=None, fps=None, start_time=0, duration=None, callback=None):
+    def extract_frames(self, video_path, output_dir=None, fps=None, start_time=0, duration=None, callback=None,
+                       target_width=None, target_height=None):
         """
         Estrae i frame da un video usando ffmpeg, con supporto per callback di progresso.
         
@@ -93,6 +385,8 @@ class VideoManager:
             start_time: Tempo di inizio in secondi
             duration: Durata in secondi (estrae tutto il video se non specificata)
             callback: Funzione di callback che riceve l'avanzamento (0-100)
+            target_width, target_height: Riquadro in pixel entro cui ffmpeg riduce i frame
+                                         (per il terminale: colonne x righe*2); None = dimensione originale
             
         Returns:
             Percorso della directory contenente i frame
@@ -114,19 +408,18 @@ class VideoManager:
         if not video_info:
             print("AVVISO: Impossibile ottenere informazioni sul video. Utilizzo metodo alternativo.")
             # Tenta un'estrazione base senza conoscere la durata
-            return self._extract_frames_basic(video_path, output_dir, fps, start_time, duration, callback)
+            return self._extract_frames_basic(video_path, output_dir, fps, start_time, duration, callback,
+                                              target_width, target_height)
         
         total_duration = video_info.get('duration', 0) if video_info else 0
         
         if not duration and total_duration > 0:
             duration = total_duration - start_time
         
-        # Costruisci il comando ffmpeg
-        cmd = [self.ffmpeg_path, "-i", video_path]
+        # Costruisci il comando ffmpeg (con l'eventuale seek in ingresso)
+        cmd = _input_args(self.ffmpeg_path, video_path, start_time)
         
-        # Aggiungi opzioni di inizio e durata se specificate
-        if start_time > 0:
-            cmd.extend(["-ss", str(start_time)])
+        # Aggiungi la durata se specificata
         if duration:
             cmd.extend(["-t", str(duration)])
             
@@ -136,9 +429,15 @@ class VideoManager:
         elif video_info and 'fps' in video_info:
             self.fps = video_info['fps']
             
-        # Aggiungi filtro FPS se specificato
-        if fps:
-            cmd.extend(["-vf", f"fps={fps}"])
+        # Video lunghi: un processo ffmpeg per ogni tratto di almeno 5 secondi
+        shards = min(os.cpu_count() or 1, int(duration // 5)) if duration else 1
+        if shards > 1:
+            return self._extract_frames_sharded(video_path, output_dir, fps, start_time,
+                                                duration, shards, callback,
+                                                target_width, target_height)
+        
+        # Filtri FPS e riduzione, se specificati
+        cmd.extend(_filter_args(fps, target_width, target_height))
         
         # Aggiungi parametri di output
         cmd.extend([
@@ -151,39 +450,29 @@ class VideoManager:
         self.extraction_progress = 0
         
         try:
-            # Avvio del processo con pipe per stderr per monitorare il progresso
+            # L'avanzamento arriva su stdout in righe chiave=valore (-progress);
+            # stderr, ridotto ai soli errori, non viene letto e quindi non può riempirsi
             process = subprocess.Popen(
-                cmd,
+                cmd[:1] + _PROGRESS_ARGS + cmd[1:],
                 stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
+                stderr=subprocess.DEVNULL
             )
             
-            # Monitora l'output per il progresso
-            while True:
-                line = process.stderr.readline()
-                if not line and process.poll() is not None:
-                    break
+            # Monitora l'output per il progresso: solo aritmetica intera sui
+            # microsecondi, rispetto alla durata del tratto estratto
+            duration_us = int(duration * 1_000_000) if duration else 0
+            for line in process.stdout:
+                current_us = _progress_us(line)
+                if current_us is None or duration_us <= 0:
+                    continue
+                progress = min(100, current_us * 100 // duration_us)
+                if progress != self.extraction_progress:
+                    # Aggiorna il progresso
+                    self.extraction_progress = progress
                     
-                # Cerca informazioni di tempo nell'output
-                if "time=" in line and total_duration > 0:
-                    time_str = line.split("time=")[1].split(" ")[0]
-                    try:
-                        # Converti il formato HH:MM:SS.ms in secondi
-                        h, m, s = time_str.split(':')
-                        current_time = float(h) * 3600 + float(m) * 60 + float(s)
-                        progress = min(100, int((current_time / total_duration) * 100))
-                        
-                        # Aggiorna il progresso
-                        self.extraction_progress = progress
-                        
-                        # Chiama il callback se specificato
-                        if callback:
-                            callback(progress)
-                    except:
-                        pass
+                    # Chiama il callback se specificato
+                    if callback:
+                        callback(progress)
             
             # Attendi il completamento del processo
             process.wait()
@@ -194,12 +483,16 @@ class VideoManager:
                 self.extraction_complete = False
                 return None
                 
-            # Conta i frame estratti
-            frames = sorted(glob.glob(f"{output_dir}/frame_*.jpg"))
-            self.total_frames = len(frames)
+            # Conta i frame estratti: i percorsi si ricavano dall'indice (vedi frame_file_path)
+            self._stop_prefetch()
+            self.total_frames = count_frame_files(output_dir)
             self.current_video = output_dir
             self.current_frame = 0
-            self.frames = frames  # Salva i frame estratti in ordine
+            self.frame_dir = output_dir
+            self.frame_buffers = None
+            self.frame_cache.clear()
+            self.max_cache_size = None
+            self._start_prefetch()
             
             # Segnala completamento
             self.extraction_complete = True
@@ -215,28 +508,255 @@ class VideoManager:
             self.extraction_complete = False
             return None
 
-    def _extract_frames_basic(self, video_path, output_dir, fps, start_time, duration, callback):
+    def _extract_frames_sharded(self, video_path, output_dir, fps, start_time, duration,
+                                shards, callback, target_width=None, target_height=None):
+        """
+        Estrae i frame dividendo la durata in shards tratti, ognuno con un proprio
+        processo ffmpeg (seek in ingresso con -ss prima di -i) e una propria
+        sottodirectory. Al termine i frame vengono rinominati in ordine in output_dir
+        come frame_0001.jpg, ... come con un solo processo.
+        I confini dei tratti cadono sulla griglia dei frame e ogni processo ne estrae
+        un numero esatto (-frames:v): i tratti non arrotondano ciascuno per conto
+        proprio e il frame i resta all'istante i/fps.
+        """
+        rate = fps or self.fps
+        total_frames = round(duration * rate)
+        bounds = [round(index * total_frames / shards) for index in range(shards + 1)]
+        shard_us = [0] * shards
+        duration_us = int(duration * 1_000_000)
+        progress_lock = threading.Lock()
+        self.extraction_complete = False
+        self.extraction_progress = 0
+        
+        def run_shard(index):
+            """Estrae un tratto e ne aggiorna l'avanzamento; restituisce il codice di uscita."""
+            shard_dir = os.path.join(output_dir, f"shard_{index:02d}")
+            os.makedirs(shard_dir, exist_ok=True)
+            cmd = _input_args(self.ffmpeg_path, video_path, start_time + bounds[index] / rate)
+            cmd.extend(_filter_args(fps, target_width, target_height))
+            cmd.extend(["-frames:v", str(bounds[index + 1] - bounds[index]),
+                        "-q:v", "1", f"{shard_dir}/frame_%04d.jpg"])
+            
+            process = subprocess.Popen(cmd[:1] + _PROGRESS_ARGS + cmd[1:], stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL)
+            for line in process.stdout:
+                current_us = _progress_us(line)
+                if current_us is None:
+                    continue
+                shard_us[index] = current_us
+                # L'avanzamento totale è la somma del tempo estratto da ogni processo
+                with progress_lock:
+                    progress = min(99, sum(shard_us) * 100 // duration_us)
+                    if progress > self.extraction_progress:
+                        self.extraction_progress = progress
+                        if callback:
+                            callback(progress)
+            return process.wait()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=shards) as executor:
+                return_codes = list(executor.map(run_shard, range(shards)))
+            if any(return_codes):
+                print(f"Errore nell'estrazione dei frame: codici {return_codes}")
+                return None
+            
+            # Unisce i tratti in un'unica sequenza numerata
+            count = 0
+            for index in range(shards):
+                shard_dir = os.path.join(output_dir, f"shard_{index:02d}")
+                for path in list_frame_files(shard_dir):
+                    os.replace(path, frame_file_path(output_dir, count))
+                    count += 1
+                shutil.rmtree(shard_dir, ignore_errors=True)
+        except Exception as e:
+            print(f"Errore nell'estrazione dei frame: {e}")
+            return None
+        
+        self._stop_prefetch()
+        self.total_frames = count
+        self.current_video = output_dir
+        self.current_frame = 0
+        self.frame_dir = output_dir
+        self.frame_buffers = None
+        self.frame_cache.clear()
+        self.max_cache_size = None
+        self._start_prefetch()
+        self.extraction_complete = True
+        self.extraction_progress = 100
+        
+        if callback:
+            callback(100)
+        
+        print(f"Estratti {self.total_frames} frame in {output_dir} ({shards} processi)")
+        return output_dir
+
+    def extract_frames_piped(self, video_path, fps=None, start_time=0, duration=None,
+                             size=None, callback=None):
+        """
+        Estrae i frame in memoria leggendo dalla pipe di ffmpeg i pixel RGB grezzi
+        (rawvideo rgb24): nessun JPEG viene scritto su disco e decodificato di nuovo.
+        I frame sono poi disponibili tramite get_frame.
+        
+        Args:
+            video_path: Percorso del file video
+            fps: Frame per secondo da estrarre (usa il FPS nativo se non specificato)
+            start_time: Tempo di inizio in secondi
+            duration: Durata in secondi (estrae tutto il video se non specificata)
+            size: (larghezza, altezza) a cui ridurre i frame (dimensione originale se None)
+            callback: Funzione di callback che riceve l'avanzamento (0-100)
+            
+        Returns:
+            Numero di frame estratti, oppure None in caso di errore o se i frame
+            non starebbero in metà della memoria disponibile
+        """
+        if not self.check_ffmpeg():
+            print("ERRORE: ffmpeg non trovato. Installalo per usare la funzionalità video.")
+            return None
+        
+        # La dimensione dei frame serve per sapere quanti byte leggere per ognuno
+        video_info = self.get_video_info(video_path)
+        if not video_info or not video_info.get('width') or not video_info.get('height'):
+            print("ERRORE: Impossibile ottenere la dimensione del video.")
+            return None
+        
+        width, height = size if size else (video_info['width'], video_info['height'])
+        frame_bytes = width * height * 3
+        
+        total_duration = video_info.get('duration', 0)
+        if not duration and total_duration > 0:
+            duration = total_duration - start_time
+        self.fps = fps or video_info.get('fps') or self.fps
+        expected_frames = int(duration * self.fps) if duration else 0
+        
+        # Tutti i frame restano in memoria: senza un numero noto di frame o senza
+        # spazio sufficiente si lascia al chiamante l'estrazione su disco
+        available = _available_memory()
+        if not expected_frames or (available and expected_frames * frame_bytes > available // 2):
+            print("AVVISO: Frame troppo numerosi per l'estrazione in memoria.")
+            return None
+        
+        cmd = _input_args(self.ffmpeg_path, video_path, start_time)
+        if duration:
+            cmd.extend(["-t", str(duration)])
+        filters = []
+        if fps:
+            filters.append(f"fps={fps}")
+        if size:
+            filters.append(f"scale={width}:{height}")
+        if filters:
+            cmd.extend(["-vf", ",".join(filters)])
+        cmd.extend(["-f", "rawvideo", "-pix_fmt", "rgb24", "-"])
+        
+        self.extraction_complete = False
+        self.extraction_progress = 0
+        buffers = []
+        
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL, bufsize=0)
+            try:
+                # I frame vengono letti direttamente in blocchi preallocati (uno solo
+                # se il numero di frame è noto): ogni frame è una vista sul blocco
+                block, free = None, 0
+                while True:
+                    if not free:
+                        free = (expected_frames + 1) if not buffers and expected_frames else 64
+                        block = memoryview(bytearray(free * frame_bytes))
+                        offset = 0
+                    view = block[offset:offset + frame_bytes]
+                    if _read_exact(process.stdout, view) < frame_bytes:
+                        break
+                    buffers.append(view)
+                    offset += frame_bytes
+                    free -= 1
+                    
+                    if expected_frames and callback:
+                        progress = min(99, len(buffers) * 100 // expected_frames)
+                        if progress != self.extraction_progress:
+                            self.extraction_progress = progress
+                            callback(progress)
+            finally:
+                process.stdout.close()
+                process.wait()
+            
+            if process.returncode != 0 or not buffers:
+                print(f"Errore nell'estrazione dei frame: codice {process.returncode}")
+                return None
+        except Exception as e:
+            print(f"Errore nell'estrazione dei frame: {e}")
+            return None
+        
+        self._stop_prefetch()
+        self.frame_cache.clear()
+        self.frame_buffers = buffers
+        self.frame_size = (width, height)
+        self.total_frames = len(buffers)
+        self.current_frame = 0
+        self.extraction_complete = True
+        self.extraction_progress = 100
+        
+        if callback:
+            callback(100)
+        
+        print(f"Estratti {self.total_frames} frame in memoria ({width}x{height})")
+        return self.total_frames
+
+    def open_video_stream(self, video_path, fps=None, size=None, queue_size=8):
+        """
+        Apre il video per la decodifica su richiesta (vedi VideoStream): la
+        riproduzione può iniziare subito e in memoria restano al più queue_size frame.
+        
+        Args:
+            video_path: Percorso del file video
+            fps: Frame per secondo (usa il FPS nativo se non specificato)
+            size: (larghezza, altezza) dei frame (dimensione originale se None)
+            queue_size: Frame decodificati in anticipo
+            
+        Returns:
+            Oggetto VideoStream, oppure None in caso di errore
+        """
+        if not self.check_ffmpeg():
+            print("ERRORE: ffmpeg non trovato. Installalo per usare la funzionalità video.")
+            return None
+        
+        video_info = self.get_video_info(video_path)
+        if not video_info or not video_info.get('width') or not video_info.get('height'):
+            print("ERRORE: Impossibile ottenere la dimensione del video.")
+            return None
+        
+        self.fps = fps or video_info.get('fps') or self.fps
+        if video_info.get('duration'):
+            self.total_frames = int(video_info['duration'] * self.fps)
+        size = size or (video_info['width'], video_info['height'])
+        try:
+            return VideoStream(self.ffmpeg_path, video_path, size, self.fps, queue_size)
+        except OSError as e:
+            print(f"Errore nell'avvio di ffmpeg: {e}")
+            return None
+
+    def _extract_frames_basic(self, video_path, output_dir, fps, start_time, duration, callback,
+                              target_width=None, target_height=None):
         """Metodo di fallback per estrazione frame quando non si può ottenere info video."""
         try:
-            # Usa un approccio più semplice che estrae un numero fisso di frame
+            # Senza durata nota si estrae al più un numero fisso di frame
             max_frames = 500  # Limita il numero di frame
             
-            # Costruisci il comando ffmpeg
-            cmd = [self.ffmpeg_path, "-y", "-i", video_path]
+            # Costruisci il comando ffmpeg (con l'eventuale seek in ingresso)
+            cmd = _input_args(self.ffmpeg_path, video_path, start_time)
+            cmd.insert(1, "-y")
             
-            # Aggiungi opzioni di inizio e durata se specificate
-            if start_time > 0:
-                cmd.extend(["-ss", str(start_time)])
+            # Aggiungi la durata se specificata
             if duration:
                 cmd.extend(["-t", str(duration)])
                 
-            # Imposta FPS se specificato
+            # Imposta FPS e riduzione se specificati
             if fps:
                 self.fps = fps
-                cmd.extend(["-vf", f"fps={fps}"])
+            cmd.extend(_filter_args(fps, target_width, target_height))
             
-            # Limita il numero di frame
-            cmd.extend(["-vframes", str(max_frames)])
+            # Il limite serve solo quando nessuna durata delimita l'estrazione
+            if not duration:
+                cmd.extend(["-vframes", str(max_frames)])
             
             # Aggiungi parametri di output
             cmd.extend([
@@ -244,30 +764,34 @@ class VideoManager:
                 f"{output_dir}/frame_%04d.jpg"
             ])
             
-            print(f"Comando di estrazione: {' '.join(cmd)}")
+            log.debug("Comando di estrazione: %s", cmd)
             
             # Esegui il comando
             process = subprocess.run(
                 cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
             )
             
             if process.returncode != 0:
-                print(f"Errore nell'estrazione dei frame: {process.stderr}")
+                # stderr viene decodificato solo per mostrarlo in caso di errore
+                print(f"Errore nell'estrazione dei frame: {process.stderr.decode(errors='replace')}")
                 return None
                 
             # Conta i frame estratti
-            frames = sorted(glob.glob(f"{output_dir}/frame_*.jpg"))
-            self.total_frames = len(frames)
+            self._stop_prefetch()
+            self.total_frames = count_frame_files(output_dir)
             if self.total_frames == 0:
                 print("Nessun frame estratto!")
                 return None
                 
             self.current_video = output_dir
             self.current_frame = 0
-            self.frames = frames  # Salva i frame estratti in ordine
+            self.frame_dir = output_dir
+            self.frame_buffers = None
+            self.frame_cache.clear()
+            self.max_cache_size = None
+            self._start_prefetch()
             self.extraction_complete = True
             self.extraction_progress = 100
             
@@ -287,7 +811,7 @@ class VideoManager:
         Se frame_number non è specificato, restituisce il frame corrente
         e incrementa il contatore.
         """
-        if not self.current_video:
+        if not self.current_video and self.frame_buffers is None:
             print("Errore: Nessun video corrente impostato")
             return None
             
@@ -302,71 +826,155 @@ class VideoManager:
         # Gestione dei frame oltre la fine del video
         if frame_number < 0 or frame_number >= self.total_frames:
             return None
+        
+        # Frame in memoria (extract_frames_piped): immagine creata sul buffer, senza copie
+        if self.frame_buffers is not None:
+            from PIL import Image
+            return Image.frombuffer('RGB', self.frame_size, self.frame_buffers[frame_number],
+                                    'raw', 'RGB', 0, 1)
 
-        # Ottieni il percorso del frame
-        frame_path = self.frames[frame_number]
+        # Sveglia il thread di prefetch, che decodifica i frame successivi
+        self._last_requested = frame_number
+        self._prefetch_wake.set()
         
-        # Usa la cache se il frame è già caricato
-        if frame_path in self.frame_cache:
-            return self.frame_cache[frame_path]
-            
+        # Usa la cache se il frame è già caricato, segnandolo come usato di recente
+        with self._cache_lock:
+            img = self.frame_cache.get(frame_number)
+            if img is not None:
+                self.frame_cache.move_to_end(frame_number)
+                return img
+        
+        img = self._load_frame_file(frame_file_path(self.frame_dir, frame_number))
+        if img is not None:
+            self._cache_insert(frame_number, img)
+        return img
+    
+    def _load_frame_file(self, frame_path):
+        """Decodifica un frame estratto su disco (None se non leggibile)."""
         # Verifica esistenza (senza stampe di debug)
         if not os.path.exists(frame_path) or not os.access(frame_path, os.R_OK):
             return None
         
-        # Carica il frame con gestione errori
+        # Carica il frame con gestione errori: load_frame usa libjpeg-turbo
+        # (PyTurboJPEG) se disponibile, altrimenti Pillow
         try:
-            from PIL import Image, ImageFile
-            ImageFile.LOAD_TRUNCATED_IMAGES = True
-            
-            img = Image.open(frame_path)
-            img.load()  # Forza il caricamento
-            
-            # Gestione della cache con LRU (mantieni solo gli ultimi N frame in memoria)
-            max_cache_size = 15  # Aumentiamo la cache per prestazioni migliori
-            if len(self.frame_cache) > max_cache_size:
-                # Rimuovi il frame meno recente
-                self.frame_cache.pop(next(iter(self.frame_cache)))
-            
-            # Memorizza nella cache
-            self.frame_cache[frame_path] = img
-            return img
+            return load_frame(frame_path)
         except Exception as e:
-            # Prova approccio alternativo in caso di errore
+            # Prova approccio alternativo in caso di errore (anche JPEG troncati)
             try:
-                img = Image.open(frame_path).convert('RGB')
+                from PIL import Image, ImageFile
+                ImageFile.LOAD_TRUNCATED_IMAGES = True
+                img = Image.open(frame_path)
                 img.load()
-                self.frame_cache[frame_path] = img
-                return img
+                # I JPEG di ffmpeg sono già RGB: nessuna copia per la conversione
+                return img if img.mode == 'RGB' else img.convert('RGB')
             except:
                 return None
+    
+    def _cache_insert(self, frame_number, img):
+        """Aggiunge un frame alla cache LRU, scartando quello usato meno di recente."""
+        with self._cache_lock:
+            if self.max_cache_size is None:
+                self.max_cache_size = _cache_limit(img.width * img.height * 3)
+            self.frame_cache[frame_number] = img
+            if len(self.frame_cache) > self.max_cache_size:
+                self.frame_cache.popitem(last=False)
+    
+    def _start_prefetch(self):
+        """Avvia il thread che decodifica in anticipo i frame estratti su disco."""
+        self._prefetch_stop.clear()
+        self._prefetch_thread = threading.Thread(target=self._prefetch_loop,
+                                                 args=(self.frame_dir, self.total_frames),
+                                                 daemon=True)
+        self._prefetch_thread.start()
+    
+    def _stop_prefetch(self):
+        """Ferma il thread di prefetch, se attivo."""
+        if self._prefetch_thread is not None:
+            self._prefetch_stop.set()
+            self._prefetch_wake.set()
+            self._prefetch_thread.join()
+            self._prefetch_thread = None
+    
+    def _prefetch_loop(self, frame_dir, total_frames):
+        """
+        Thread: a ogni richiesta di get_frame decodifica i frame che seguono.
+        La finestra (due secondi di video, al più metà della cache) lascia sempre
+        posto nella cache ai frame già visualizzati, senza scartare quelli decodificati.
+        """
+        while not self._prefetch_stop.is_set():
+            self._prefetch_wake.wait()
+            self._prefetch_wake.clear()
+            
+            window = max(1, min((self.max_cache_size or 60) // 2, int(self.fps * 2)))
+            start = self._last_requested + 1
+            for i in range(start, min(start + window, total_frames)):
+                # Una nuova richiesta sposta la finestra: si riparte da lì
+                if self._prefetch_stop.is_set() or self._prefetch_wake.is_set():
+                    break
+                with self._cache_lock:
+                    if i in self.frame_cache:
+                        continue
+                img = self._load_frame_file(frame_file_path(frame_dir, i))
+                if img is not None:
+                    self._cache_insert(i, img)
         
     def get_next_frame(self):
         """Restituisce il prossimo frame del video."""
         return self.get_frame()
         
     def get_video_info(self, video_path):
-        """Restituisce informazioni su un video utilizzando ffmpeg."""
-        if not self.check_ffmpeg():
-            return None
-            
+        """
+        Restituisce informazioni su un video utilizzando ffprobe.
+        Il risultato viene memorizzato per (percorso, mtime, dimensione), in memoria
+        e in CACHE_DIR/videoinfo.json: le aperture successive dello stesso file,
+        anche in sessioni diverse, non avviano ffprobe.
+        """
+        try:
+            st = os.stat(video_path)
+        except OSError:
+            # Non è un file locale (o non esiste): nessuna cache
+            return self._probe_video_info(video_path)
+        
+        key = f"{os.path.abspath(video_path)}|{st.st_mtime_ns}|{st.st_size}"
+        cache = _video_info_cache()
+        with _VIDEO_INFO_LOCK:
+            info = cache.get(key)
+            if info is not None:
+                cache.move_to_end(key)
+                return dict(info)
+        
+        info = self._probe_video_info(video_path)
+        if info:
+            with _VIDEO_INFO_LOCK:
+                cache[key] = info
+                while len(cache) > _VIDEO_INFO_MAX:
+                    cache.popitem(last=False)
+                _save_video_info_cache(cache)
+            info = dict(info)
+        return info
+    
+    def _probe_video_info(self, video_path):
+        """Esegue ffprobe e ne estrae le informazioni utili (None in caso di errore)."""
         try:
             # Debug: mostra il percorso del video che stiamo provando ad analizzare
-            print(f"Analisi video: {video_path}")
+            log.debug("Analisi video: %s", video_path)
             
             # Gestione dei percorsi con spazi o caratteri speciali
             # Esegui ffprobe per ottenere informazioni sul video
+            # Solo il primo flusso video e i campi usati qui sotto: l'output JSON
+            # resta piccolo anche per file con molti flussi audio e sottotitoli
             cmd = [
                 self.ffprobe_path, 
                 "-v", "quiet", 
                 "-print_format", "json", 
-                "-show_format", 
-                "-show_streams", 
+                "-select_streams", "v:0",
+                "-show_entries", "stream=codec_type,codec_name,width,height,r_frame_rate:format=duration",
                 video_path
             ]
             
             # Debug: mostra il comando che stiamo per eseguire
-            print(f"Comando ffprobe: {' '.join(cmd)}")
+            log.debug("Comando ffprobe: %s", cmd)
             
             # Usa shell=True su Windows per gestire meglio i percorsi problematici
             use_shell = os.name == 'nt'
@@ -375,20 +983,19 @@ class VideoManager:
                                 stdout=subprocess.PIPE, 
                                 stderr=subprocess.PIPE, 
                                 check=False,  # Cambiato da True a False per evitare eccezioni
-                                text=True,
                                 timeout=10,
                                 shell=use_shell)
             
             if result.returncode != 0:
-                print(f"Errore ffprobe: {result.stderr}")
+                print(f"Errore ffprobe: {result.stderr.decode(errors='replace')}")
                 return None
                 
-            import json
             try:
-                info = json.loads(result.stdout)
+                # Byte passati direttamente al parser (orjson se disponibile)
+                info = _json_loads(result.stdout)
             except json.JSONDecodeError as e:
                 print(f"Errore nel parsing JSON: {e}")
-                print(f"Output ffprobe: {result.stdout[:100]}...")  # Mostra l'inizio dell'output
+                print(f"Output ffprobe: {result.stdout[:100].decode(errors='replace')}...")  # Mostra l'inizio dell'output
                 return None
             
             # Estrai informazioni rilevanti
@@ -421,28 +1028,39 @@ class VideoManager:
                 except (ValueError, TypeError) as e:
                     print(f"Errore nel parsing della durata: {e}")
             
-            # Debug info - stampa info ottenute
+            # Debug info - registra le info ottenute
             if not video_info:
                 print("Nessuna informazione video trovata nell'output ffprobe")
             else:
-                print(f"Info video: {video_info}")
+                log.debug("Info video: %s", video_info)
                 
             return video_info
         except subprocess.TimeoutExpired:
             print("Timeout nell'esecuzione di ffprobe")
             return None
+        except FileNotFoundError:
+            # Senza ffprobe non c'è nulla da analizzare (nessun controllo preventivo separato)
+            print("ERRORE: ffprobe non trovato.")
+            return None
         except Exception as e:
             print(f"Errore nell'ottenere informazioni video: {e}")
-            import traceback
-            traceback.print_exc()
+            # Traccia completa solo con il livello DEBUG attivo
+            log.debug("Errore in ffprobe", exc_info=True)
             return None
             
     def cleanup(self):
-        """Pulisce i file temporanei."""
+        """Pulisce i file temporanei e i frame in memoria."""
+        self._stop_prefetch()
         self.frame_cache.clear()
+        self.frame_buffers = None
         if self.current_video and os.path.exists(self.current_video):
             try:
-                shutil.rmtree(self.current_video)
+                # La directory viene prima rinominata (istantaneo), poi svuotata in un
+                # thread: cleanup ritorna subito e il nome è già libero per una nuova estrazione
+                trash_dir = f"{self.current_video}.trash-{uuid.uuid4().hex[:8]}"
+                os.rename(self.current_video, trash_dir)
+                threading.Thread(target=_remove_dir, args=(trash_dir,)).start()
                 self.current_video = None
-            except:
+                self.frame_dir = None
+            except OSError:
                 pass